@@ -1,10 +1,23 @@
 # ml_service/app.py
-import pandas as pd
+import os
+import threading
 from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
 
 # ✅ 1. IMPORTACIONES RELATIVAS (Necesarias para ejecutar como módulo)
-from .db_connector import get_courses_data, get_books_data, get_search_trends_data, get_all_topics
+from .db_connector import (
+    get_courses_data, get_books_data, get_search_history_since, get_search_trends_aggregated, get_all_topics
+)
+from .embedding_store import CachedEncoder, LRUEmbeddingCache, open_default_store
+from .trend_aggregator import IncrementalTrendAggregator
+from .response_cache import TTLResponseCache
+from .catalog import CatalogRefresher, build_catalog
+from .vector_index import IndexRegistry
+from .batching import EncoderService
+from .onnx_backend import load_encoder_model
+from .model_registry import get_model_spec, verify_model
+from .search import search_catalog, parse_search_types, MAX_SEARCH_K
+from .utils import QUERY_STOPWORDS
+from .trend_engine import TrendEngine, COURSE_RULES, BOOK_RULES, TOPIC_RULES, summarize
 from .predictors import (
     popular_course_predictor, 
     popular_resource_predictor,
@@ -16,59 +29,135 @@ app = Flask(__name__)
 # --- 🧠 2. INICIALIZACIÓN DE RECURSOS (Al arrancar) ---
 print("⏳ Iniciando servicio de ML...")
 
-# Variable global para caché en memoria (Evita consultar DB en cada click)
-global_data = {
-    "courses_df": pd.DataFrame(),
-    "books_df": pd.DataFrame(),
-    "topics_df": pd.DataFrame(),
-    "embeddings": None,        # Vectores de Cursos
-    "book_embeddings": None,   # Vectores de Libros
-    "topic_embeddings": None   # Vectores de Temas
-}
-
 # Modelo de IA (Singleton)
+# Configuración compartida con run_batch.py (ML_MODEL): nombre, dimensión, normalización y versión
+MODEL_SPEC = get_model_spec()
+MODEL_NAME = MODEL_SPEC.name
 ml_model = None
+# Servicio central de encoding: fusiona los textos de hilos concurrentes en un solo forward pass
+encoder_service = None
+# Encoder con caché persistente: solo los textos nuevos pasan por el modelo (vía encoder_service)
+encoder = None
+# Encoder de /api/search: solo LRU + encoder_service. Las queries ad-hoc no se escriben
+# en el SQLite persistente (sin commit en el request ni crecimiento sin límite del archivo)
+search_encoder = None
+# Caché LRU de embeddings de queries, compartida por ambos predictores
+query_cache = LRUEmbeddingCache()
+# Caché de respuestas de /api/trends (clave: days). compute_trends se resuelve en tiempo de llamada.
+trends_cache = TTLResponseCache(
+    lambda days: compute_trends(days),
+    ttl_seconds=int(os.getenv("ML_TRENDS_CACHE_TTL", "300")),
+    stale_while_revalidate=os.getenv("ML_TRENDS_CACHE_SWR", "1") == "1"
+)
 
-def initialize_app():
+# Arranque rápido: el import del módulo no carga torch ni consulta la DB;
+# el modelo y el catálogo se calientan en un hilo de fondo mientras /health ya responde.
+FAST_START = os.getenv("ML_FAST_START", "1") == "1"
+# Preload (gunicorn --preload): el master carga SOLO el modelo y los workers lo
+# comparten por copy-on-write; cada worker arma su catálogo en post_fork.
+PRELOAD = os.getenv("ML_PRELOAD", "0") == "1"
+
+service_state = {"status": "starting", "error": None}
+model_lock = threading.Lock()
+
+def load_model():
+    """Carga el modelo una sola vez por proceso (import pesado diferido)."""
     global ml_model
+    with model_lock:
+        if ml_model is None:
+            print(f"   🧠 Cargando modelo de lenguaje ({MODEL_NAME})...")
+            # Con ML_ENCODER_BACKEND=onnx se usa ONNX Runtime int8 en lugar de PyTorch.
+            model = load_encoder_model(MODEL_NAME)
+            verify_model(MODEL_SPEC, model)
+            ml_model = model
+            print("   ✅ Modelo IA cargado.")
+    return ml_model
+
+def warm_up():
+    global encoder, encoder_service, search_encoder
     try:
-        print("   🧠 Cargando modelo de lenguaje (all-MiniLM-L6-v2)...")
-        # Modelo L3 (3 capas en vez de 6): Mucho menos RAM, precisión similar para tu caso
-        #ml_model = SentenceTransformer('sentence-transformers/paraphrase-MiniLM-L3-v2')
-        # AHORA (Ligero y rápido)
-        ml_model = SentenceTransformer('sentence-transformers/paraphrase-MiniLM-L3-v2')
-        print("   ✅ Modelo IA cargado.")
-        
+        service_state["status"] = "warming"
+        load_model()
+        # La conexión SQLite de la caché se abre en cada proceso (no cruza el fork)
+        if encoder is None:
+            encoder_service = EncoderService(ml_model)
+            encoder = CachedEncoder(encoder_service, MODEL_SPEC.tag, open_default_store(), query_cache,
+                                    normalize=MODEL_SPEC.normalize)
+            search_encoder = CachedEncoder(encoder_service, MODEL_SPEC.tag, None, query_cache,
+                                           normalize=MODEL_SPEC.normalize)
         refresh_data() # Cargar datos iniciales
+        catalog.start() # Recarga periódica en segundo plano
+        service_state["status"] = "ready"
     except Exception as e:
+        service_state.update(status="error", error=str(e))
         print(f"   ❌ Error crítico inicializando: {e}")
 
+def initialize_app(background=FAST_START):
+    if background:
+        threading.Thread(target=warm_up, name="ml-warmup", daemon=True).start()
+    else:
+        warm_up()
+
 def refresh_data():
-    """Descarga datos frescos de SQL y recalcula vectores"""
-    print("   🔄 Conectando a Supabase...")
-    global_data["courses_df"] = get_courses_data()
-    global_data["topics_df"] = get_all_topics()
-    
-    if ml_model:
-        # A. Vectorizar Cursos
-        if not global_data["courses_df"].empty:
-            df = global_data["courses_df"]
-            # Feature Engineering: Concatenar Título + Temas para mayor contexto
-            df['soup'] = (
-                df['name'] + " " + 
-                df['topics_soup'].fillna('')
-            )
-            print(f"   🧠 Vectorizando {len(df)} cursos...")
-            global_data["embeddings"] = ml_model.encode(df['soup'].tolist())
-
-        # B. Vectorizar Temas
-        if not global_data["topics_df"].empty:
-            df_t = global_data["topics_df"]
-            print(f"   🧠 Vectorizando {len(df_t)} temas...")
-            global_data["topic_embeddings"] = ml_model.encode(df_t['name'].fillna('').tolist())
-
-# Ejecutar carga inicial
-initialize_app()
+    """Descarga datos frescos de SQL, recalcula vectores y publica un snapshot nuevo (síncrono)."""
+    return catalog.refresh()
+
+def on_catalog_published(snapshot):
+    # Catálogo nuevo -> las tendencias cacheadas quedan vencidas
+    trends_cache.invalidate()
+
+# Índices vectoriales persistidos en data_dump/vector_index (exacto o HNSW según tamaño)
+index_registry = IndexRegistry(model_name=MODEL_SPEC.tag)
+
+# Catálogo en memoria (Evita consultar DB en cada click). Se publica con un swap atómico.
+catalog = CatalogRefresher(
+    lambda previous, version: build_catalog(
+        encoder, get_courses_data, get_all_topics, previous, version,
+        load_books=get_books_data, index_registry=index_registry
+    ),
+    interval_seconds=int(os.getenv("ML_CATALOG_REFRESH_SECONDS", "1800")),
+    on_publish=on_catalog_published
+)
+
+# Agregadores incrementales de search_history (uno por ventana de días).
+# ML_TRENDS_PUSHDOWN=1: en su lugar, el GROUP BY + decaimiento se resuelve en PostgreSQL
+TRENDS_PUSHDOWN = os.getenv("ML_TRENDS_PUSHDOWN", "0") == "1"
+# 'days' se acota a [1, MAX_TRENDS_DAYS]: cada valor distinto crea un agregador y una entrada de caché
+MAX_TRENDS_DAYS = int(os.getenv("ML_TRENDS_MAX_DAYS", "90"))
+trend_aggregators = {}
+trend_aggregators_lock = threading.Lock()
+
+def get_trend_aggregator(days):
+    with trend_aggregators_lock:
+        if days not in trend_aggregators:
+            trend_aggregators[days] = IncrementalTrendAggregator(days, get_search_history_since)
+        return trend_aggregators[days]
+
+# Motor de tendencias del snapshot vigente (usa los índices léxicos armados en el refresh)
+TRENDS_TOP_N = int(os.getenv("ML_TRENDS_TOP_N", "5"))
+# Plegado de stopwords al canonicalizar queries ("la anatomía" == "anatomía")
+FOLD_QUERY_STOPWORDS = os.getenv("ML_QUERY_STOPWORDS", "1") == "1"
+trend_engine_slot = {"version": None, "engine": None}
+trend_engine_lock = threading.Lock()
+
+def get_trend_engine(snapshot):
+    with trend_engine_lock:
+        if trend_engine_slot["version"] != snapshot.version:
+            engine = TrendEngine(query_stopwords=QUERY_STOPWORDS if FOLD_QUERY_STOPWORDS else None)
+            engine.register("courses", snapshot.courses_df, snapshot.course_index or snapshot.course_embeddings,
+                            COURSE_RULES, snapshot.course_lexical)
+            engine.register("books", snapshot.books_df, snapshot.book_index or snapshot.book_embeddings,
+                            BOOK_RULES, snapshot.book_lexical)
+            engine.register("topics", snapshot.topics_df, snapshot.topic_embeddings,
+                            TOPIC_RULES, snapshot.topic_lexical)
+            trend_engine_slot.update(version=snapshot.version, engine=engine)
+        return trend_engine_slot["engine"]
+
+# Ejecutar carga inicial (con preload, los workers la completan en post_fork)
+if PRELOAD:
+    load_model()
+else:
+    initialize_app()
 
 
 # --- 3. ENDPOINTS (RUTAS API) ---
@@ -76,63 +165,120 @@ initialize_app()
 # @app.route('/api/recommendations') ELIMINADO: Redundante.
 
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness: responde de inmediato aunque el modelo siga cargando."""
+    return jsonify({
+        "status": service_state["status"],
+        "modelLoaded": ml_model is not None,
+        "model": MODEL_SPEC.describe(),
+        "catalogVersion": catalog.current.version,
+        "encoder": encoder_service.stats() if encoder_service is not None else None,
+        "error": service_state["error"]
+    })
+
+
+def compute_trends(days):
+    """
+    📈 TENDENCIAS (Popularidad)
+    Usa: trend_engine (cursos, libros y temas en un solo pase de encoding)
+    Devuelve el payload JSON; los errores se propagan al endpoint.
+    """
+    # 1. Agregado incremental: solo se descargan las búsquedas nuevas desde la última llamada
+    #    (o, con pushdown, una fila por query ya agregada en la base)
+    print(f"📊 Obteniendo tendencias para los últimos {days} días...")
+    if TRENDS_PUSHDOWN:
+        grouped_trends = get_search_trends_aggregated(days)
+    else:
+        grouped_trends = get_trend_aggregator(days).refresh()
+    
+    if grouped_trends.empty:
+        print("⚠️ No hay historial de búsquedas reciente.")
+        return {
+            "period": f"Last {days} days",
+            "popularCourse": {"predictedCourse": None, "reason": "Sin datos"},
+            "popularTopic": {"predictedTopic": None, "reason": "Sin datos"}
+        }
+
+    print(f"📊 Historial procesado: {len(grouped_trends)} queries únicas.")
+
+    # Un solo snapshot por request: DataFrames y vectores siempre consistentes
+    snapshot = catalog.current
+    engine = get_trend_engine(snapshot)
+
+    # 2. Un solo pase: las queries se codifican una vez y se puntúan contra todos los catálogos
+    ranking = engine.rank(grouped_trends, encoder, top_n=TRENDS_TOP_N)
+    leaderboards = ranking["catalogs"]
+
+    print(f"🗂️ Caché de queries: {query_cache.stats()}")
+
+    return {
+        "period": f"Last {days} days",
+        "popularCourse": popular_course_predictor.summarize(leaderboards.get("courses")),
+        "popularTopic": summarize(leaderboards.get("topics"), TOPIC_RULES, "predictedTopic",
+                                  "Tendencia basada en {count} búsquedas."),
+        "popularBook": popular_resource_predictor.summarize(leaderboards.get("books")),
+        # Top-N por catálogo: {id, name, score, confidence, searchCount}
+        "leaderboards": leaderboards,
+        # Queries crudas vs canónicas enviadas al modelo
+        "queryStats": ranking["canonicalization"]
+    }
+
+
 @app.route('/api/trends', methods=['GET'])
 def trends():
     """
-    📈 TENDENCIAS (Popularidad)
-    Usa: popular_course_predictor + popular_topic_predictor
+    📈 TENDENCIAS (Popularidad) con caché de respuestas por 'days'.
+    El panel admin hace polling: se sirve la última respuesta buena y se
+    recalcula en segundo plano cuando vence el TTL.
     """
+    if service_state["status"] != "ready":
+        return jsonify({"error": "Servicio de ML iniciando", "status": service_state["status"]}), 503
+
     try:
-        days = request.args.get('days', default=30, type=int)
-        
-        # 1. Obtener historial crudo de SQL
-        print(f"📊 Obteniendo tendencias para los últimos {days} días...")
-        raw_history = get_search_trends_data(days)
-        
-        if raw_history.empty:
-            print("⚠️ No hay historial de búsquedas reciente.")
-            return jsonify({
-                "period": f"Last {days} days",
-                "popularCourse": {"predictedCourse": None, "reason": "Sin datos"},
-                "popularTopic": {"predictedTopic": None, "reason": "Sin datos"}
-            })
-
-        # 2. Preprocesamiento
-        # Aseguramos que created_at sea datetime
-        raw_history['created_at'] = pd.to_datetime(raw_history['created_at'])
-        
-        # Agrupar por query
-        grouped_trends = raw_history.groupby('query')['created_at'].apply(list).reset_index()
-        grouped_trends.rename(columns={'created_at': 'dates'}, inplace=True)
-        grouped_trends['count'] = grouped_trends['dates'].apply(len)
-        
-        print(f"📊 Historial procesado: {len(grouped_trends)} queries únicas.")
-
-        # 3. Predecir Curso Popular
-        pop_course = popular_course_predictor.predict(
-            global_data["courses_df"],
-            grouped_trends,
-            global_data["embeddings"],
-            ml_model
-        )
-
-        # 4. Predecir Libro Popular
-        pop_book = popular_resource_predictor.predict(
-            global_data["books_df"],
-            grouped_trends,
-            global_data["book_embeddings"],
-            ml_model
-        )
-
-        return jsonify({
-            "period": f"Last {days} days",
-            "popularCourse": pop_course,
-            "popularTopic": None,
-            "popularBook": pop_book
-        })
+        days = min(max(request.args.get('days', default=30, type=int), 1), MAX_TRENDS_DAYS)
+        return jsonify(trends_cache.get(days))
 
     except Exception as e:
         import traceback
         traceback.print_exc() # Imprime el error real en la consola
         print(f"❌ Error en /api/trends: {e}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/catalog/refresh', methods=['POST'])
+def catalog_refresh():
+    """Pide una recarga del catálogo en segundo plano; responde sin esperar."""
+    catalog.request_refresh()
+    return jsonify({"status": "scheduled", "currentVersion": catalog.current.version}), 202
+
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """
+    🔎 BÚSQUEDA SEMÁNTICA sobre el catálogo en memoria.
+    Parámetros: q (texto), k (1-50, default 10), types (courses,topics,books).
+    Devuelve los hits ordenados por similitud coseno.
+    """
+    if service_state["status"] != "ready":
+        return jsonify({"error": "Servicio de ML iniciando", "status": service_state["status"]}), 503
+
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({"error": "Parámetro 'q' requerido"}), 400
+    k = min(max(request.args.get('k', default=10, type=int), 1), MAX_SEARCH_K)
+    try:
+        types = parse_search_types(request.args.get('types'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Las búsquedas concurrentes se fusionan en el encoder_service
+        query_vector = search_encoder.encode([q])
+        snapshot = catalog.current
+        hits = search_catalog(snapshot, query_vector, k, types)[0]
+        return jsonify({"query": q, "k": k, "types": types, "catalogVersion": snapshot.version, "hits": hits})
+
+    except Exception as e:
+        print(f"❌ Error en /api/search: {e}")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,196 @@
+# ml_service/batching.py
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+# Tope de textos por forward pass y espera máxima para juntar llamadas concurrentes
+BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("ML_BATCH_MAX_WAIT_MS", "5"))
+# Ventana de muestras para los percentiles de las métricas
+_METRICS_WINDOW = 2048
+
+
+class MicroBatcher:
+    """
+    Junta ítems que llegan de hilos distintos y los procesa en una sola llamada.
+
+    - submit(item) devuelve un Future; el hilo del request espera su resultado.
+    - Un worker toma el primer ítem de la cola y sigue juntando hasta llenar
+      'max_batch_size' (medido con item_size, por defecto 1 por ítem) o agotar
+      'max_wait_ms' desde ese primer ítem. Un ítem que no entra pasa al lote siguiente.
+    - process_batch(items) recibe la lista y devuelve un resultado por ítem, en orden.
+    Si process_batch falla, la excepción se propaga a todos los Futures del lote.
+    """
+
+    def __init__(self, process_batch, max_batch_size=None, max_wait_ms=None, name="micro-batcher",
+                 item_size=None):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size or BATCH_MAX_SIZE
+        self.max_wait = (BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.name = name
+        self.item_size = item_size or (lambda item: 1)
+        self._queue = queue.Queue()
+        self._carry = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Métricas (las escribe solo el worker; stats() lee bajo lock)
+        self._metrics_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=_METRICS_WINDOW)
+        self._queue_delays = deque(maxlen=_METRICS_WINDOW)
+        self._process_times = deque(maxlen=_METRICS_WINDOW)
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_worker(self):
+        # Se arranca en el primer submit: cada proceso (incluso tras un fork) tiene su worker
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def _collect(self):
+        first, self._carry = self._carry or self._queue.get(), None
+        batch = [first]
+        size = self.item_size(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Lo ya encolado se toma sin esperar; después, solo hasta el deadline
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            entry_size = self.item_size(entry[0])
+            if size + entry_size > self.max_batch_size:
+                self._carry = entry
+                break
+            batch.append(entry)
+            size += entry_size
+        return batch, size
+
+    def _record(self, batch, size, started, finished):
+        with self._metrics_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self._batch_sizes.append(size)
+            self._queue_delays.extend(started - enqueued for _, _, enqueued in batch)
+            self._process_times.append(finished - started)
+
+    def _run(self):
+        while True:
+            batch, size = self._collect()
+            started = time.monotonic()
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self._record(batch, size, started, time.monotonic())
+
+    def stats(self):
+        """Tamaño de lote y demora en cola (ms) sobre las últimas muestras."""
+        with self._metrics_lock:
+            sizes = np.asarray(self._batch_sizes, dtype=np.float64)
+            delays = np.asarray(self._queue_delays, dtype=np.float64) * 1000
+            process = np.asarray(self._process_times, dtype=np.float64) * 1000
+            batches, items = self.batches, self.items
+
+        def pct(values, q):
+            return round(float(np.percentile(values, q)), 2) if len(values) else 0.0
+
+        return {
+            "batches": batches,
+            "items": items,
+            "queued": self._queue.qsize(),
+            "avgBatchSize": round(float(sizes.mean()), 2) if len(sizes) else 0.0,
+            "maxBatchSize": int(sizes.max()) if len(sizes) else 0,
+            "queueDelayMsP50": pct(delays, 50),
+            "queueDelayMsP99": pct(delays, 99),
+            "batchMsP50": pct(process, 50),
+            "batchMsP99": pct(process, 99),
+        }
+
+
+class EncoderService:
+    """
+    Servicio central de encoding con la interfaz .encode(list) de SentenceTransformer.
+
+    Los textos de llamadas concurrentes (refresh del catálogo, predictores,
+    /api/search) se fusionan en un único forward pass de hasta 'max_batch_size'
+    textos. Una llamada grande se parte en bloques de ese tamaño que se
+    encolan de a uno, así un request corto espera como mucho el bloque en
+    curso y no el catálogo entero.
+    Las llamadas con kwargs específicos van directo al modelo (no se mezclan).
+    """
+
+    def __init__(self, model, max_batch_size=None, max_wait_ms=None):
+        self.model = model
+        self.batcher = MicroBatcher(
+            self._encode_batch, max_batch_size, max_wait_ms, name="encoder-service", item_size=len
+        )
+
+    def _encode_batch(self, chunks):
+        texts = [text for chunk in chunks for text in chunk]
+        vectors = np.asarray(self.model.encode(texts), dtype=np.float32)
+        bounds = np.cumsum([len(chunk) for chunk in chunks])[:-1]
+        return np.split(vectors, bounds)
+
+    def submit(self, texts):
+        """
+        Encola los textos y devuelve un Future con la matriz (len(texts), dim).
+        Una llamada grande libera sus bloques de a uno: el siguiente se encola
+        recién cuando termina el anterior, así lo que llegue mientras tanto
+        (p. ej. una búsqueda) entra en la cola antes que el resto del trabajo.
+        """
+        texts = list(texts)
+        step = self.batcher.max_batch_size
+        if 0 < len(texts) <= step:
+            return self.batcher.submit(texts)
+
+        result = Future()
+        if not texts:
+            result.set_result(np.asarray(self.model.encode([]), dtype=np.float32))
+            return result
+
+        parts = []
+
+        def submit_next(previous=None):
+            if previous is not None:
+                try:
+                    parts.append(previous.result())
+                except Exception as e:
+                    result.set_exception(e)
+                    return
+            start = len(parts) * step
+            if start >= len(texts):
+                result.set_result(np.vstack(parts))
+                return
+            # El callback corre en el worker al cerrar el bloque: encola el próximo sin hilo extra
+            self.batcher.submit(texts[start:start + step]).add_done_callback(submit_next)
+
+        submit_next()
+        return result
+
+    def encode(self, texts, **kwargs):
+        if kwargs:
+            return self.model.encode(list(texts), **kwargs)
+        return self.submit(texts).result()
+
+    def stats(self):
+        return self.batcher.stats()
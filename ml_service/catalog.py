@@ -0,0 +1,231 @@
+# ml_service/catalog.py
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+try:
+    from ml_service.similarity import l2_normalize
+    from ml_service.lexical_index import LexicalIndex
+    from ml_service.trend_engine import COURSE_RULES, BOOK_RULES, TOPIC_RULES
+except ImportError:
+    from similarity import l2_normalize
+    from lexical_index import LexicalIndex
+    from trend_engine import COURSE_RULES, BOOK_RULES, TOPIC_RULES
+
+
+# Tamaño de bloque al vectorizar catálogos grandes (acota memoria y da progreso)
+CATALOG_BATCH_SIZE = int(os.getenv("ML_CATALOG_BATCH_SIZE", "512"))
+
+
+def _encode_in_batches(encoder, texts, label, batch_size=None):
+    """Codifica por bloques; con CachedEncoder cada bloque solo paga los textos nuevos."""
+    batch_size = batch_size or CATALOG_BATCH_SIZE
+    print(f"   🧠 Vectorizando {len(texts)} {label}...")
+    blocks = [
+        encoder.encode(texts[start:start + batch_size])
+        for start in range(0, len(texts), batch_size)
+    ]
+    return np.vstack(blocks) if blocks else None
+
+
+def book_soup(books_df):
+    """Texto de cada libro: título + autor + editorial + temas."""
+    return (
+        books_df['name'].fillna('') + " " +
+        books_df.get('author', pd.Series('', index=books_df.index)).fillna('') + " " +
+        books_df.get('publisher', pd.Series('', index=books_df.index)).fillna('') + " " +
+        books_df.get('topics_soup', pd.Series('', index=books_df.index)).fillna('')
+    ).str.split().str.join(' ')
+
+
+def _freeze(matrix):
+    """
+    Deja la matriz L2-normalizada en float32 (lista para coseno = producto
+    matricial) y de solo lectura: un snapshot publicado nunca se modifica.
+    """
+    if matrix is None:
+        return None
+    matrix = l2_normalize(matrix)
+    matrix.setflags(write=False)
+    return matrix
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    Foto inmutable del catálogo (DataFrames + matrices de embeddings).
+    Cada DataFrame viaja junto a SU matriz: un request que toma el snapshot
+    nunca ve cursos nuevos con vectores viejos. Los DataFrames no se mutan
+    después de publicarse; para cambiar algo se construye un snapshot nuevo.
+    """
+    courses_df: pd.DataFrame = field(default_factory=pd.DataFrame)
+    topics_df: pd.DataFrame = field(default_factory=pd.DataFrame)
+    books_df: pd.DataFrame = field(default_factory=pd.DataFrame)
+    course_embeddings: np.ndarray = None
+    topic_embeddings: np.ndarray = None
+    book_embeddings: np.ndarray = None
+    # Índices vectoriales (exacto o HNSW) sobre los mismos vectores; None si no hay registro
+    course_index: object = None
+    book_index: object = None
+    # Índices léxicos (postings de tokens y trigramas) sobre los nombres normalizados
+    course_lexical: object = None
+    topic_lexical: object = None
+    book_lexical: object = None
+    version: int = 0
+    built_at: float = 0.0
+
+    @property
+    def is_empty(self):
+        return self.courses_df.empty and self.topics_df.empty and self.books_df.empty
+
+
+def _sync_index(index_registry, name, df, embeddings, previous_index):
+    if index_registry is None or embeddings is None or 'id' not in df.columns:
+        return previous_index
+    return index_registry.sync(name, df['id'].tolist(), embeddings)
+
+
+def _sync_lexical(df, previous_df, previous_lexical, rules):
+    """
+    Índice léxico de los nombres. Se reutiliza el del snapshot anterior si el
+    DataFrame es el mismo o si los nombres no cambiaron (lo normal en un refresh).
+    """
+    if df is previous_df and previous_lexical is not None:
+        return previous_lexical
+    if df.empty or 'name' not in df.columns:
+        return None
+    names = df['name'].fillna('').tolist()
+    if previous_lexical is not None and previous_lexical.names == tuple(names):
+        return previous_lexical
+    return LexicalIndex(names, rules)
+
+
+def build_catalog(encoder, load_courses, load_topics, previous=None, version=1, load_books=None,
+                  index_registry=None):
+    """
+    Descarga y vectoriza el catálogo completo en objetos nuevos.
+    Sin encoder (modelo no cargado) se publican los datos sin vectores.
+    Si un loader devuelve vacío (los conectores tragan errores de DB) y el
+    snapshot anterior tenía datos, se reutiliza esa parte en vez de publicar vacío.
+    Con index_registry, los índices vectoriales solo reciben las filas nuevas o cambiadas.
+    """
+    previous = previous or CatalogSnapshot()
+
+    print("   🔄 Conectando a Supabase...")
+    courses_df = load_courses()
+    topics_df = load_topics()
+    books_df = load_books() if load_books else pd.DataFrame()
+
+    # A. Cursos
+    if courses_df.empty:
+        courses_df, course_embeddings = previous.courses_df, previous.course_embeddings
+    else:
+        courses_df = courses_df.copy()
+        # Feature Engineering: Concatenar Título + Temas para mayor contexto
+        courses_df['soup'] = courses_df['name'] + " " + courses_df['topics_soup'].fillna('')
+        course_embeddings = None
+        if encoder is not None:
+            course_embeddings = _encode_in_batches(encoder, courses_df['soup'].tolist(), "cursos")
+
+    # B. Temas
+    if topics_df.empty:
+        topics_df, topic_embeddings = previous.topics_df, previous.topic_embeddings
+    else:
+        topic_embeddings = None
+        if encoder is not None:
+            topic_embeddings = _encode_in_batches(encoder, topics_df['name'].fillna('').tolist(), "temas")
+
+    # C. Libros
+    if books_df.empty:
+        books_df, book_embeddings = previous.books_df, previous.book_embeddings
+    else:
+        books_df = books_df.copy()
+        books_df['soup'] = book_soup(books_df)
+        book_embeddings = None
+        if encoder is not None:
+            book_embeddings = _encode_in_batches(encoder, books_df['soup'].tolist(), "libros")
+
+    course_embeddings = _freeze(course_embeddings)
+    book_embeddings = _freeze(book_embeddings)
+
+    return CatalogSnapshot(
+        courses_df=courses_df,
+        topics_df=topics_df,
+        books_df=books_df,
+        course_embeddings=course_embeddings,
+        topic_embeddings=_freeze(topic_embeddings),
+        book_embeddings=book_embeddings,
+        course_index=_sync_index(index_registry, "courses", courses_df, course_embeddings, previous.course_index),
+        book_index=_sync_index(index_registry, "books", books_df, book_embeddings, previous.book_index),
+        course_lexical=_sync_lexical(courses_df, previous.courses_df, previous.course_lexical, COURSE_RULES),
+        topic_lexical=_sync_lexical(topics_df, previous.topics_df, previous.topic_lexical, TOPIC_RULES),
+        book_lexical=_sync_lexical(books_df, previous.books_df, previous.book_lexical, BOOK_RULES),
+        version=version,
+        built_at=time.time()
+    )
+
+
+class CatalogRefresher:
+    """
+    Publica snapshots del catálogo con un único swap de referencia.
+
+    - current: lectura sin locks (asignar un atributo es atómico en CPython).
+    - refresh(): reconstruye en el hilo que llama y publica (a demanda, síncrono).
+    - request_refresh(): despierta al worker de fondo sin bloquear.
+    - start(): worker que recarga cada 'interval_seconds' (0 = solo a demanda).
+    Mientras se reconstruye, los requests siguen leyendo el snapshot anterior.
+    """
+
+    def __init__(self, build, interval_seconds=0, on_publish=None):
+        self._build = build
+        self.interval_seconds = interval_seconds
+        self.on_publish = on_publish
+        self._snapshot = CatalogSnapshot()
+        self._build_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self):
+        return self._snapshot
+
+    def refresh(self):
+        with self._build_lock:
+            previous = self._snapshot
+            snapshot = self._build(previous, previous.version + 1)
+            self._snapshot = snapshot
+        print(f"   ✅ Catálogo v{snapshot.version} publicado.")
+        if self.on_publish:
+            self.on_publish(snapshot)
+        return snapshot
+
+    def request_refresh(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self.interval_seconds or None)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                # El snapshot anterior sigue publicado
+                print(f"   ❌ Error recargando catálogo: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="catalog-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
@@ -1,9 +1,17 @@
 # ml_service/db_connector.py
+import math
 import os
+from datetime import datetime
+
 import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
+try:
+    from ml_service.decay import DECAY_LAMBDA, to_naive_datetimes
+except ImportError:
+    from decay import DECAY_LAMBDA, to_naive_datetimes
+
 load_dotenv()
 
 # ✅ CORRECCIÓN: Usar el nombre específico para Python
@@ -81,19 +89,96 @@ def get_books_data():
         print(f"❌ [DB] Error descargando libros: {e}")
         return pd.DataFrame()
 
-def get_search_trends_data(days=30):
-    """Historial de búsquedas crudo para análisis de tendencias"""
+# Agregado de tendencias en el servidor: una fila por query con el mismo peso que
+# decay.decay_weights (e^(-λ·días completos), edad negativa -> 0). Una consulta por dialecto.
+_TRENDS_AGGREGATE_SQL = {
+    "postgresql": """
+    SELECT query,
+           COUNT(*) AS count,
+           SUM(EXP(-:lambda_val * GREATEST(
+               FLOOR(EXTRACT(EPOCH FROM (CAST(:now AS timestamp) - CAST(created_at AS timestamp))) / 86400), 0
+           ))) AS weight,
+           MAX(created_at) AS last_seen
+    FROM search_history
+    WHERE created_at >= CAST(:now AS timestamp) - make_interval(days => :days)
+    AND query IS NOT NULL AND query <> ''
+    GROUP BY query
+    """,
+    # Réplica local para tests: fechas como texto ISO; la división entera ya trunca los días
+    "sqlite": """
+    SELECT query,
+           COUNT(*) AS count,
+           SUM(exp(-:lambda_val * MAX(
+               (CAST(strftime('%s', :now) AS INTEGER) - CAST(strftime('%s', created_at) AS INTEGER)) / 86400, 0
+           ))) AS weight,
+           MAX(created_at) AS last_seen
+    FROM search_history
+    WHERE created_at >= datetime(:now, '-' || :days || ' days')
+    AND query IS NOT NULL AND query <> ''
+    GROUP BY query
+    """,
+}
+
+def get_search_trends_aggregated(days=30, engine=None, now=None, lambda_val=DECAY_LAMBDA):
+    """
+    Tendencias agregadas en la base (GROUP BY en SQL, consulta parametrizada):
+    query | count | weight | last_seen, mismo formato que decay.aggregate_trends.
+    Lo transferido y la memoria de pandas escalan con las queries únicas, no con
+    las búsquedas crudas. Funciona sobre PostgreSQL y sobre SQLite (tests).
+    """
+    columns = ['query', 'count', 'weight', 'last_seen']
+    now = pd.Timestamp(now if now is not None else datetime.now())
+    if now.tzinfo:
+        now = now.tz_localize(None)
+    params = {"days": int(days), "now": now.to_pydatetime(), "lambda_val": float(lambda_val)}
+
+    try:
+        engine = engine or get_db_engine()
+        sql = _TRENDS_AGGREGATE_SQL.get(engine.dialect.name)
+        if sql is None:
+            raise ValueError(f"Dialecto no soportado para el agregado de tendencias: {engine.dialect.name}")
+        if engine.dialect.name == "sqlite":
+            params["now"] = now.strftime('%Y-%m-%d %H:%M:%S')
+        with engine.connect() as conn:
+            if engine.dialect.name == "sqlite":
+                # exp() solo existe si SQLite se compiló con funciones matemáticas
+                conn.connection.dbapi_connection.create_function("exp", 1, math.exp, deterministic=True)
+            df = pd.read_sql(text(sql), conn, params=params)
+    except Exception as e:
+        print(f"❌ [DB] Error agregando tendencias: {e}")
+        return pd.DataFrame(columns=columns)
+
+    df['count'] = df['count'].astype('int64')
+    df['weight'] = df['weight'].astype('float64')
+    df['last_seen'] = to_naive_datetimes(df['last_seen'])
+    print(f"📊 [DB] Tendencias agregadas: {len(df)} queries únicas.")
+    return df[columns]
+
+def get_search_history_since(since=None, days=30):
+    """
+    Filas nuevas de search_history para la agregación incremental.
+    Sin 'since' devuelve toda la ventana; con 'since' solo created_at > since.
+    Incluye el id para que el agregador descarte las filas del solape ya sumadas.
+    """
+    params = {"days": int(days)}
+    watermark_filter = ""
+    if since is not None:
+        watermark_filter = "AND created_at > :since"
+        params["since"] = since
+
     query = text(f"""
-    SELECT query, results_count, created_at 
-    FROM search_history 
-    WHERE created_at >= NOW() - INTERVAL '{days} days'
+    SELECT id, query, created_at
+    FROM search_history
+    WHERE created_at >= NOW() - make_interval(days => :days)
+    {watermark_filter}
     AND query IS NOT NULL
+    ORDER BY created_at
     """)
     try:
         engine = get_db_engine()
-        return pd.read_sql(query, engine)
+        return pd.read_sql(query, engine, params=params)
     except Exception as e:
-        print(f"❌ [DB] Error historial: {e}")
+        print(f"❌ [DB] Error historial incremental: {e}")
         return pd.DataFrame()
 
 def get_all_topics():
@@ -0,0 +1,200 @@
+# ml_service/decay.py
+import math
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from ml_service.utils import canonical_forms
+except ImportError:
+    from utils import canonical_forms
+
+# Tasa de decaimiento compartida por todos los predictores: e^(-λ * días)
+DECAY_LAMBDA = 0.05
+# Peso asignado a fechas ilegibles (mismo fallback que el cálculo histórico)
+FALLBACK_WEIGHT = 0.1
+
+
+def calculate_decay_weight(date_obj, lambda_val=DECAY_LAMBDA):
+    """
+    Calcula el peso basado en decaimiento exponencial.
+    Fórmula: e^(-lambda * días_transcurridos)
+    Versión escalar (una fecha); para columnas completas usar decay_weights().
+    """
+    try:
+        if isinstance(date_obj, str):
+            date_obj = pd.to_datetime(date_obj)
+
+        now = datetime.now()
+        if isinstance(date_obj, pd.Timestamp):
+            date_obj = date_obj.to_pydatetime()
+
+        if date_obj.tzinfo:
+            date_obj = date_obj.replace(tzinfo=None)
+
+        days_diff = (now - date_obj).days
+        if days_diff < 0: days_diff = 0
+
+        return math.exp(-lambda_val * days_diff)
+    except Exception:
+        return FALLBACK_WEIGHT
+
+
+def _strip_tz(value):
+    parsed = pd.to_datetime(value, errors='coerce')
+    return parsed.tz_localize(None) if isinstance(parsed, pd.Timestamp) and parsed.tzinfo else parsed
+
+
+def to_naive_datetimes(values):
+    """
+    Convierte una columna de fechas (strings, Timestamps, con o sin zona horaria)
+    a datetime64 sin zona. Igual que el cálculo escalar, se descarta el tzinfo
+    conservando la hora local (replace(tzinfo=None)). Fechas inválidas -> NaT.
+    """
+    if isinstance(values, pd.Series) and isinstance(values.dtype, np.dtype) and values.dtype.kind == 'M':
+        return values  # ya es datetime64 sin zona (lo habitual: sale de aggregate_trends)
+    values = pd.Series(values)
+    try:
+        dates = pd.to_datetime(values, errors='coerce')
+    except ValueError:
+        # Columna con zonas horarias mezcladas: conversión elemento a elemento (caso raro)
+        dates = pd.to_datetime(values.map(_strip_tz), errors='coerce')
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        dates = dates.dt.tz_localize(None)
+    return dates
+
+
+def decay_weights(created_at, now=None, lambda_val=DECAY_LAMBDA):
+    """
+    Pesos e^(-λ * días) para TODA una columna de fechas en una sola pasada NumPy.
+    'now' se lee una sola vez (o se inyecta, útil para tests y jobs batch).
+    Los días transcurridos se truncan a días completos, como timedelta.days.
+    """
+    dates = to_naive_datetimes(created_at)
+    now = pd.Timestamp(now if now is not None else datetime.now())
+    if now.tzinfo:
+        now = now.tz_localize(None)
+
+    age_days = (now - dates).dt.days.to_numpy(dtype=np.float64, na_value=np.nan)
+    weights = np.exp(-lambda_val * np.clip(age_days, 0, None))
+    return np.where(np.isnan(age_days), FALLBACK_WEIGHT, weights)
+
+
+def aggregate_trends(history_df, now=None, lambda_val=DECAY_LAMBDA):
+    """
+    Agrupa el historial crudo (query, created_at) en una fila por query:
+    query | count | weight (suma de pesos decaídos) | last_seen
+    Reemplaza el antiguo groupby(...).apply(list) + decaimiento fecha por fecha.
+    """
+    columns = ['query', 'count', 'weight', 'last_seen']
+    if history_df is None or history_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    frame = pd.DataFrame({
+        'query': history_df['query'].to_numpy(),
+        'weight': decay_weights(history_df['created_at'], now=now, lambda_val=lambda_val),
+        'created_at': to_naive_datetimes(history_df['created_at']).to_numpy()
+    })
+    grouped = frame.groupby('query').agg(
+        count=('weight', 'size'),
+        weight=('weight', 'sum'),
+        last_seen=('created_at', 'max')
+    ).reset_index()
+    return grouped[columns]
+
+
+def _valid_rows(trends_df):
+    """Filas con query no vacía (el mismo DataFrame, sin copiar, si ya lo son todas)."""
+    queries = trends_df['query'].to_numpy(dtype=object)
+    keep = pd.notna(queries)
+    keep[keep] = queries[keep] != ''
+    return trends_df if keep.all() else trends_df[keep]
+
+
+def trend_query_weights(trends_df):
+    """
+    Extrae (queries, pesos, conteos) de un DataFrame de tendencias ya agrupado.
+    Acepta el formato nuevo (columna 'weight') y el heredado (lista 'dates').
+    """
+    return _query_weights(_valid_rows(trends_df))
+
+
+def _query_weights(valid):
+    queries = valid['query'].tolist()
+    counts = (
+        valid['count'].fillna(0).to_numpy(dtype=np.float64)
+        if 'count' in valid.columns else np.zeros(len(valid))
+    )
+
+    if 'weight' in valid.columns:
+        weights = valid['weight'].to_numpy(dtype=np.float64)
+    elif 'dates' in valid.columns:
+        date_lists = valid['dates'][valid['dates'].apply(lambda d: isinstance(d, list))]
+        # Las listas vacías no aportan peso (explode las convertiría en NaN)
+        exploded = date_lists[date_lists.apply(len) > 0].explode()
+        per_date = pd.Series(decay_weights(exploded.to_numpy()), index=exploded.index)
+        summed = per_date.groupby(level=0).sum().reindex(valid.index, fill_value=0.0)
+
+        fallback_counts = valid['count'].fillna(1) if 'count' in valid.columns else 1
+        fallback = pd.Series(fallback_counts, index=valid.index) * FALLBACK_WEIGHT
+        is_list = valid.index.isin(date_lists.index)
+        weights = np.where(is_list, summed.to_numpy(), fallback.to_numpy(dtype=np.float64))
+    else:
+        weights = counts * FALLBACK_WEIGHT
+
+    return queries, weights, counts
+
+
+def canonicalize_trends(trends_df, stopwords=None):
+    """
+    Fusiona las queries equivalentes (ver utils.canonical_query) ANTES de
+    codificarlas: suma pesos decaídos y conteos, y conserva la variante cruda
+    más buscada como texto representativo.
+    Devuelve (columnas, stats): columnas es un dict de listas/arrays alineados
+    query | normalized | canonical | count | weight | last_seen ('normalized' es
+    el representativo normalizado SIN plegar stopwords) y stats =
+    {'rawQueries', 'uniqueQueries', 'reduction'}. Corre en cada rank: sin
+    DataFrame por llamada. Las queries que quedan vacías al normalizar se descartan.
+    """
+    valid = _valid_rows(trends_df)
+    queries, weights, counts = _query_weights(valid)
+    stats = {"rawQueries": len(queries), "uniqueQueries": 0, "reduction": 0.0}
+
+    normals, folded = canonical_forms(queries, stopwords)
+    kept = [i for i, key in enumerate(folded) if key]
+    if not kept:
+        return _canonical_columns([], [], [], np.zeros(0), np.zeros(0), np.zeros(0, dtype='datetime64[ns]')), stats
+
+    # Un grupo por forma canónica, en orden de primera aparición (dict plano)
+    groups = {}
+    group = np.fromiter((groups.setdefault(folded[i], len(groups)) for i in kept), dtype=np.int64, count=len(kept))
+    n_groups = len(groups)
+    counts, weights = counts[kept], weights[kept]
+
+    # Representante: la variante más buscada (empate -> la primera en aparecer)
+    by_count = np.lexsort((np.arange(len(group)), -counts, group))
+    representative = [kept[i] for i in by_count[np.searchsorted(group[by_count], np.arange(n_groups))]]
+
+    if 'last_seen' in valid.columns:
+        seen = to_naive_datetimes(valid['last_seen']).to_numpy().astype('datetime64[ns]')[kept].astype(np.int64)
+        # NaT es el mínimo de int64: no gana un máximo salvo que todo el grupo sea NaT
+        latest = np.full(n_groups, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(latest, group, seen)
+        last_seen = latest.astype('datetime64[ns]')
+    else:
+        last_seen = np.full(n_groups, np.datetime64('NaT'), dtype='datetime64[ns]')
+
+    stats["uniqueQueries"] = n_groups
+    stats["reduction"] = round(1 - n_groups / stats["rawQueries"], 4)
+    return _canonical_columns(
+        [queries[i] for i in representative], [normals[i] for i in representative], list(groups),
+        np.bincount(group, weights=counts, minlength=n_groups),
+        np.bincount(group, weights=weights, minlength=n_groups),
+        last_seen
+    ), stats
+
+
+def _canonical_columns(queries, normals, canonical, counts, weights, last_seen):
+    return {'query': queries, 'normalized': normals, 'canonical': canonical,
+            'count': counts, 'weight': weights, 'last_seen': last_seen}
@@ -0,0 +1,236 @@
+# ml_service/embedding_store.py
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from ml_service.similarity import l2_normalize
+except ImportError:
+    from similarity import l2_normalize
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.getenv(
+    "ML_EMBEDDING_CACHE",
+    os.path.join(BASE_DIR, "data_dump", "embedding_cache.sqlite")
+)
+
+# Capacidad de la caché en memoria (vectores de ~384 floats -> ~1.5 KB c/u)
+DEFAULT_MEMORY_CACHE_SIZE = int(os.getenv("ML_QUERY_CACHE_SIZE", "50000"))
+
+# SQLite limita los parámetros por sentencia; consultamos por bloques
+_SQL_BATCH = 500
+
+
+def normalize_for_cache(text):
+    """Normalización mínima (espacios) para que el mismo texto siempre tenga la misma clave."""
+    if not isinstance(text, str):
+        text = "" if text is None else str(text)
+    return " ".join(text.split())
+
+
+def embedding_key(model_name, text):
+    """Clave direccionada por contenido: hash de (modelo, texto normalizado)."""
+    payload = f"{model_name}\x00{normalize_for_cache(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Caché persistente de embeddings en SQLite (un archivo en data_dump/).
+    Cada fila guarda el vector float32 serializado; sobrevive a reinicios del
+    servicio y se comparte entre workers de gunicorn y el job batch.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+    def get_many(self, keys):
+        """Devuelve {key: vector} solo para las claves presentes en disco."""
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                block = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(block))
+                rows = self._conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})",
+                    block
+                ).fetchall()
+                for key, dim, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32, count=dim)
+        return found
+
+    def put_many(self, model_name, items):
+        """Guarda [(key, vector), ...] en una sola transacción."""
+        rows = [
+            (key, model_name, int(vec.shape[0]), np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in items
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def count(self, model_name=None):
+        with self._lock:
+            if model_name is None:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (model_name,)
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LRUEmbeddingCache:
+    """
+    Memoización en memoria, acotada y thread-safe (LRU) de embeddings por clave.
+    Se comparte entre predictores para que cada query se codifique una sola vez
+    por proceso, no una vez por predictor en cada request.
+    """
+
+    def __init__(self, capacity=DEFAULT_MEMORY_CACHE_SIZE):
+        self.capacity = max(0, int(capacity))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                vec = self._data.get(key)
+                if vec is None:
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                found[key] = vec
+                self.hits += 1
+        return found
+
+    def put_many(self, items):
+        if self.capacity == 0:
+            return
+        with self._lock:
+            for key, vec in items:
+                self._data[key] = vec
+                self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 4) if total else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CachedEncoder:
+    """
+    Envoltorio de SentenceTransformer con la misma interfaz .encode(list).
+    Busca primero en memoria (LRU), luego en disco (SQLite) y solo los textos
+    que faltan en ambas capas llegan al modelo.
+    Con normalize=True devuelve filas L2-normalizadas en float32, listas para
+    similitud coseno como un simple producto matricial.
+    """
+
+    def __init__(self, model, model_name, store=None, memory_cache=None, normalize=False):
+        self.model = model
+        self.model_name = model_name
+        self.store = store
+        self.memory_cache = memory_cache
+        self.normalize = normalize
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, texts, **kwargs):
+        vectors = self._encode(texts, **kwargs)
+        return l2_normalize(vectors) if self.normalize and len(vectors) else vectors
+
+    def _encode(self, texts, **kwargs):
+        texts = [normalize_for_cache(t) for t in texts]
+        if not texts:
+            return self.model.encode(texts, **kwargs)
+        if self.store is None and self.memory_cache is None:
+            return np.asarray(self.model.encode(texts, **kwargs), dtype=np.float32)
+
+        keys = [embedding_key(self.model_name, t) for t in texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        # 1. Memoria
+        cached = self.memory_cache.get_many(unique_keys) if self.memory_cache is not None else {}
+
+        # 2. Disco
+        pending = [k for k in unique_keys if k not in cached]
+        if pending and self.store is not None:
+            from_disk = self.store.get_many(pending)
+            if from_disk and self.memory_cache is not None:
+                self.memory_cache.put_many(from_disk.items())
+            cached.update(from_disk)
+
+        # 3. Modelo: cada texto faltante se codifica una sola vez aunque se repita en la lista
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += sum(1 for k in keys if k in cached)
+        self.misses += len(missing)
+
+        if missing:
+            print(f"   🧠 Embeddings: {len(missing)} textos nuevos, {len(cached)} desde caché.")
+            vectors = np.asarray(self.model.encode(list(missing.values()), **kwargs), dtype=np.float32)
+            new_items = list(zip(missing.keys(), vectors))
+            if self.store is not None:
+                self.store.put_many(self.model_name, new_items)
+            if self.memory_cache is not None:
+                self.memory_cache.put_many(new_items)
+            cached.update(new_items)
+
+        return np.vstack([cached[k] for k in keys])
+
+
+def open_default_store():
+    """Abre la caché por defecto; si el disco no es escribible el servicio sigue sin caché."""
+    try:
+        return EmbeddingStore(DEFAULT_CACHE_PATH)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ Caché de embeddings deshabilitada: {e}")
+        return None
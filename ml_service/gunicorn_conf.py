@@ -0,0 +1,29 @@
+# ml_service/gunicorn_conf.py
+# Uso: gunicorn -c ml_service/gunicorn_conf.py ml_service.app:app
+import gc
+import os
+
+bind = os.getenv("ML_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("ML_WORKERS", "2"))
+threads = int(os.getenv("ML_THREADS", "4"))
+timeout = int(os.getenv("ML_TIMEOUT", "120"))
+
+# Con ML_PRELOAD=1 el master importa la app y carga el modelo una sola vez;
+# los workers heredan los pesos por copy-on-write en lugar de cargar uno cada uno.
+preload_app = os.getenv("ML_PRELOAD", "0") == "1"
+if preload_app:
+    raw_env = ["ML_PRELOAD=1"]
+
+
+def pre_fork(server, worker):
+    # Congela los objetos ya creados (modelo) para que el GC no toque sus páginas
+    # y el copy-on-write las mantenga compartidas entre workers.
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Los hilos no sobreviven al fork: cada worker arma su catálogo y su refresher.
+    if preload_app:
+        from ml_service import app as ml_app
+        ml_app.initialize_app()
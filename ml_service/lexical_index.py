@@ -0,0 +1,287 @@
+# ml_service/lexical_index.py
+import numpy as np
+
+try:
+    from ml_service.utils import normalize_text, normalize_texts
+except ImportError:
+    from utils import normalize_text, normalize_texts
+
+
+# Trigramas de caracteres sobre el alfabeto de normalize_text ([a-z0-9] + espacio):
+# cada trigrama es un entero c0·B² + c1·B + c2 (< B³ = 54872, cabe en uint16); el código 0 separa nombres.
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789 "
+_BASE = len(_ALPHABET) + 1
+_CODES = np.zeros(256, dtype=np.uint8)
+for _code, _char in enumerate(_ALPHABET, start=1):
+    _CODES[ord(_char)] = _code
+for _char in "\t\n\r\x0b\x0c":
+    _CODES[ord(_char)] = _ALPHABET.index(" ") + 1
+
+# Pares (query, ítem) candidatos por bloque en token_matches
+_PAIR_BLOCK = 16384
+
+
+def _id_dtype(n):
+    """Entero más chico para ids en [0, n): las postings de trigramas viven en cada snapshot."""
+    return np.uint16 if n <= np.iinfo(np.uint16).max + 1 else np.int32
+
+
+def run_starts(values):
+    """
+    Posiciones donde empieza cada tramo de valores iguales de un array YA ordenado.
+    Reemplaza a np.unique(..., return_index/return_counts) sobre datos ordenados:
+    np.unique vuelve a ordenar y reserva varios temporales por elemento.
+    """
+    if not len(values):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+
+
+def tokenize(text, rules, normalized=False):
+    """Conjunto de tokens según las reglas del catálogo (texto ya normalizado o no)."""
+    if not isinstance(text, str):
+        return set()
+    words = (text if normalized else normalize_text(text)).split()
+    return {w for w in words if w not in rules.stopwords and len(w) >= rules.min_token_len}
+
+
+def build_lexicon(names, rules):
+    """
+    Prepara UNA sola vez por ítem lo que el loop antiguo recalculaba por query:
+    ids de tokens (vocabulario), tamaño de cada conjunto y nombre normalizado.
+    La pertenencia (ítem, token) se guarda como claves enteras ordenadas
+    (ítem * tamaño_vocab + token) para poder consultarla con np.isin sin
+    materializar una matriz densa ítems x vocabulario.
+    """
+    norm_names = normalize_texts(names)
+    vocab = {}
+    token_ids = []
+    item_sizes = np.zeros(len(names), dtype=np.int64)
+    # Una pasada: el conjunto de tokens de cada ítem vive solo durante su iteración
+    for c, name in enumerate(norm_names):
+        tokens = tokenize(name, rules, normalized=True)
+        item_sizes[c] = len(tokens)
+        token_ids.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+
+    # +1: id reservado para tokens de la query que no existen en ningún ítem
+    stride = len(vocab) + 1
+    item_keys = np.repeat(np.arange(len(names), dtype=np.int64), item_sizes) * stride
+    item_keys += np.asarray(token_ids, dtype=np.int64)
+    item_keys.sort()
+
+    return {
+        "vocab": vocab,
+        "stride": stride,
+        "course_keys": item_keys,
+        "course_sizes": item_sizes,
+        # ASCII (salida de normalize_text): bytes y no UTF-32, 4 veces menos memoria
+        "norm_names": np.array(norm_names, dtype=np.bytes_)
+    }
+
+
+def _encode(text):
+    """Texto normalizado (str o bytes ASCII) -> códigos por carácter (0 = fuera del alfabeto)."""
+    if isinstance(text, str):
+        text = text.encode('ascii', 'replace')
+    return _CODES[np.frombuffer(text, dtype=np.uint8)]
+
+
+def _trigrams(codes):
+    """Ids de trigrama (int32) de cada posición y si es válido (ningún carácter fuera del alfabeto)."""
+    a, b, c = codes[:-2], codes[1:-1], codes[2:]
+    grams = a.astype(np.int32)
+    grams *= _BASE
+    grams += b
+    grams *= _BASE
+    grams += c
+    return grams, (a > 0) & (b > 0) & (c > 0)
+
+
+def _gather(items, starts, lengths):
+    """Concatena los tramos items[start:start+length] sin loop (en el orden de los tramos)."""
+    # Posición dentro de 'items' como suma acumulada de saltos: 1 dentro de un tramo y, donde
+    # empieza uno, la distancia desde el final del anterior. Un solo temporal int64 por par
+    # (un índice más chico no sirve: numpy lo convierte a intp al indexar)
+    nonempty = lengths > 0
+    starts, lengths = starts[nonempty], lengths[nonempty]
+    ends = np.cumsum(lengths)
+    index = np.ones(ends[-1] if len(ends) else 0, dtype=np.int64)
+    if len(index):
+        index[0] = starts[0]
+        index[ends[:-1]] = starts[1:] - starts[:-1] - lengths[:-1] + 1
+        np.cumsum(index, out=index)
+    return items[index]
+
+
+def _pair_keys(offsets, items, starts, lengths):
+    """Clave offset + ítem de cada ítem de los tramos items[start:start+length] (un offset por tramo)."""
+    keys = np.repeat(offsets, lengths)
+    keys += _gather(items, starts, lengths)
+    return keys
+
+
+class LexicalIndex:
+    """
+    Índice léxico invertido sobre los nombres normalizados de un catálogo.
+    Se arma una vez por snapshot (en el refresh) y responde, sin recorrer
+    todo el catálogo, qué ítems comparten tokens con una query (con su
+    Jaccard) y cuáles contienen la query como substring.
+
+    - lexicon: el de build_lexicon (ids de tokens, tamaños, nombres normalizados).
+    - postings token -> ítems y trigrama -> ítems como arrays enteros ordenados por clave
+      (las de trigramas, solo si las reglas usan substring_match).
+    """
+
+    def __init__(self, names, rules):
+        self.rules = rules
+        # Nombres de origen: el refresh reutiliza el índice si no cambiaron
+        self.names = tuple(names)
+        self.lexicon = build_lexicon(names, rules)
+        self.n_items = len(names)
+
+        # Postings de tokens ordenadas por (token, tamaño del ítem, ítem): el filtro
+        # por tamaño de Jaccard es un searchsorted sobre la clave compuesta.
+        stride = self.lexicon["stride"]
+        keys = self.lexicon["course_keys"]
+        tokens, items = keys % stride, keys // stride
+        sizes = self.lexicon["course_sizes"][items]
+        self.size_stride = int(self.lexicon["course_sizes"].max(initial=0)) + 1
+        order = np.lexsort((items, sizes, tokens))
+        self.token_keys = tokens[order] * self.size_stride + sizes[order]
+        self.token_items = items[order].astype(_id_dtype(self.n_items))
+
+        # Postings de trigramas: solo las usa shortest_containing (reglas con substring_match);
+        # un catálogo sin substring no paga su armado ni su memoria
+        self.ngram_keys = self.ngram_items = self.name_lengths = None
+        if rules.substring_match:
+            self._index_ngrams()
+
+    def _index_ngrams(self):
+        """Postings trigrama -> ítems: todos los nombres en un solo buffer, sin loop por nombre."""
+        codes = _encode(b"\x00".join(self.lexicon["norm_names"].tolist()))
+        grams, valid = _trigrams(codes)
+        item_dtype = _id_dtype(self.n_items)
+        owner = np.cumsum(codes == 0, dtype=item_dtype)[:-2] if len(codes) >= 3 else np.zeros(0, dtype=item_dtype)
+        # Clave (trigrama, ítem) en su sitio y en int32 mientras quepa: el armado corre
+        # en cada refresh con nombres nuevos y cada temporal del tamaño del buffer cuenta en el pico
+        if self.n_items * _BASE ** 3 >= np.iinfo(np.int32).max:
+            grams = grams.astype(np.int64)
+        grams *= self.n_items
+        grams += owner
+        del owner, codes
+        pairs = grams[valid]
+        del grams, valid
+        # Únicos por sort + tramos: np.unique sin return_* toma un camino por hash mucho más lento
+        pairs.sort()
+        pairs = pairs[run_starts(pairs)]
+        # Las postings de trigramas son lo más grande que guarda el snapshot por catálogo:
+        # trigrama < B³ cabe en uint16, el ítem según el tamaño del catálogo.
+        # ngram_keys se asigna al final: quien la ve armada ve también el resto
+        self.name_lengths = np.char.str_len(self.lexicon["norm_names"])
+        self.ngram_items = (pairs % self.n_items).astype(item_dtype)
+        self.ngram_keys = (pairs // self.n_items).astype(_id_dtype(_BASE ** 3))
+
+    def token_matches(self, token_ids, token_owner, query_sizes, min_jaccard):
+        """
+        Pares (query, ítem) con Jaccard >= min_jaccard (> 0), en lote.
+        token_ids/token_owner: tokens de las queries (ids del vocabulario; el id
+        reservado de 'desconocido' no tiene postings).
+        Filtro por tamaño: un ítem con |i| fuera de [t·|q|, |q|/t] nunca llega
+        al umbral, así que de cada posting solo se lee el tramo de tamaños válido.
+        Filtro de un solo token: con intersección 1 el par pasa solo si
+        1/(|q|+|i|-1) >= t, es decir, si |i| está al comienzo de ese tramo.
+        Devuelve (query, ítem, jaccard) como arrays alineados.
+        """
+        t = min_jaccard
+        sizes = query_sizes[token_owner]
+        min_size = np.ceil(t * sizes - 1e-9).astype(np.int64)
+        max_size = np.minimum(np.floor(sizes / t + 1e-9).astype(np.int64), self.size_stride - 1)
+        single_size = np.clip(np.floor(1 / t + 1 - sizes + 1e-9).astype(np.int64), min_size - 1, max_size)
+        base = token_ids * self.size_stride
+        starts = np.searchsorted(self.token_keys, base + min_size, side='left')
+        ends = np.searchsorted(self.token_keys, base + max_size, side='right')
+        splits = np.searchsorted(self.token_keys, base + single_size, side='right')
+        known = token_ids < self.lexicon["stride"] - 1
+        lengths = np.where(known, np.maximum(ends - starts, 0), 0)
+        singles = np.where(known, np.minimum(splits - starts, lengths), 0)
+
+        # Casi todos los pares candidatos son distintos y pocos pasan el umbral: se procesan
+        # por bloques de queries de ~_PAIR_BLOCK pares para acotar la memoria del conteo
+        per_query = np.bincount(token_owner, weights=lengths, minlength=len(query_sizes))
+        block = (np.cumsum(per_query) // _PAIR_BLOCK).astype(np.int64)[token_owner]
+        # Clave (query, ¿pasa con un solo token?, ítem) en int32 mientras quepa: la marca
+        # depende solo de los tamaños, así que es la misma en todas las apariciones del par
+        stride = 2 * self.n_items
+        key_dtype = np.int32 if len(query_sizes) * stride <= np.iinfo(np.int32).max else np.int64
+        found = []
+        for tokens in np.split(np.arange(len(token_ids)), np.flatnonzero(np.diff(block)) + 1):
+            owner = token_owner[tokens].astype(key_dtype) * stride
+            single, rest = singles[tokens], lengths[tokens] - singles[tokens]
+            keys = np.concatenate((
+                _pair_keys(owner + self.n_items, self.token_items, starts[tokens], single),
+                _pair_keys(owner, self.token_items, starts[tokens] + single, rest)
+            ))
+            del owner
+            keys.sort()
+            # Intersección = cantidad de postings compartidas por cada par (largo de su tramo)
+            intersection = run_starts(keys)
+            pairs = keys[intersection]
+            intersection[:-1] = np.diff(intersection)
+            intersection[-1:] = len(keys) - intersection[-1:]
+            del keys
+            candidate = (intersection > 1) | ((pairs % stride) >= self.n_items)
+            pairs, intersection = pairs[candidate], intersection[candidate]
+            queries, items = np.divmod(pairs, stride)
+            items %= self.n_items
+            jaccard = intersection / (query_sizes[queries] + self.lexicon["course_sizes"][items] - intersection)
+            keep = jaccard >= t
+            found.append((queries[keep], items[keep], jaccard[keep]))
+        if not found:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        return tuple(np.concatenate(parts) for parts in zip(*found))
+
+    def shortest_containing(self, norm_queries):
+        """
+        Por query (len > 3): el ítem de nombre más corto que la contiene como
+        substring, o -1. En lote, sin loop por query: cada query toma la posting
+        de su trigrama más raro, todos los candidatos se juntan en un solo array
+        y la contención se verifica con np.char.find sobre los pares.
+        """
+        n_queries = len(norm_queries)
+        targets = np.full(n_queries, -1, dtype=np.int64)
+        lengths = np.fromiter((len(q) for q in norm_queries), dtype=np.int64, count=n_queries)
+        if not (lengths > 3).any():
+            return targets
+        if self.ngram_keys is None:
+            # Índice armado con reglas sin substring: las postings se arman en el primer uso
+            self._index_ngrams()
+
+        # Trigramas de todas las queries en un buffer; el separador (código 0) invalida los cruces
+        codes = _encode("\x00".join(norm_queries))
+        grams, valid = _trigrams(codes)
+        owner = np.cumsum(codes == 0, dtype=np.int32)[:-2]
+        grams = grams.astype(self.ngram_keys.dtype)
+        starts = np.searchsorted(self.ngram_keys, grams, side='left')
+        sizes = np.where(valid, np.searchsorted(self.ngram_keys, grams, side='right') - starts, -1)
+
+        # Trigrama válido más raro de cada query (los inválidos van al final del orden)
+        order = np.lexsort((np.where(sizes < 0, np.iinfo(np.int64).max, sizes), owner))
+        sorted_owner = owner[order]
+        first = run_starts(sorted_owner)
+        queries, rarest = sorted_owner[first], order[first]
+        usable = (lengths[queries] > 3) & (sizes[rarest] >= 0)
+        queries, rarest = queries[usable], rarest[usable]
+
+        items = _gather(self.ngram_items, starts[rarest], sizes[rarest])
+        pair_queries = np.repeat(queries, sizes[rarest])
+        query_array = np.array(norm_queries, dtype=np.bytes_)
+        contains = np.char.find(self.lexicon["norm_names"][items], query_array[pair_queries]) >= 0
+        pair_queries, items = pair_queries[contains], items[contains]
+
+        # Nombre más corto por query (empate: el ítem de menor posición)
+        order = np.lexsort((items, self.name_lengths[items], pair_queries))
+        pair_queries, items = pair_queries[order], items[order]
+        first = run_starts(pair_queries)
+        targets[pair_queries[first]] = items[first]
+        return targets
@@ -0,0 +1,64 @@
+# ml_service/model_registry.py
+import os
+from dataclasses import dataclass
+
+try:
+    from ml_service.onnx_backend import cache_model_name
+except ImportError:
+    from onnx_backend import cache_model_name
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """
+    Configuración de un modelo de embeddings. 'version' se sube cuando cambia
+    algo que altera los vectores (modelo, pooling, texto de entrada): invalida
+    cachés, índices y predicciones guardadas con la versión anterior.
+    """
+    key: str
+    name: str
+    dim: int
+    normalize: bool = True
+    version: str = "v1"
+
+    @property
+    def tag(self):
+        """Sello de los artefactos: modelo + versión (+ backend si no es PyTorch)."""
+        return cache_model_name(f"{self.name}@{self.version}")
+
+    def describe(self):
+        return {"key": self.key, "name": self.name, "dim": self.dim,
+                "normalize": self.normalize, "version": self.version, "tag": self.tag}
+
+
+MODELS = {
+    # L3 (3 capas): menos RAM, precisión similar para queries cortas. Default del servicio.
+    "minilm-l3": ModelSpec("minilm-l3", "sentence-transformers/paraphrase-MiniLM-L3-v2", 384),
+    "minilm-l6": ModelSpec("minilm-l6", "sentence-transformers/all-MiniLM-L6-v2", 384),
+}
+
+# Modelo activo para app.py y run_batch.py (mismo espacio de embeddings en ambos)
+ACTIVE_MODEL = os.getenv("ML_MODEL", "minilm-l3")
+
+
+def get_model_spec(key=None):
+    key = key or ACTIVE_MODEL
+    if key not in MODELS:
+        raise ValueError(f"Modelo '{key}' no registrado. Opciones: {', '.join(MODELS)}")
+    return MODELS[key]
+
+
+def verify_model(spec, model):
+    """
+    Comprueba que el modelo cargado produce vectores de la dimensión registrada.
+    La dimensión se lee de la config del modelo, sin inferencia: con ML_PRELOAD
+    esto corre en el master de gunicorn y un forward pass de PyTorch antes del
+    fork arranca su pool de hilos (OpenMP), que puede colgar a los workers.
+    """
+    if hasattr(model, "get_sentence_embedding_dimension"):
+        dim = model.get_sentence_embedding_dimension()
+    else:
+        dim = model.encode(["verificación"]).shape[1]
+    if dim != spec.dim:
+        raise ValueError(f"El modelo {spec.name} produce vectores de {dim} dimensiones; se esperaban {spec.dim}.")
+    return spec
@@ -0,0 +1,327 @@
+# ml_service/onnx_backend.py
+"""
+Backend de inferencia ONNX Runtime (int8 dinámico) para los modelos MiniLM.
+
+Uso:
+    ML_ENCODER_BACKEND=onnx  -> app.py / run_batch.py cargan el modelo con ONNX Runtime.
+    python -m ml_service.onnx_backend export --model all-MiniLM-L6-v2
+    python -m ml_service.onnx_backend check  --model all-MiniLM-L6-v2
+    python -m ml_service.onnx_backend bench  --model all-MiniLM-L6-v2 --backend onnx
+
+La exportación necesita torch + transformers una sola vez; en producción solo
+se requieren onnxruntime y tokenizers.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource  # no existe en Windows
+except ImportError:
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ONNX_DIR = os.getenv("ML_ONNX_DIR", os.path.join(BASE_DIR, "data_dump", "onnx_models"))
+# torch (SentenceTransformer) | onnx (ONNX Runtime int8)
+ENCODER_BACKEND = os.getenv("ML_ENCODER_BACKEND", "torch").lower()
+ONNX_THREADS = int(os.getenv("ML_ONNX_THREADS", "0"))  # 0 = lo decide ONNX Runtime
+# Solo si el modelo no trae sentence_bert_config.json (la exportación usa el valor del modelo)
+MAX_SEQ_LENGTH = 128
+# Sube cuando cambia lo que export_model escribe en pooling.json: fuerza re-exportar
+POOLING_FORMAT = 2
+
+# Umbrales del chequeo de precisión int8 vs PyTorch
+MIN_VECTOR_COSINE = 0.98
+MAX_SCORE_DELTA = 0.05
+
+_SAMPLE_TEXTS = [
+    "anatomía humana", "cardiología clínica", "farmacología básica",
+    "libro de fisiología", "introducción a la bioquímica", "atlas de histología",
+    "enfermería pediátrica", "microbiología médica", "nutrición y dietética",
+    "programación en python", "estadística para ciencias de la salud", "neuroanatomía",
+]
+# Textos largos (sopas de libros/cursos): cada uno cambia de tema pasados ~150 tokens,
+# así una diferencia de truncado (max_seq_length) entre backends se nota en el chequeo
+_LONG_TEXTS = [
+    " ".join([_SAMPLE_TEXTS[i]] * 40 + [_SAMPLE_TEXTS[(i + 5) % len(_SAMPLE_TEXTS)]] * 40)
+    for i in range(0, len(_SAMPLE_TEXTS), 3)
+]
+
+
+def _hub_name(model_name):
+    """'all-MiniLM-L6-v2' -> 'sentence-transformers/all-MiniLM-L6-v2' (igual que SentenceTransformer)."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def model_dir(model_name, base_dir=DEFAULT_ONNX_DIR):
+    return os.path.join(base_dir, _hub_name(model_name).replace("/", "__"))
+
+
+def onnx_available():
+    return all(importlib.util.find_spec(m) is not None for m in ("onnxruntime", "tokenizers"))
+
+
+def resolve_encoder_backend(backend=None):
+    """Backend efectivo: 'onnx' solo si onnxruntime está instalado; si no, 'torch'."""
+    backend = (backend or ENCODER_BACKEND).lower()
+    if backend == "onnx" and not onnx_available():
+        print("⚠️ ML_ENCODER_BACKEND=onnx pero onnxruntime/tokenizers no están instalados; se usa PyTorch.")
+        return "torch"
+    return "onnx" if backend == "onnx" else "torch"
+
+
+def cache_model_name(model_name, backend=None):
+    """Nombre para cachés e índices: los vectores int8 no se mezclan con los de PyTorch."""
+    return model_name if resolve_encoder_backend(backend) == "torch" else f"{model_name}@onnx-int8"
+
+
+def mean_pooling(token_embeddings, attention_mask):
+    """Promedio de tokens ponderado por la máscara (pooling de los MiniLM de sentence-transformers)."""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def sentence_config(read_json):
+    """
+    Pooling del pipeline de SentenceTransformer a partir de sus archivos de config:
+    modules.json (¿hay módulo Normalize?), sentence_bert_config.json (max_seq_length)
+    y la config del módulo Pooling. read_json(ruta) devuelve el dict o None si no existe.
+    """
+    modules = read_json("modules.json") or []
+    types = {m.get("type", "").rsplit(".", 1)[-1]: m.get("path", "") for m in modules}
+    bert_config = read_json("sentence_bert_config.json") or {}
+
+    pooling_path = types.get("Pooling")
+    if pooling_path:
+        pooling = read_json(f"{pooling_path}/config.json") or {}
+        modes = [k for k, v in pooling.items() if k.startswith("pooling_mode_") and v]
+        if modes and modes != ["pooling_mode_mean_tokens"]:
+            raise ValueError(f"Pooling no soportado por el backend ONNX: {modes}")
+
+    return {
+        "pooling": "mean",
+        "normalize": "Normalize" in types,
+        "max_seq_length": int(bert_config.get("max_seq_length") or MAX_SEQ_LENGTH),
+        "format": POOLING_FORMAT,
+    }
+
+
+def _hub_json_reader(hub_name):
+    """read_json para sentence_config sobre los archivos del modelo en el Hub (o su caché local)."""
+    from huggingface_hub import hf_hub_download
+
+    def read_json(filename):
+        try:
+            with open(hf_hub_download(hub_name, filename), encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+    return read_json
+
+
+def export_model(model_name, out_dir=None, quantize=True):
+    """
+    Exporta el transformer a ONNX (+ versión int8 dinámica) junto al tokenizer
+    y la config de pooling (max_seq_length y normalización leídas de la config
+    de SentenceTransformer, como las aplica PyTorch). Devuelve la carpeta de salida.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    out_dir = out_dir or model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    hub_name = _hub_name(model_name)
+
+    # Ej.: all-MiniLM-L6-v2 trunca a 256 y normaliza; paraphrase-MiniLM-L3-v2 trunca a 128 y no
+    pooling = sentence_config(_hub_json_reader(hub_name))
+
+    print(f"📦 Exportando {hub_name} a ONNX...")
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name).eval()
+    sample = tokenizer(["texto de ejemplo"], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"}
+                          for name in ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")},
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(out_dir)
+
+    if quantize:
+        print("   ⚙️ Cuantizando pesos a int8 (dinámico)...")
+        quantize_dynamic(fp32_path, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    with open(os.path.join(out_dir, "pooling.json"), "w", encoding="utf-8") as f:
+        json.dump(pooling, f)
+    print(f"   ✅ Modelo ONNX listo en {out_dir} (max_seq_length={pooling['max_seq_length']}, "
+          f"normalize={pooling['normalize']})")
+    return out_dir
+
+
+class OnnxSentenceEncoder:
+    """
+    Reemplazo de SentenceTransformer sobre ONNX Runtime: misma interfaz .encode(list)
+    y la misma salida (mean pooling, normalización si el modelo original la aplica).
+    """
+
+    def __init__(self, path, quantized=True, threads=ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, "pooling.json"), encoding="utf-8") as f:
+            pooling = json.load(f)
+        self.normalize = pooling.get("normalize", False)
+        self.max_seq_length = pooling.get("max_seq_length", MAX_SEQ_LENGTH)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(path, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        """Dimensión de salida leída del grafo ONNX (misma API que SentenceTransformer)."""
+        return self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension() or 0), dtype=np.float32)
+        blocks = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self._inputs})[0]
+            blocks.append(mean_pooling(hidden, feed["attention_mask"]))
+        vectors = np.vstack(blocks).astype(np.float32)
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+
+def _pooling_format(path):
+    """Formato de pooling.json de una exportación previa (None si no existe o es anterior)."""
+    try:
+        with open(os.path.join(path, "pooling.json"), encoding="utf-8") as f:
+            return json.load(f).get("format")
+    except (OSError, ValueError):
+        return None
+
+
+def load_encoder_model(model_name, backend=None):
+    """
+    Carga el modelo según ML_ENCODER_BACKEND. Con 'onnx' exporta la primera vez
+    (requiere torch) y luego solo usa ONNX Runtime.
+    """
+    if resolve_encoder_backend(backend) == "onnx":
+        path = model_dir(model_name)
+        if not os.path.exists(os.path.join(path, "model.int8.onnx")) or _pooling_format(path) != POOLING_FORMAT:
+            export_model(model_name, path)
+        print(f"   🧠 Cargando {model_name} con ONNX Runtime (int8)...")
+        return OnnxSentenceEncoder(path)
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def compare_backends(reference, candidate, texts=None):
+    """
+    Precisión del candidato frente al modelo de referencia:
+    coseno entre los vectores de cada texto y diferencia absoluta de los scores
+    coseno texto-a-texto (lo que de verdad usan los predictores).
+    """
+    texts = list(texts or _SAMPLE_TEXTS + _LONG_TEXTS)
+
+    def unit(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    ref = unit(reference.encode(texts))
+    cand = unit(candidate.encode(texts))
+    vector_cosine = (ref * cand).sum(axis=1)
+    score_delta = np.abs(ref @ ref.T - cand @ cand.T)
+    report = {
+        "texts": len(texts),
+        "minVectorCosine": round(float(vector_cosine.min()), 4),
+        "meanVectorCosine": round(float(vector_cosine.mean()), 4),
+        "maxScoreDelta": round(float(score_delta.max()), 4),
+        "meanScoreDelta": round(float(score_delta.mean()), 4),
+    }
+    report["ok"] = report["minVectorCosine"] >= MIN_VECTOR_COSINE and report["maxScoreDelta"] <= MAX_SCORE_DELTA
+    return report
+
+
+def rss_mb():
+    """Memoria residente pico del proceso (MB); None si la plataforma no lo expone."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def benchmark(model, texts, batch_size=64, repeats=3):
+    """Textos/seg de encode (mejor de 'repeats') y RSS pico tras cargar y codificar."""
+    model.encode(texts[:batch_size])  # calentamiento
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for start in range(0, len(texts), batch_size):
+            model.encode(texts[start:start + batch_size])
+        best = min(best, time.perf_counter() - started)
+    return {"texts": len(texts), "textsPerSec": round(len(texts) / best, 1), "peakRssMb": rss_mb()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend ONNX int8 para el modelo de embeddings")
+    parser.add_argument("command", choices=["export", "check", "bench"])
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-MiniLM-L3-v2")
+    parser.add_argument("--backend", default="onnx", choices=["onnx", "torch"], help="solo para bench")
+    parser.add_argument("--texts", type=int, default=2000, help="textos sintéticos para bench")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_model(args.model)
+    elif args.command == "check":
+        from sentence_transformers import SentenceTransformer
+        reference, candidate = SentenceTransformer(args.model), load_encoder_model(args.model, "onnx")
+        report = compare_backends(reference, candidate)
+        # Mismo truncado en ambos backends (los textos largos de libros/cursos lo notan)
+        report["maxSeqLength"] = {"torch": reference.max_seq_length, "onnx": candidate.max_seq_length}
+        report["ok"] = report["ok"] and reference.max_seq_length == candidate.max_seq_length
+        print(json.dumps(report, indent=2))
+        return 0 if report["ok"] else 1
+    else:
+        # Un backend por proceso: el RSS pico no mezcla torch con onnxruntime
+        model = load_encoder_model(args.model, args.backend)
+        texts = [f"{_SAMPLE_TEXTS[i % len(_SAMPLE_TEXTS)]} {i}" for i in range(args.texts)]
+        report = {"backend": resolve_encoder_backend(args.backend), **benchmark(model, texts)}
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
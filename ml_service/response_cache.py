@@ -0,0 +1,99 @@
+# ml_service/response_cache.py
+import threading
+import time
+
+
+class TTLResponseCache:
+    """
+    Caché de respuestas por clave con TTL y modo stale-while-revalidate.
+
+    - Entrada fresca: se devuelve tal cual.
+    - Entrada vencida (o invalidada) con SWR activo: se devuelve la última
+      respuesta buena y se recalcula en un hilo de fondo (uno por clave).
+    - Sin entrada: se calcula en el request; los requests concurrentes de la
+      misma clave esperan ese único cálculo en lugar de repetirlo.
+    Si un recálculo falla, se conserva la última respuesta buena.
+    Cada invalidate() sube una generación: un cálculo que empezó antes no se
+    guarda al terminar (su resultado sale de los datos previos a la invalidación).
+    """
+
+    def __init__(self, compute, ttl_seconds=300, stale_while_revalidate=True, clock=time.monotonic):
+        self.compute = compute
+        self.ttl_seconds = ttl_seconds
+        self.stale_while_revalidate = stale_while_revalidate
+        self.clock = clock
+        self._entries = {}       # key -> (value, expires_at)
+        self._key_locks = {}
+        self._refreshing = set()
+        self._generation = 0     # invalidaciones de toda la caché
+        self._key_generations = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _generation_of(self, key):
+        with self._lock:
+            return self._generation, self._key_generations.get(key, 0)
+
+    def _compute_and_store(self, key):
+        generation = self._generation_of(key)
+        value = self.compute(key)
+        with self._lock:
+            if generation == (self._generation, self._key_generations.get(key, 0)):
+                self._entries[key] = (value, self.clock() + self.ttl_seconds)
+        return value
+
+    def _revalidate(self, key):
+        try:
+            with self._key_lock(key):
+                self._compute_and_store(key)
+        except Exception as e:
+            print(f"⚠️ Recalculo en segundo plano falló para '{key}': {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if self.clock() < expires_at:
+                return value
+            if self.stale_while_revalidate:
+                with self._lock:
+                    start = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start:
+                    threading.Thread(target=self._revalidate, args=(key,), daemon=True).start()
+                return value
+
+        with self._key_lock(key):
+            # Otro request pudo haberlo calculado mientras esperábamos el lock
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and self.clock() < entry[1]:
+                return entry[0]
+            return self._compute_and_store(key)
+
+    def invalidate(self, key=None, drop=False):
+        """
+        Marca como vencidas una o todas las entradas. Con SWR se seguirá
+        sirviendo la última respuesta mientras se recalcula; drop=True las borra.
+        Los cálculos en curso de esas claves se descartan al terminar.
+        """
+        with self._lock:
+            if key is None:
+                self._generation += 1
+            else:
+                self._key_generations[key] = self._key_generations.get(key, 0) + 1
+            keys = list(self._entries) if key is None else [key]
+            for k in keys:
+                if k not in self._entries:
+                    continue
+                if drop:
+                    del self._entries[k]
+                else:
+                    self._entries[k] = (self._entries[k][0], float('-inf'))
@@ -15,13 +15,17 @@ if root_dir not in sys.path:
 
 import pandas as pd
 import json
-from sentence_transformers import SentenceTransformer
 from ml_service.predictors import popular_course_predictor, popular_resource_predictor
-from ml_service.utils import normalize_text
+from ml_service.decay import aggregate_trends
+from ml_service.embedding_store import CachedEncoder, open_default_store
+from ml_service.onnx_backend import load_encoder_model
+from ml_service.model_registry import get_model_spec, verify_model
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data_dump")
 OUTPUT_FILE = os.path.join(DATA_DIR, "ai_predictions.json")
+# Mismo modelo y versión que el servicio Flask (ML_MODEL): la caché de embeddings se comparte
+MODEL_SPEC = get_model_spec()
 
 def main():
     print("🚀 [ML SERVICE] Iniciando análisis batch...")
@@ -43,11 +47,8 @@ def main():
         # Eliminamos filas que no tengan fecha válida
         search_df = search_df.dropna(subset=['created_at'])
 
-        # Agrupar queries
-        trends_df = search_df.groupby('query').agg(
-            dates=('created_at', list),
-            count=('query', 'count')
-        ).reset_index()
+        # Agrupar queries (peso decaído + conteo en una sola pasada vectorizada)
+        trends_df = aggregate_trends(search_df)
 
         courses_df = pd.read_csv(courses_path)
         
@@ -60,11 +61,17 @@ def main():
 
         print(f"📊 Datos cargados: {len(trends_df)} búsquedas, {len(courses_df)} cursos, {len(books_df)} libros.")
 
-        print("🧠 Cargando modelo SentenceTransformer...")
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        print("🧠 Cargando modelo de embeddings...")
+        # Caché en disco: en corridas sucesivas solo se codifican textos nuevos
+        # ML_ENCODER_BACKEND=onnx: mismo modelo sobre ONNX Runtime int8 (menos RAM en CPU)
+        base_model = load_encoder_model(MODEL_SPEC.name)
+        verify_model(MODEL_SPEC, base_model)
+        model = CachedEncoder(base_model, MODEL_SPEC.tag, open_default_store(), normalize=MODEL_SPEC.normalize)
 
         results = {
             "generated_at": pd.Timestamp.now().isoformat(),
+            # Sello del espacio de embeddings: solo se reutiliza con el mismo tag
+            "model": MODEL_SPEC.describe(),
             "course_prediction": None,
             "book_prediction": None
         }
@@ -0,0 +1,86 @@
+# ml_service/search.py
+import numpy as np
+
+try:
+    from ml_service.similarity import topk
+except ImportError:
+    from similarity import topk
+
+# tipo público -> (DataFrame, matriz, índice) dentro del CatalogSnapshot
+SEARCH_TYPES = {
+    "courses": ("course", "courses_df", "course_embeddings", "course_index"),
+    "topics": ("topic", "topics_df", "topic_embeddings", None),
+    "books": ("book", "books_df", "book_embeddings", "book_index"),
+}
+MAX_SEARCH_K = 50
+
+
+def _to_json(value):
+    """Ids de numpy/pandas -> tipos nativos serializables."""
+    if value is None:
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _rows_for_ids(df, ids):
+    """Posiciones en el DataFrame de cada id devuelto por el índice (-1 si ya no está)."""
+    positions = {item_id: pos for pos, item_id in enumerate(df['id'].tolist())}
+    return np.array([positions.get(item_id, -1) for item_id in ids.ravel()], dtype=np.int64).reshape(ids.shape)
+
+
+def _search_type(snapshot, query_vectors, k, search_type):
+    label, df_attr, emb_attr, index_attr = SEARCH_TYPES[search_type]
+    df = getattr(snapshot, df_attr)
+    index = getattr(snapshot, index_attr) if index_attr else None
+    embeddings = getattr(snapshot, emb_attr)
+
+    if df.empty:
+        return [[] for _ in range(len(query_vectors))]
+    if index is not None and 'id' in df.columns:
+        ids, scores = index.search(query_vectors, k)
+        positions = _rows_for_ids(df, ids)
+    elif embeddings is not None:
+        positions, scores = topk(query_vectors, embeddings, k)
+    else:
+        return [[] for _ in range(len(query_vectors))]
+
+    names = df['name'].tolist()
+    item_ids = df['id'].tolist() if 'id' in df.columns else [None] * len(df)
+    results = []
+    for row_positions, row_scores in zip(positions, scores):
+        results.append([
+            {"type": label, "id": _to_json(item_ids[pos]), "name": names[pos], "score": round(float(score), 4)}
+            for pos, score in zip(row_positions, row_scores)
+            if pos >= 0 and np.isfinite(score)
+        ])
+    return results
+
+
+def search_catalog(snapshot, query_vectors, k=10, types=None):
+    """
+    Búsqueda semántica sobre los vectores ya cargados del snapshot.
+    Devuelve, por cada query, los k mejores hits de todos los tipos pedidos
+    ordenados por score (coseno). Usa el índice vectorial si existe; si no,
+    el top-k exacto sobre la matriz.
+    """
+    types = list(types or SEARCH_TYPES)
+    query_vectors = np.atleast_2d(query_vectors)
+    per_type = [_search_type(snapshot, query_vectors, k, t) for t in types]
+
+    merged = []
+    for i in range(len(query_vectors)):
+        hits = [hit for results in per_type for hit in results[i]]
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        merged.append(hits[:k])
+    return merged
+
+
+def parse_search_types(raw):
+    """'courses,books' -> ['courses', 'books']; ValueError si hay tipos desconocidos."""
+    if not raw:
+        return list(SEARCH_TYPES)
+    types = [t.strip().lower() for t in raw.split(',') if t.strip()]
+    unknown = [t for t in types if t not in SEARCH_TYPES]
+    if unknown:
+        raise ValueError(f"Tipos no soportados: {', '.join(unknown)}")
+    return types
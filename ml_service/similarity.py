@@ -0,0 +1,83 @@
+# ml_service/similarity.py
+import os
+
+import numpy as np
+
+# Filas de queries por bloque: el producto Q x C nunca se materializa completo
+SIMILARITY_CHUNK_ROWS = int(os.getenv("ML_SIMILARITY_CHUNK", "4096"))
+
+_UNIT_TOLERANCE = 1e-3
+
+
+def l2_normalize(matrix):
+    """
+    Devuelve la matriz en float32 con filas de norma 1 (filas nulas quedan en 0).
+    Si ya viene normalizada en float32 (catálogo del snapshot, salida del
+    encoder) se devuelve tal cual, sin copiar.
+    """
+    matrix = np.asarray(matrix)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.dtype != np.float32:
+        matrix = matrix.astype(np.float32)
+
+    norms = np.linalg.norm(matrix, axis=1)
+    nonzero = norms > 0
+    if np.all(np.abs(norms[nonzero] - 1.0) < _UNIT_TOLERANCE):
+        return matrix
+
+    safe = np.where(nonzero, norms, 1.0).astype(np.float32)
+    return matrix / safe[:, None]
+
+
+def top1(query_embeddings, catalog_embeddings, chunk_rows=None):
+    """
+    Mejor ítem del catálogo por query (similitud coseno) con un GEMM float32
+    por bloque de queries. Devuelve (best_idx, best_similarity).
+    """
+    chunk_rows = chunk_rows or SIMILARITY_CHUNK_ROWS
+    queries = l2_normalize(query_embeddings)
+    catalog = l2_normalize(catalog_embeddings)
+
+    n_queries = queries.shape[0]
+    best_idx = np.empty(n_queries, dtype=np.int64)
+    best_similarity = np.empty(n_queries, dtype=np.float32)
+
+    for start in range(0, n_queries, chunk_rows):
+        block = queries[start:start + chunk_rows] @ catalog.T
+        idx = np.argmax(block, axis=1)
+        best_idx[start:start + chunk_rows] = idx
+        best_similarity[start:start + chunk_rows] = block[np.arange(block.shape[0]), idx]
+
+    return best_idx, best_similarity
+
+
+def topk(query_embeddings, catalog_embeddings, k, chunk_rows=None):
+    """
+    Top-k del catálogo por query (posiciones + similitudes, de mayor a menor).
+    Bloques de queries + argpartition: nunca se ordena la fila completa.
+    Si el catálogo tiene menos de k ítems, las columnas sobrantes quedan en -1 / -inf.
+    """
+    chunk_rows = chunk_rows or SIMILARITY_CHUNK_ROWS
+    queries = l2_normalize(query_embeddings)
+    catalog = l2_normalize(catalog_embeddings)
+
+    n_queries, n_items = queries.shape[0], catalog.shape[0]
+    positions = np.full((n_queries, k), -1, dtype=np.int64)
+    scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    k_eff = min(k, n_items)
+    if k_eff == 0:
+        return positions, scores
+
+    for start in range(0, n_queries, chunk_rows):
+        block = queries[start:start + chunk_rows] @ catalog.T
+        if k_eff < n_items:
+            top = np.argpartition(-block, k_eff - 1, axis=1)[:, :k_eff]
+        else:
+            top = np.tile(np.arange(n_items), (block.shape[0], 1))
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        rows = slice(start, start + block.shape[0])
+        positions[rows, :k_eff] = np.take_along_axis(top, order, axis=1)
+        scores[rows, :k_eff] = np.take_along_axis(top_scores, order, axis=1)
+    return positions, scores
@@ -0,0 +1,150 @@
+# ml_service/trend_aggregator.py
+import math
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from ml_service.decay import DECAY_LAMBDA, to_naive_datetimes
+except ImportError:
+    from decay import DECAY_LAMBDA, to_naive_datetimes
+
+_DAY = pd.Timedelta(days=1)
+
+
+class IncrementalTrendAggregator:
+    """
+    Agregación incremental de search_history para /api/trends.
+
+    Mantiene por (query, día) el conteo y un score decaído referido a un
+    instante 'reference'. En cada refresh:
+      1. Envejece todo el estado en forma cerrada: score *= e^(-λ·Δt).
+      2. Descarga solo las filas con created_at > watermark - overlap (el delta).
+         El solape vuelve a traer las filas cercanas al watermark: en PostgreSQL
+         now() es el inicio de la transacción, así que una fila puede confirmarse
+         después con un created_at igual o anterior al watermark. Los ids ya
+         sumados dentro del solape se descartan.
+      3. Descarta los días que salieron de la ventana.
+    A diferencia de decay_weights(), la edad se mide en días continuos
+    (no truncados): es lo que permite envejecer el estado con un solo producto.
+    """
+
+    def __init__(self, days, fetch_since, lambda_val=DECAY_LAMBDA, overlap_seconds=300):
+        self.days = int(days)
+        self.fetch_since = fetch_since
+        self.lambda_val = lambda_val
+        self.overlap = pd.Timedelta(seconds=overlap_seconds)
+        self.watermark = None
+        self.reference = None
+        self._buckets = self._empty_buckets()
+        # id -> created_at de las filas ya sumadas que siguen dentro del solape
+        self._recent_ids = pd.Series(dtype=object)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty_buckets():
+        return pd.DataFrame(
+            {'count': pd.Series(dtype='int64'), 'score': pd.Series(dtype='float64'),
+             'last_seen': pd.Series(dtype='datetime64[ns]')},
+            index=pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=['query', 'day'])
+        )
+
+    def _age(self, now):
+        """Envejece el estado acumulado hasta 'now' (forma cerrada)."""
+        if self.reference is not None and not self._buckets.empty:
+            elapsed_days = max((now - self.reference) / _DAY, 0.0)
+            self._buckets['score'] *= math.exp(-self.lambda_val * elapsed_days)
+        self.reference = now
+
+    def _dedupe(self, rows):
+        """Quita las filas del solape que ya se sumaron y recuerda los ids del nuevo solape."""
+        if 'id' not in rows.columns:
+            # Sin ids no hay cómo reconocer lo ya sumado: corte estricto en el watermark
+            return rows if self.watermark is None else rows[rows['created_at'] > self.watermark]
+        rows = rows[~rows['id'].isin(self._recent_ids.index)]
+        seen = pd.concat([self._recent_ids, pd.Series(rows['created_at'].to_numpy(), index=rows['id'].to_numpy())])
+        newest = seen.max() if self.watermark is None else max(seen.max(), self.watermark)
+        self._recent_ids = seen[seen >= newest - self.overlap]
+        return rows
+
+    def _ingest(self, rows, now):
+        """Suma el delta de filas nuevas (ya referidas a 'now')."""
+        rows = rows[rows['query'].notna() & (rows['query'] != '')]
+        if rows.empty:
+            return
+
+        dates = to_naive_datetimes(rows['created_at'])
+        valid = dates.notna().to_numpy()
+        dates = dates[valid]
+        age_days = np.clip(((now - dates) / _DAY).to_numpy(dtype=np.float64), 0, None)
+
+        delta = pd.DataFrame({
+            'query': rows['query'].to_numpy()[valid],
+            'day': dates.dt.floor('D').to_numpy(),
+            'score': np.exp(-self.lambda_val * age_days),
+            'last_seen': dates.to_numpy()
+        }).groupby(['query', 'day']).agg(
+            count=('score', 'size'),
+            score=('score', 'sum'),
+            last_seen=('last_seen', 'max')
+        )
+
+        merged = pd.concat([self._buckets, delta])
+        self._buckets = merged.groupby(level=['query', 'day']).agg(
+            count=('count', 'sum'),
+            score=('score', 'sum'),
+            last_seen=('last_seen', 'max')
+        )
+
+        newest = rows['created_at'].max()
+        if self.watermark is None or newest > self.watermark:
+            self.watermark = newest
+
+    def _expire(self, now):
+        """Elimina los días completos que quedaron fuera de la ventana."""
+        if self._buckets.empty:
+            return
+        cutoff_day = (now - pd.Timedelta(days=self.days)).floor('D')
+        days = self._buckets.index.get_level_values('day')
+        self._buckets = self._buckets[days >= cutoff_day]
+
+    def refresh(self, now=None):
+        """
+        Trae el delta desde el último watermark y devuelve el agregado por query:
+        query | count | weight | last_seen (mismo formato que decay.aggregate_trends).
+        """
+        now = pd.Timestamp(now if now is not None else datetime.now())
+        if now.tzinfo:
+            now = now.tz_localize(None)
+
+        with self._lock:
+            since = None if self.watermark is None else self.watermark - self.overlap
+            rows = self.fetch_since(since=since, days=self.days)
+            self._age(now)
+            if rows is not None and not rows.empty:
+                rows = self._dedupe(rows)
+            if rows is not None and not rows.empty:
+                print(f"📥 Tendencias incrementales: {len(rows)} búsquedas nuevas desde {self.watermark}.")
+                self._ingest(rows, now)
+            self._expire(now)
+            return self.snapshot()
+
+    def snapshot(self):
+        columns = ['query', 'count', 'weight', 'last_seen']
+        if self._buckets.empty:
+            return pd.DataFrame(columns=columns)
+        per_query = self._buckets.groupby(level='query').agg(
+            count=('count', 'sum'),
+            weight=('score', 'sum'),
+            last_seen=('last_seen', 'max')
+        ).reset_index()
+        return per_query[columns]
+
+    def reset(self):
+        with self._lock:
+            self.watermark = None
+            self.reference = None
+            self._buckets = self._empty_buckets()
+            self._recent_ids = pd.Series(dtype=object)
@@ -0,0 +1,284 @@
+# ml_service/trend_engine.py
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+try:
+    from ml_service.utils import normalize_text
+    from ml_service.decay import canonicalize_trends
+    from ml_service.vector_index import nearest
+    from ml_service.lexical_index import LexicalIndex, build_lexicon, run_starts, tokenize
+except ImportError:
+    from utils import normalize_text
+    from decay import canonicalize_trends
+    from vector_index import nearest
+    from lexical_index import LexicalIndex, build_lexicon, run_starts, tokenize
+
+
+# Stopwords para cursos y temas (ajustado al contexto académico)
+COURSE_STOPWORDS = frozenset({
+    'el', 'la', 'los', 'las', 'un', 'una', 'de', 'del', 'al', 'y', 'o', 'en',
+    'curso', 'taller', 'clase', 'introduccion', 'fundamentos', 'basico', 'avanzado',
+    'teoria', 'practica', 'i', 'ii', 'iii', 'iv', 'v', '1', '2', '3'  # Números romanos/arabigos comunes en nombres
+})
+
+
+@dataclass(frozen=True)
+class CatalogRules:
+    """
+    Reglas de negocio de un catálogo (lógica V3 generalizada):
+      - directo: Jaccard >= direct_jaccard (o substring si substring_match) -> peso x direct_boost
+      - semántico: similitud > semantic_threshold -> peso x similitud
+      - sin solape de tokens (Jaccard < no_overlap_jaccard): con rare_synonym_similarity
+        solo puntúan sinónimos muy fuertes (x rare_synonym_factor); None = sin esa regla.
+    confidence: 'dominance' (volumen + ventaja sobre el siguiente) o 'volume'.
+    """
+    stopwords: frozenset = frozenset()
+    min_token_len: int = 2
+    direct_jaccard: float = 0.5
+    substring_match: bool = True
+    semantic_threshold: float = 0.50
+    direct_boost: float = 5.0
+    no_overlap_jaccard: float = 0.01
+    rare_synonym_similarity: Optional[float] = 0.85
+    rare_synonym_factor: float = 0.5
+    confidence: str = "dominance"
+    low_volume_score: float = 5.0
+    min_prediction_score: float = 1.0
+
+
+COURSE_RULES = CatalogRules(stopwords=COURSE_STOPWORDS)
+TOPIC_RULES = COURSE_RULES
+# Libros: umbral Jaccard más bajo, tokens de más de 3 letras, sin substring ni regla de sinónimos
+BOOK_RULES = CatalogRules(
+    min_token_len=4, direct_jaccard=0.3, substring_match=False, rare_synonym_similarity=None,
+    confidence="volume", low_volume_score=3.0, min_prediction_score=0.5
+)
+
+
+def _lexical_targets(lexical, rules, token_ids, token_owner, query_sizes, norm_queries, pending):
+    """
+    Mejor coincidencia directa de cada query pendiente en TODO el catálogo (-1 si no hay):
+    primero el mayor Jaccard (>= direct_jaccard); si no, el nombre más corto que la contiene.
+    """
+    targets = np.full(len(norm_queries), -1, dtype=np.int64)
+    pending_tokens = pending[token_owner]
+    queries, items, jaccard = lexical.token_matches(
+        token_ids[pending_tokens], token_owner[pending_tokens], query_sizes, rules.direct_jaccard
+    )
+    if len(queries):
+        order = np.lexsort((items, -jaccard, queries))
+        queries, items = queries[order], items[order]
+        first = run_starts(queries)
+        targets[queries[first]] = items[first]
+
+    if rules.substring_match:
+        # Substring en lote para las pendientes sin match de tokens
+        remaining = np.flatnonzero(pending & (targets < 0))
+        if len(remaining):
+            targets[remaining] = lexical.shortest_containing([norm_queries[i] for i in remaining])
+    return targets
+
+
+def score_queries(queries, query_weights, query_raw_counts, best_idx, best_similarity, lexicon, n_items,
+                  rules=COURSE_RULES, norm_queries=None, lexical=None):
+    """
+    Motor de scoring por lotes (equivalente al loop V3 query por query).
+    Recibe el ganador semántico de cada query (ver vector_index.nearest) y
+    devuelve (scores, counts) por ítem acumulados con np.bincount.
+    Con 'lexical' (LexicalIndex del mismo lexicon), una query que no coincide
+    directamente con su ganador semántico se acredita al ítem que sí coincide
+    léxicamente: el match directo deja de depender del argmax de embeddings.
+    """
+    n_queries = len(queries)
+    if norm_queries is None:
+        norm_queries = [normalize_text(q) for q in queries]
+
+    # A. Ganador semántico de todas las queries (calculado de una sola vez).
+    #    Un índice puede devolver -1 (id que ya no está en este catálogo): nunca suma.
+    matched = np.asarray(best_idx) >= 0
+    best_idx = np.where(matched, best_idx, 0)
+    best_similarity = np.asarray(best_similarity, dtype=np.float64)
+
+    # B. Jaccard contra el ítem ganador usando ids de tokens
+    vocab = lexicon["vocab"]
+    unknown_id = lexicon["stride"] - 1
+    # Una pasada (como build_lexicon): el conjunto de tokens de cada query no sobrevive a su iteración
+    query_sizes = np.zeros(n_queries, dtype=np.int64)
+    token_ids = []
+    for q, text in enumerate(norm_queries):
+        tokens = tokenize(text, rules, normalized=True)
+        query_sizes[q] = len(tokens)
+        token_ids.extend(vocab.get(t, unknown_id) for t in tokens)
+    token_ids = np.asarray(token_ids, dtype=np.int64)
+    token_owner = np.repeat(np.arange(n_queries), query_sizes)
+
+    hits = np.isin(best_idx[token_owner] * lexicon["stride"] + token_ids, lexicon["course_keys"])
+    intersection = np.bincount(token_owner, weights=hits, minlength=n_queries)
+    item_sizes = lexicon["course_sizes"][best_idx]
+    union = query_sizes + item_sizes - intersection
+    has_tokens = (query_sizes > 0) & (item_sizes > 0)
+    jaccard = np.divide(intersection, union, out=np.zeros(n_queries), where=has_tokens & (union > 0))
+
+    # C. Substring sobre nombres normalizados (precalculados por ítem)
+    is_direct = jaccard >= rules.direct_jaccard
+    if rules.substring_match:
+        norm_array = np.array(norm_queries, dtype=np.bytes_)
+        is_direct |= (np.char.str_len(norm_array) > 3) & (
+            np.char.find(lexicon["norm_names"][best_idx], norm_array) >= 0
+        )
+    if lexical is not None:
+        targets = _lexical_targets(lexical, rules, token_ids, token_owner, query_sizes, norm_queries, ~is_direct)
+        redirected = targets >= 0
+        best_idx = np.where(redirected, targets, best_idx)
+        is_direct |= redirected
+        matched |= redirected
+
+    # D. Impacto según los casos de la lógica V3
+    is_semantic = ~is_direct & (best_similarity > rules.semantic_threshold)
+
+    impact = np.where(is_direct, query_weights * rules.direct_boost, 0.0)
+    if rules.rare_synonym_similarity is None:
+        impact = np.where(is_semantic, query_weights * best_similarity, impact)
+    else:
+        no_overlap = jaccard < rules.no_overlap_jaccard
+        impact = np.where(
+            is_semantic & no_overlap & (best_similarity > rules.rare_synonym_similarity),
+            query_weights * best_similarity * rules.rare_synonym_factor,
+            impact
+        )
+        impact = np.where(is_semantic & ~no_overlap, query_weights * best_similarity, impact)
+
+    # E. Acumulación por ítem
+    credited = (impact > 0) & matched
+    scores = np.bincount(best_idx[credited], weights=impact[credited], minlength=n_items)
+    counts = np.bincount(best_idx[credited], weights=query_raw_counts[credited], minlength=n_items)
+    return scores, counts
+
+
+def confidence_score(rules, score, next_score):
+    """Confianza de un ítem del ranking (mismas fórmulas que los predictores V3)."""
+    volume = min(1.0, math.log1p(score) / 4.0)
+    if rules.confidence == "volume":
+        confidence = volume
+    else:
+        if score <= 0.1:
+            return 0.0
+        # A. Dominancia sobre el siguiente del ranking
+        dominance = (score - next_score) / score if score > 0 else 0.0
+        # B. Con mucho volumen se confía más en el volumen que en la dominancia
+        if volume > 0.8:
+            confidence = (volume * 0.7) + (dominance * 0.3)
+        else:
+            confidence = (volume * 0.6) + (dominance * 0.4)
+    if score < rules.low_volume_score:
+        confidence *= 0.5
+    return confidence
+
+
+class TrendEngine:
+    """
+    Motor de tendencias multi-catálogo.
+    Cada catálogo registrado (cursos, libros, temas...) trae sus vectores y sus
+    reglas. rank() agrega las queries y las codifica UNA sola vez, y luego
+    puntúa todos los catálogos con el scoring vectorizado: top-N por catálogo
+    con score, confianza y cantidad de búsquedas.
+    """
+
+    def __init__(self, query_stopwords=None):
+        # Stopwords plegadas al canonicalizar las queries (None = solo normalización)
+        self.query_stopwords = query_stopwords
+        self._catalogs = {}
+
+    def register(self, name, items_df, vectors, rules, lexical=None):
+        """
+        vectors: matriz normalizada o VectorIndex (ids = items_df['id']).
+        lexical: LexicalIndex ya armado en el refresh (si falta, se arma aquí).
+        """
+        if items_df is None or items_df.empty or vectors is None:
+            return self
+        names = items_df['name'].fillna('').tolist()
+        lexical = lexical or LexicalIndex(names, rules)
+        self._catalogs[name] = {
+            "names": names,
+            "ids": items_df['id'].tolist() if 'id' in items_df else None,
+            "vectors": vectors,
+            "rules": rules,
+            "lexical": lexical,
+        }
+        return self
+
+    def __contains__(self, name):
+        return name in self._catalogs
+
+    def rank(self, trends_df, model, top_n=5):
+        """
+        Devuelve {'queries': n, 'canonicalization': stats, 'catalogs': {nombre: [ítem, ...]}}
+        con ítems {'id', 'name', 'score', 'confidence', 'searchCount'} de mayor a menor score.
+        Solo aparecen ítems con score > 0. Las queries equivalentes se fusionan
+        antes de codificar (ver decay.canonicalize_trends): n es la cantidad canónica.
+        """
+        result = {"queries": 0, "canonicalization": None, "catalogs": {name: [] for name in self._catalogs}}
+        if not self._catalogs:
+            return result
+        canonical, stats = canonicalize_trends(trends_df, self.query_stopwords)
+        queries = canonical['query']
+        result.update(queries=len(queries), canonicalization=stats)
+        if not queries:
+            return result
+        print(f"🧹 Queries canónicas: {stats['rawQueries']} -> {stats['uniqueQueries']} "
+              f"(-{stats['reduction']:.0%})")
+
+        weights = canonical['weight']
+        raw_counts = canonical['count']
+        # El scoring léxico usa la forma normalizada SIN plegar stopwords: "tasa interes"
+        # ya no es substring de "Tasa de Interés Compuesta", "tasa de interes" sí
+        norm_queries = canonical['normalized']
+        query_embeddings = model.encode(queries)
+
+        for name, catalog in self._catalogs.items():
+            best_idx, best_similarity = nearest(query_embeddings, catalog["vectors"], catalog["ids"])
+            scores, counts = score_queries(
+                queries, weights, raw_counts, best_idx, best_similarity,
+                catalog["lexical"].lexicon, len(catalog["names"]), catalog["rules"], norm_queries,
+                catalog["lexical"]
+            )
+            result["catalogs"][name] = self._top(catalog, scores, counts, top_n)
+        return result
+
+    @staticmethod
+    def _top(catalog, scores, counts, top_n):
+        order = np.argsort(-scores, kind='stable')
+        entries = []
+        for rank, idx in enumerate(order[:top_n]):
+            score = float(scores[idx])
+            if score <= 0:
+                break
+            next_score = float(scores[order[rank + 1]]) if rank + 1 < len(order) else 0.0
+            item_id = catalog["ids"][idx] if catalog["ids"] is not None else None
+            entries.append({
+                "id": item_id.item() if hasattr(item_id, 'item') else item_id,
+                "name": catalog["names"][idx],
+                "score": score,
+                "confidence": round(confidence_score(catalog["rules"], score, next_score), 2),
+                "searchCount": int(counts[idx]),
+            })
+        return entries
+
+
+def summarize(entries, rules, label_key, reason):
+    """
+    Formato de un solo ganador (el de /api/trends y run_batch) a partir del ranking.
+    entries=None: el catálogo no estaba disponible.
+    """
+    if entries is None:
+        return {label_key: None, "confidence": 0, "reason": "Sin datos"}
+    top = entries[0] if entries else {"name": None, "score": 0.0, "confidence": 0.0, "searchCount": 0}
+    return {
+        label_key: top["name"] if top["score"] > rules.min_prediction_score else None,
+        "confidence": top["confidence"],
+        "reason": reason.format(count=top["searchCount"]),
+        "searchCount": top["searchCount"]
+    }
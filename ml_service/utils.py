@@ -12,9 +12,83 @@ def load_json_data(file_path):
         print(f"Error al cargar el archivo JSON {file_path}: {e}")
         return None
 
+class _AsciiFold(dict):
+    """Tabla para str.translate: cada carácter se translitera con unidecode una sola vez."""
+
+    def __missing__(self, code):
+        value = self[code] = unidecode(chr(code))
+        return value
+
+
+_ASCII_FOLD = _AsciiFold()
+
+# ASCII que la regex de normalize_text borra ([^a-z0-9\s]); '\x00' se conserva como separador
+_NON_WORD_ASCII = bytes(c for c in range(1, 128) if not re.match(r'[a-z0-9\s]', chr(c)))
+
+
 def normalize_text(text):
     """Normaliza el texto: minúsculas, sin acentos y sin caracteres especiales."""
     if not isinstance(text, str):
         return ""
-    text = unidecode(text.lower())
-    return re.sub(r'[^a-z0-9\s]', '', text)
\ No newline at end of file
+    text = text.lower()
+    # unidecode recorre el texto carácter a carácter en Python; la tabla cacheada
+    # da la misma transliteración con str.translate, que recorre en C
+    if not text.isascii():
+        text = text.translate(_ASCII_FOLD)
+    return re.sub(r'[^a-z0-9\s]', '', text)
+
+def normalize_texts(texts):
+    """
+    normalize_text sobre una lista, en una sola pasada: los textos se unen con
+    '\\x00' y se vuelven a separar al final. Si algún texto ya trae '\\x00',
+    se normaliza uno por uno.
+    """
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    if not texts:
+        return []
+    # lower() por texto: sobre el buffer entero reserva el peor caso de expansión (x3, UCS-4)
+    joined = "\x00".join(text.lower() for text in texts)
+    if joined.count("\x00") != len(texts) - 1:
+        return [normalize_text(text) for text in texts]
+    if not joined.isascii():
+        # Pocos caracteres distintos fuera de ASCII: un replace por carácter es
+        # más barato que translate sobre todo el buffer
+        for char in {char for char in set(joined) if not char.isascii()}:
+            joined = joined.replace(char, _ASCII_FOLD[ord(char)])
+    # Ya es ASCII: bytes.translate borra lo mismo que la regex sin armar una lista por match
+    return joined.encode('ascii').translate(None, _NON_WORD_ASCII).decode('ascii').split("\x00")
+
+# Palabras funcionales que no cambian la intención de una búsqueda (plegado opcional).
+# Subconjunto de las stopwords de cursos: no altera la tokenización de los predictores.
+QUERY_STOPWORDS = frozenset({
+    'el', 'la', 'los', 'las', 'un', 'una', 'de', 'del', 'al', 'y', 'o', 'en'
+})
+
+def canonical_query(text, stopwords=None):
+    """
+    Forma canónica de una búsqueda: normalize_text + espacios colapsados y,
+    opcionalmente, sin stopwords. "Matemática  ", "MATEMATICA" y "matematica"
+    comparten forma. Una query hecha solo de stopwords se conserva entera.
+    """
+    words = normalize_text(text).split()
+    if stopwords:
+        words = [w for w in words if w not in stopwords] or words
+    return " ".join(words)
+
+def canonical_forms(texts, stopwords=None):
+    """
+    canonical_query de una lista en una sola pasada, con y sin plegar stopwords:
+    devuelve (normales, canónicas). La normal (sin plegar) es la que sirve para
+    buscar la query como substring de un nombre; la canónica, para agruparla.
+    """
+    normals, folded = [], []
+    for text in normalize_texts(texts):
+        words = text.split()
+        normal = " ".join(words)
+        normals.append(normal)
+        if stopwords:
+            kept = [w for w in words if w not in stopwords]
+            folded.append(" ".join(kept) if kept else normal)
+        else:
+            folded.append(normal)
+    return normals, folded
@@ -0,0 +1,445 @@
+# ml_service/vector_index.py
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+try:
+    from ml_service.similarity import l2_normalize, topk
+except ImportError:
+    from similarity import l2_normalize, topk
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX_DIR = os.getenv("ML_VECTOR_INDEX_DIR", os.path.join(BASE_DIR, "data_dump", "vector_index"))
+# exact | hnsw | auto (hnsw solo si hnswlib está instalado y el catálogo es grande)
+DEFAULT_BACKEND = os.getenv("ML_VECTOR_INDEX", "auto")
+ANN_MIN_ITEMS = int(os.getenv("ML_ANN_MIN_ITEMS", "5000"))
+# Datos de saves anteriores que se borran al publicar: solo los de más de esta edad
+# (los más nuevos pueden ser de otro worker que todavía no publicó su meta.json)
+STALE_DATA_SECONDS = 300
+
+
+def vector_fingerprint(vector):
+    """Huella del vector para detectar filas cuyo texto (y por ende embedding) cambió."""
+    return hashlib.sha1(np.asarray(vector, dtype=np.float32).tobytes()).hexdigest()
+
+
+class VectorIndex(ABC):
+    """
+    Interfaz común de índices vectoriales (similitud coseno sobre vectores
+    L2-normalizados). Los ids son los del catálogo (p. ej. courses.id), no
+    posiciones, para que el índice sobreviva a recargas que reordenan filas.
+
+    En disco, cada save() escribe los datos en un archivo con versión propia
+    y recién después meta.json (que la referencia): meta y datos son siempre
+    del mismo save, aunque varios workers guarden a la vez.
+    """
+    backend = "base"
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.model_name = None
+        self.fingerprints = {}  # id -> huella del vector indexado
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    @abstractmethod
+    def add(self, ids, vectors):
+        ...
+
+    @abstractmethod
+    def remove(self, ids):
+        ...
+
+    @abstractmethod
+    def search(self, query_embeddings, k=1):
+        """Devuelve (ids, scores) de forma (Q, k); huecos con id None y score -inf."""
+
+    @abstractmethod
+    def save(self, path):
+        ...
+
+    @abstractmethod
+    def copy(self):
+        """Índice independiente con el mismo contenido (base del copy-on-write del registro)."""
+
+    def diff(self, ids, vectors):
+        """
+        Diferencias contra el catálogo actual, sin tocar el índice:
+        (removed, changed, added, vectores normalizados).
+        """
+        vectors = l2_normalize(vectors)
+        incoming = {i: vector_fingerprint(v) for i, v in zip(ids, vectors)}
+        removed = [i for i in self.fingerprints if i not in incoming]
+        changed = [i for i, fp in incoming.items() if i in self.fingerprints and self.fingerprints[i] != fp]
+        added = [i for i in incoming if i not in self.fingerprints]
+        return removed, changed, added, vectors
+
+    def sync(self, ids, vectors, diff=None):
+        """
+        Alinea el índice con el catálogo actual tocando solo las diferencias:
+        agrega ids nuevos, reindexa los que cambiaron y borra los que ya no están.
+        Modifica ESTE índice; IndexRegistry.sync lo hace sobre una copia.
+        Devuelve True si hubo cambios.
+        """
+        removed, changed, added, vectors = diff if diff is not None else self.diff(ids, vectors)
+
+        if removed or changed:
+            self.remove(removed + changed)
+        to_add = set(changed) | set(added)
+        if to_add:
+            positions = [p for p, i in enumerate(ids) if i in to_add]
+            self.add([ids[p] for p in positions], vectors[positions])
+        if removed or to_add:
+            print(f"   🗂️ Índice {self.backend}: +{len(added)} ~{len(changed)} -{len(removed)} (total {len(self)}).")
+        return bool(removed or to_add)
+
+    def _meta(self):
+        return {"backend": self.backend, "dim": self.dim, "model": self.model_name,
+                "ids": list(self.fingerprints), "fingerprints": list(self.fingerprints.values()),
+                "version": uuid.uuid4().hex}
+
+
+class ExactIndex(VectorIndex):
+    """Fuerza bruta exacta: GEMM float32 por bloques + argpartition (similarity.topk)."""
+    backend = "exact"
+
+    def __init__(self, dim):
+        super().__init__(dim)
+        # (ids, matriz) viajan juntos y se reemplazan con un único swap
+        self._state = ([], np.zeros((0, dim), dtype=np.float32))
+        self._lock = threading.Lock()
+
+    def add(self, ids, vectors):
+        vectors = l2_normalize(vectors)
+        with self._lock:
+            current_ids, matrix = self._state
+            self._state = (current_ids + list(ids), np.vstack([matrix, vectors]))
+            for i, v in zip(ids, vectors):
+                self.fingerprints[i] = vector_fingerprint(v)
+
+    def remove(self, ids):
+        drop = set(ids)
+        with self._lock:
+            current_ids, matrix = self._state
+            keep = [p for p, i in enumerate(current_ids) if i not in drop]
+            self._state = ([current_ids[p] for p in keep], matrix[keep])
+            for i in drop:
+                self.fingerprints.pop(i, None)
+
+    def copy(self):
+        # add/remove reemplazan _state en vez de mutarlo: la copia puede compartirlo
+        clone = ExactIndex(self.dim)
+        clone._state = self._state
+        clone.model_name = self.model_name
+        clone.fingerprints = dict(self.fingerprints)
+        return clone
+
+    def search(self, query_embeddings, k=1):
+        ids, matrix = self._state  # lectura consistente sin bloquear
+        positions, scores = topk(query_embeddings, matrix, k)
+        out_ids = np.full(positions.shape, None, dtype=object)
+        found = positions >= 0
+        out_ids[found] = np.asarray(ids, dtype=object)[positions[found]]
+        return out_ids, scores
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        ids, matrix = self._state
+        meta = self._meta()
+        meta["ids"] = ids
+        meta["fingerprints"] = [self.fingerprints[i] for i in ids]
+        data = _data_file("vectors", meta["version"], ".npy")
+        _atomic_write(os.path.join(path, data), lambda f: np.save(f, matrix))
+        _publish(path, meta, data)
+
+    @classmethod
+    def load(cls, path, meta):
+        matrix = np.load(os.path.join(path, _data_file("vectors", meta["version"], ".npy")))
+        if matrix.shape != (len(meta["ids"]), meta["dim"]):
+            raise ValueError(f"matriz {matrix.shape} para {len(meta['ids'])} ids de dim {meta['dim']}")
+        index = cls(meta["dim"])
+        index._state = (list(meta["ids"]), matrix)
+        index.model_name = meta.get("model")
+        index.fingerprints = dict(zip(meta["ids"], meta["fingerprints"]))
+        return index
+
+
+class HNSWIndex(VectorIndex):
+    """
+    Vecinos aproximados (HNSW, CPU) con hnswlib. Dependencia opcional:
+    pip install hnswlib. Los borrados se marcan (mark_deleted) sin reconstruir.
+    """
+    backend = "hnsw"
+
+    def __init__(self, dim, max_elements=1024, m=16, ef_construction=200, ef_search=64):
+        super().__init__(dim)
+        import hnswlib  # import diferido: solo si se elige este backend
+
+        self._index = hnswlib.Index(space='ip', dim=dim)
+        self._index.init_index(max_elements=max_elements, M=m, ef_construction=ef_construction,
+                               allow_replace_deleted=True)
+        self._index.set_ef(ef_search)
+        self.ef_search = ef_search
+        self._labels = {}      # id -> label interno
+        self._ids_by_label = {}
+        self._next_label = 0
+        self._lock = threading.Lock()
+
+    def add(self, ids, vectors):
+        vectors = l2_normalize(vectors)
+        with self._lock:
+            # get_current_count incluye los marcados como borrados
+            needed = self._index.get_current_count() + len(ids)
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+            labels = np.arange(self._next_label, self._next_label + len(ids))
+            self._next_label += len(ids)
+            self._index.add_items(vectors, labels)
+            for i, label, v in zip(ids, labels, vectors):
+                self._labels[i] = int(label)
+                self._ids_by_label[int(label)] = i
+                self.fingerprints[i] = vector_fingerprint(v)
+
+    def remove(self, ids):
+        with self._lock:
+            for i in ids:
+                label = self._labels.pop(i, None)
+                if label is not None:
+                    self._index.mark_deleted(label)
+                    self._ids_by_label.pop(label, None)
+                self.fingerprints.pop(i, None)
+
+    def copy(self):
+        with self._lock:
+            clone = HNSWIndex.__new__(HNSWIndex)
+            VectorIndex.__init__(clone, self.dim)
+            # hnswlib.Index se serializa completo (grafo + vectores + marcas de borrado)
+            clone._index = pickle.loads(pickle.dumps(self._index))
+            clone._index.set_ef(self.ef_search)
+            clone.ef_search = self.ef_search
+            clone._labels = dict(self._labels)
+            clone._ids_by_label = dict(self._ids_by_label)
+            clone._next_label = self._next_label
+            clone.model_name = self.model_name
+            clone.fingerprints = dict(self.fingerprints)
+        clone._lock = threading.Lock()
+        return clone
+
+    def search(self, query_embeddings, k=1):
+        queries = l2_normalize(query_embeddings)
+        n_queries = queries.shape[0]
+        out_ids = np.full((n_queries, k), None, dtype=object)
+        out_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        with self._lock:
+            k_eff = min(k, len(self._labels))
+            if k_eff == 0 or n_queries == 0:
+                return out_ids, out_scores
+            self._index.set_ef(max(self.ef_search, k_eff))
+            labels, distances = self._index.knn_query(queries, k=k_eff)
+            lookup = self._ids_by_label
+            out_ids[:, :k_eff] = np.vectorize(lookup.get, otypes=[object])(labels)
+        # Espacio 'ip': distancia = 1 - producto interno
+        out_scores[:, :k_eff] = 1.0 - distances
+        return out_ids, out_scores
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            meta = self._meta()
+            meta.update(labels=[self._labels[i] for i in meta["ids"]], next_label=self._next_label,
+                        max_elements=self._index.get_max_elements(),
+                        elements=self._index.get_current_count())
+            data = _data_file("hnsw", meta["version"], ".bin")
+            # hnswlib escribe por nombre de archivo: el temporal único lo crea mkstemp
+            fd, tmp = tempfile.mkstemp(dir=path, suffix=".tmp")
+            os.close(fd)
+            try:
+                self._index.save_index(tmp)
+                os.replace(tmp, os.path.join(path, data))
+            except BaseException:
+                _discard(tmp)
+                raise
+        _publish(path, meta, data)
+
+    @classmethod
+    def load(cls, path, meta):
+        import hnswlib
+
+        data = os.path.join(path, _data_file("hnsw", meta["version"], ".bin"))
+        if not os.path.exists(data):
+            raise ValueError(f"falta {os.path.basename(data)}")
+        index = cls(meta["dim"], max_elements=1)
+        index._index = hnswlib.Index(space='ip', dim=meta["dim"])
+        index._index.load_index(data, max_elements=meta["max_elements"], allow_replace_deleted=True)
+        if index._index.get_current_count() != meta["elements"] or len(meta["labels"]) != len(meta["ids"]):
+            raise ValueError(f"{index._index.get_current_count()} elementos para {len(meta['ids'])} ids")
+        index._index.set_ef(index.ef_search)
+        index._labels = dict(zip(meta["ids"], meta["labels"]))
+        index._ids_by_label = {label: i for i, label in index._labels.items()}
+        index._next_label = meta["next_label"]
+        index.model_name = meta.get("model")
+        index.fingerprints = dict(zip(meta["ids"], meta["fingerprints"]))
+        return index
+
+
+_BACKENDS = {"exact": ExactIndex, "hnsw": HNSWIndex}
+
+
+def _hnsw_available():
+    try:
+        import hnswlib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_backend(backend, n_items):
+    if backend == "auto":
+        return "hnsw" if n_items >= ANN_MIN_ITEMS and _hnsw_available() else "exact"
+    if backend == "hnsw" and not _hnsw_available():
+        print("⚠️ hnswlib no está instalado; usando índice exacto.")
+        return "exact"
+    return backend
+
+
+def create_index(backend, dim, n_items=0):
+    return _BACKENDS[resolve_backend(backend, n_items)](dim)
+
+
+def _data_file(prefix, version, suffix):
+    return f"{prefix}-{version}{suffix}"
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _atomic_write(path, write):
+    """
+    Escribe en un temporal único del mismo directorio (mkstemp) y lo renombra:
+    dos workers guardando a la vez nunca comparten temporal ni dejan un archivo a medias.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        _discard(tmp)
+        raise
+
+
+def _atomic_write_json(path, payload):
+    _atomic_write(path, lambda f: f.write(json.dumps(payload).encode("utf-8")))
+
+
+def _publish(path, meta, data):
+    """
+    Publica meta.json (que apunta a 'data') y borra los datos viejos de saves anteriores.
+    Un lector que leyó un meta cuyo archivo se borró en el medio no lo encuentra:
+    load() lo rechaza y el registro reconstruye el índice.
+    """
+    _atomic_write_json(os.path.join(path, "meta.json"), meta)
+    prefix = data.split("-", 1)[0]
+    cutoff = time.time() - STALE_DATA_SECONDS
+    for name in os.listdir(path):
+        if name == data or not name.startswith(prefix) or name.endswith(".tmp"):
+            continue
+        try:
+            if os.path.getmtime(os.path.join(path, name)) < cutoff:
+                _discard(os.path.join(path, name))
+        except OSError:
+            pass
+
+
+class IndexRegistry:
+    """
+    Un índice por catálogo ('courses', 'books', ...), persistido en disco y
+    sincronizado incrementalmente en cada refresh_data().
+    Copy-on-write: un índice devuelto por sync() ya puede estar en un snapshot
+    publicado, así que nunca se modifica; si hay cambios se aplican sobre una copia.
+    """
+
+    def __init__(self, base_dir=DEFAULT_INDEX_DIR, backend=DEFAULT_BACKEND, model_name=None):
+        self.base_dir = base_dir
+        self.backend = backend
+        self.model_name = model_name
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.base_dir, name)
+
+    def _load(self, name, dim, n_items):
+        path = self._path(name)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                wanted = resolve_backend(self.backend, n_items)
+                if meta.get("dim") == dim and meta.get("model") == self.model_name and meta.get("backend") == wanted:
+                    return _BACKENDS[wanted].load(path, meta)
+            except (OSError, ValueError, KeyError, ImportError, RuntimeError) as e:
+                print(f"⚠️ Índice '{name}' ilegible, se reconstruye: {e}")
+        return create_index(self.backend, dim, n_items)
+
+    def sync(self, name, ids, vectors):
+        """
+        Devuelve el índice del catálogo alineado con (ids, vectors): el mismo
+        objeto si no hubo cambios, o uno nuevo (copia + diferencias) que se guarda.
+        """
+        ids = [i.item() if hasattr(i, "item") else i for i in ids]
+        vectors = l2_normalize(vectors)
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None or index.dim != vectors.shape[1] or index.model_name != self.model_name:
+                # Recién leído de disco: todavía no lo ve ningún snapshot
+                index = self._load(name, vectors.shape[1], len(ids))
+                index.model_name = self.model_name
+            diff = index.diff(ids, vectors)
+            removed, changed, added, _ = diff
+            if removed or changed or added:
+                if name in self._indexes and self._indexes[name] is index:
+                    index = index.copy()
+                index.sync(ids, vectors, diff)
+                try:
+                    index.save(self._path(name))
+                except OSError as e:
+                    print(f"⚠️ No se pudo persistir el índice '{name}': {e}")
+            self._indexes[name] = index
+            return index
+
+
+def nearest(query_embeddings, catalog, catalog_ids=None):
+    """
+    Mejor ítem por query contra una matriz o un VectorIndex.
+    Devuelve (best_row, best_similarity) con best_row = posición en catalog_ids
+    (o en la matriz); -1 si el índice devolvió un id que ya no está en el catálogo.
+    """
+    if not isinstance(catalog, VectorIndex):
+        try:
+            from ml_service.similarity import top1
+        except ImportError:
+            from similarity import top1
+        return top1(query_embeddings, catalog)
+
+    if catalog_ids is None:
+        raise ValueError("Un VectorIndex necesita los ids del catálogo (columna 'id').")
+    ids, scores = catalog.search(query_embeddings, k=1)
+    positions = {i: p for p, i in enumerate(catalog_ids)}
+    best_row = np.fromiter((positions.get(i, -1) for i in ids[:, 0]), dtype=np.int64, count=len(ids))
+    best_similarity = np.where(best_row >= 0, scores[:, 0], -np.inf).astype(np.float32)
+    return best_row, best_similarity
@@ -0,0 +1,98 @@
+import os
+import re
+
+# Tamaño objetivo y solape de cada chunk (caracteres); MAX es el tope duro
+CHUNK_TARGET_CHARS = int(os.getenv("CHUNK_TARGET_CHARS", "1500"))
+CHUNK_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP_CHARS", "200"))
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "3000"))
+
+# Fin de oración: . ! ? … seguidos de espacio y de mayúscula/dígito/apertura (no corta "1.5")
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+(?=[¿¡"«(\[A-ZÁÉÍÓÚÑ0-9])')
+# Abreviaturas (e iniciales) tras las que un punto no cierra la oración: "Dr. García", "J. Pérez"
+_ABBREVIATION_END = re.compile(
+    r'(?:^|[\s(])(?:Dr|Dra|Dres|Sr|Sra|Srta|Sres|Lic|Ing|Prof|Dpto|Art|Fig|Vol|Cap|Núm|Nro|pág|págs|aprox'
+    r'|[A-ZÁÉÍÓÚÑ])\.$'
+)
+_SPACES = re.compile(r'\s+')
+
+
+def _merge_abbreviations(pieces):
+    """Vuelve a unir los cortes hechos tras una abreviatura ("El Dr." + "García indicó...")."""
+    current = None
+    for piece in pieces:
+        current = piece if current is None else f"{current} {piece}"
+        if not _ABBREVIATION_END.search(current):
+            yield current
+            current = None
+    if current:
+        yield current
+
+
+def split_sentences(text, max_chars=CHUNK_MAX_CHARS):
+    """
+    Oraciones de un texto. Una oración más larga que max_chars (tablas, OCR sin
+    puntuación) se parte en límites de palabra, nunca a mitad de una.
+    """
+    text = _SPACES.sub(' ', text).strip()
+    for sentence in _merge_abbreviations(_SENTENCE_END.split(text)):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            yield sentence[:cut].strip()
+            sentence = sentence[cut:].strip()
+        if sentence:
+            yield sentence
+
+
+def chunk_pages(pages, target_chars=CHUNK_TARGET_CHARS, overlap_chars=CHUNK_OVERLAP_CHARS,
+                max_chars=CHUNK_MAX_CHARS):
+    """
+    Generador: recibe (page_num, texto) en orden y produce chunks
+    {'content', 'page_start', 'page_end'} a medida que se completan.
+
+    - Se acumulan oraciones enteras hasta alcanzar ~target_chars.
+    - El chunk siguiente arranca con las últimas oraciones del anterior
+      (hasta overlap_chars) para no perder contexto en el borde.
+    - Solo vive en memoria el chunk en construcción: el consumo no depende
+      del largo del libro.
+    page_start/page_end son 1-based.
+    """
+    sentences = []  # (page_num, oración) del chunk en construcción
+    size = 0
+
+    def emit():
+        return {
+            'content': ' '.join(s for _, s in sentences),
+            'page_start': sentences[0][0] + 1,
+            'page_end': sentences[-1][0] + 1,
+        }
+
+    def carry_overlap():
+        carried, carried_size = [], 0
+        for page_num, sentence in reversed(sentences):
+            if carried_size + len(sentence) + 1 > overlap_chars:
+                break
+            carried.insert(0, (page_num, sentence))
+            carried_size += len(sentence) + 1
+        return carried, carried_size
+
+    fresh = False  # hay oraciones que todavía no salieron en ningún chunk
+    for page_num, text in pages:
+        if not text:
+            continue
+        for sentence in split_sentences(text, max_chars):
+            if sentences and size + len(sentence) + 1 > max_chars:
+                yield emit()
+                sentences, size = carry_overlap()
+                if size + len(sentence) + 1 > max_chars:
+                    sentences, size = [], 0
+            sentences.append((page_num, sentence))
+            size += len(sentence) + 1
+            fresh = True
+            if size >= target_chars:
+                yield emit()
+                sentences, size = carry_overlap()
+                fresh = False
+
+    if sentences and fresh:
+        yield emit()
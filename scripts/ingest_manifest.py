@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """Hash del contenido leyendo por bloques (los libros pesan cientos de MB)."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    Registro de PDFs ya ingeridos: ruta relativa -> size, mtime, sha256, páginas, chunks.
+
+    - Se guarda en disco (escritura atómica) después de CADA archivo confirmado
+      en la base: si el proceso muere, la siguiente corrida continúa donde quedó.
+    - needs_ingest(): size + mtime iguales -> se salta sin leer el archivo.
+      Si cambió el mtime pero el hash es el mismo (copia, touch) también se salta.
+    """
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = root
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Manifest ilegible ({e}); se reprocesará toda la biblioteca.")
+
+    def key(self, file_path):
+        return os.path.relpath(file_path, self.root).replace(os.sep, '/')
+
+    def needs_ingest(self, file_path):
+        entry = self.entries.get(self.key(file_path))
+        if entry is None:
+            return True
+        stat = os.stat(file_path)
+        if entry.get('size') != stat.st_size:
+            return True
+        if entry.get('mtime') == stat.st_mtime:
+            return False
+        if entry.get('sha256') == file_sha256(file_path):
+            # Mismo contenido con otra fecha: se actualiza el mtime para no volver a hashear
+            with self._lock:
+                entry['mtime'] = stat.st_mtime
+            self.save()
+            return False
+        return True
+
+    def record(self, file_path, sha256, pages, chunks):
+        stat = os.stat(file_path)
+        with self._lock:
+            self.entries[self.key(file_path)] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'sha256': sha256,
+                'pages': pages,
+                'chunks': chunks,
+                'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+        self.save()
+
+    def save(self):
+        with self._lock:
+            payload = json.dumps({'files': self.entries}, indent=2, ensure_ascii=False)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
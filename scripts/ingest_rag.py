@@ -1,38 +1,64 @@
+import argparse
+import io
 import os
 import re
-import fitz  # PyMuPDF
-import psycopg2
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
 import json
 from dotenv import load_dotenv
 
-# Dependencias OCR
-from pdf2image import convert_from_path
-import pytesseract
-from PIL import Image
+# PyMuPDF (fitz), Tesseract (pytesseract + PIL) y psycopg2 se importan donde se usan:
+# el módulo se importa sin ellos (tests, o un worker que solo escribe)
+from ingest_manifest import IngestManifest, file_sha256
+from ocr_cache import OCRCache, page_content_hash
+from chunker import chunk_pages
 
 # Configuración de ruta Tesseract para Windows (Ajustar si es necesario)
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+TESSERACT_CMD_WINDOWS = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
 # Cargar variables de entorno
 current_dir = os.path.dirname(os.path.abspath(__file__))
 root_dir = os.path.dirname(current_dir)
 load_dotenv(dotenv_path=os.path.join(root_dir, '.env'))
 
-# Configuración DB
-DB_CONNECTION_STRING = os.getenv("NODE_DATABASE_URL")
-if not DB_CONNECTION_STRING:
-    DB_HOST = os.getenv("SUPABASE_DB_HOST", "db.supabase.co")
-    DB_USER = os.getenv("SUPABASE_DB_USER", "postgres")
-    DB_PASS = os.getenv("SUPABASE_DB_PASSWORD")
-    DB_NAME = "postgres"
-    if not DB_PASS:
-        print("Error: Faltan credenciales de Base de Datos en .env")
-        exit(1)
-    DB_CONNECTION_STRING = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
+def get_connection_string():
+    """
+    Configuración DB. Se resuelve una vez en el proceso principal y se pasa a
+    los workers al crearlos (en Windows re-importan este módulo).
+    """
+    connection_string = os.getenv("NODE_DATABASE_URL")
+    if not connection_string:
+        DB_HOST = os.getenv("SUPABASE_DB_HOST", "db.supabase.co")
+        DB_USER = os.getenv("SUPABASE_DB_USER", "postgres")
+        DB_PASS = os.getenv("SUPABASE_DB_PASSWORD")
+        DB_NAME = "postgres"
+        if not DB_PASS:
+            print("Error: Faltan credenciales de Base de Datos en .env")
+            exit(1)
+        connection_string = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
+    return connection_string
 
 # 🚨 VERTEX AI Y EMBEDDINGS ELIMINADOS (Ahorro de API y Espacio)
 
 LIBRARY_PATH = os.path.join(root_dir, "biblioteca_medica")
+# Registro de archivos ya ingeridos (permite saltar PDFs sin cambios y retomar tras un fallo)
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST", os.path.join(LIBRARY_PATH, ".ingest_manifest.json"))
+# Procesos de extracción en paralelo (uno por archivo) y tope de archivos en vuelo por worker
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+QUEUE_PER_WORKER = 2
+# Filas por sentencia INSERT ... VALUES (un round-trip por lote, no por párrafo)
+INSERT_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+
+# OCR: páginas con menos caracteres nativos que esto se consideran escaneadas
+OCR_MIN_CHARS = 50
+OCR_DPI = 300
+OCR_LANG = 'spa'
+# Procesos Tesseract por worker de archivo (0 = reparte los núcleos entre los workers)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
+# Texto OCR ya calculado, por hash de contenido de página (compartido entre corridas)
+OCR_CACHE_PATH = os.getenv("OCR_CACHE", os.path.join(root_dir, "data_dump", "ocr_cache.sqlite"))
 
 def extract_metadata(file_path):
     """
@@ -67,112 +93,370 @@ def extract_metadata(file_path):
         "folder": folder
     }
 
-def smart_chunking(file_path):
+def _ocr_png(png_bytes):
+    """Trabajo de un proceso Tesseract: PNG ya renderizado -> texto plano."""
+    import pytesseract
+    from PIL import Image
+
+    if os.name == 'nt':
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD_WINDOWS
+    with Image.open(io.BytesIO(png_bytes)) as image:
+        return pytesseract.image_to_string(image, lang=OCR_LANG).replace('\n', ' ').strip()
+
+
+_ocr_pool = None
+_ocr_cache = None
+
+
+def _init_worker(ocr_workers, connection_string):
+    """Inicializador de los workers de archivo: procesos OCR por worker y conexión a la base."""
+    global OCR_WORKERS, _connection_string
+    OCR_WORKERS = ocr_workers
+    _connection_string = connection_string
+
+
+def _get_ocr_pool():
+    """Pool de Tesseract del proceso actual (perezoso). Con 1 worker se hace OCR en línea."""
+    global _ocr_pool
+    if _ocr_pool is None and OCR_WORKERS > 1:
+        _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    return _ocr_pool
+
+
+def _get_ocr_cache():
+    global _ocr_cache
+    if _ocr_cache is None:
+        try:
+            _ocr_cache = OCRCache(OCR_CACHE_PATH)
+        except Exception as e:
+            print(f"   [!] Caché OCR deshabilitada: {e}", flush=True)
+            _ocr_cache = False
+    return _ocr_cache or None
+
+
+def _submit_ocr(png_bytes):
+    pool = _get_ocr_pool()
+    if pool is not None:
+        return pool.submit(_ocr_png, png_bytes)
+    future = Future()
+    try:
+        future.set_result(_ocr_png(png_bytes))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def iter_page_texts(doc, stats=None):
     """
-    Estrategia Semántica + OCR Híbrido:
-    Intenta sacar texto nativo. Si es muy pobre (< 50 caracteres validos por pagina), 
-    asume que es un escáner y aplica Tesseract OCR.
+    Generador de (page_num, texto) en orden de página. Las páginas escaneadas se
+    renderizan desde el documento ya abierto (page.get_pixmap, sin poppler ni
+    re-parsear el PDF) y se reparten a los procesos Tesseract; el resultado se
+    guarda en la caché OCR por hash de contenido. Como mucho 2 x OCR_WORKERS
+    páginas esperan en memoria.
+    Si se pasa 'stats' (dict), se anotan en stats['ocr_failed'] las páginas cuyo
+    OCR falló (quedan con su texto nativo pobre).
     """
-    chunks = []
-    buffer_text = ""
-    
-    doc = fitz.open(file_path)
-    
+    if stats is not None:
+        stats.setdefault('ocr_failed', 0)
+    cache = _get_ocr_cache()
+    window = deque()  # [page_num, texto nativo, (clave, future) o None]
+    max_in_flight = max(OCR_WORKERS, 1) * 2
+    in_flight = 0
+    ocr_pages = cached_pages = 0
+
+    def resolve(entry):
+        page_num, text, pending = entry
+        if pending is None:
+            return page_num, text
+        key, future = pending
+        try:
+            ocr_text = future.result()
+        except Exception as e:
+            # Se conserva el texto nativo (pobre) de la página; el archivo no se da por terminado
+            print(f"   [Error] Falló el OCR en la página {page_num + 1}: {e}", flush=True)
+            if stats is not None:
+                stats['ocr_failed'] += 1
+            return page_num, text
+        if cache is not None:
+            cache.put(key, ocr_text)
+        return page_num, ocr_text
+
     for page_num, page in enumerate(doc):
         # 1. Intento de extracción de texto estándar
-        text = page.get_text()
-        text = text.replace('\n', ' ').strip()
-        
-        # 2. Lógica OCR Híbrida
-        chars_only = re.sub(r'\s+', '', text)
-        if len(chars_only) < 50:
-            print(f"   [!] Página {page_num + 1} requiere OCR (Escáner detectado). Aplicando Tesseract...", flush=True)
-            try:
-                # IMPORTANT: convert_from_path needs the string path, not the fitz object
-                # On Windows, we must explicitly point to the poppler bin directory
-                images = convert_from_path(file_path, first_page=page_num+1, last_page=page_num+1, dpi=300, poppler_path=r'C:\poppler\Library\bin')
-                if images:
-                    ocr_text = pytesseract.image_to_string(images[0], lang='spa')
-                    text = ocr_text.replace('\n', ' ').strip()
-                    print(f"       [OK] OCR exitoso. {len(text)} caracteres extraídos.", flush=True)
-            except Exception as e:
-                import traceback
-                print(f"   [Error] Falló el OCR en la página {page_num +1}: {e}", flush=True)
-                traceback.print_exc()
-        else:
-             pass # Silenciamos el log para que no ensucie la consola
-        
-        if not text:
-            continue
-
-        # Lógica de buffer (si el texto es muy corto, unimos al siguiente)
-        if len(text) < 500:
-            buffer_text += " " + text
-        else:
-            full_chunk = (buffer_text + " " + text).strip()
-            buffer_text = "" 
-            
-            # Cortar si es excesivamente gigante
-            if len(full_chunk) > 3000:
-                mid = len(full_chunk) // 2
-                chunks.append(full_chunk[:mid])
-                chunks.append(full_chunk[mid:])
+        text = page.get_text().replace('\n', ' ').strip()
+        pending = None
+
+        # 2. Lógica OCR Híbrida (escáner detectado)
+        if len(re.sub(r'\s+', '', text)) < OCR_MIN_CHARS:
+            ocr_pages += 1
+            key = page_content_hash(doc, page, OCR_DPI, OCR_LANG)
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                cached_pages += 1
+                text = cached
             else:
-                chunks.append(full_chunk)
-    
-    # Remanente final
-    if buffer_text:
-        chunks.append(buffer_text.strip())
-        
-    doc.close()
-    return chunks
-
-def ingest_library():
-    if not os.path.exists(LIBRARY_PATH):
-        print(f"⚠️ No se encontró la carpeta {LIBRARY_PATH}")
-        return
+                while in_flight >= max_in_flight:
+                    entry = window.popleft()
+                    in_flight -= entry[2] is not None
+                    yield resolve(entry)
+                png_bytes = page.get_pixmap(dpi=OCR_DPI).tobytes("png")
+                pending = (key, _submit_ocr(png_bytes))
+                in_flight += 1
+
+        window.append((page_num, text, pending))
+        # Las páginas listas al frente de la ventana salen sin esperar
+        while window and window[0][2] is None:
+            yield resolve(window.popleft())
+
+    while window:
+        yield resolve(window.popleft())
+
+    if ocr_pages:
+        print(f"   [OCR] {ocr_pages} páginas escaneadas ({cached_pages} desde caché).", flush=True)
+
+
+def smart_chunking(doc, stats=None):
+    """
+    Estrategia Semántica + OCR Híbrido:
+    Intenta sacar texto nativo. Si es muy pobre (< 50 caracteres validos por pagina), 
+    asume que es un escáner y aplica Tesseract OCR (en paralelo y con caché).
+    Generador: las páginas fluyen a chunks por oraciones con solape y rango de páginas.
+    """
+    return chunk_pages(iter_page_texts(doc, stats))
+
+
+_writer = None
+_connection_string = None
 
-    print(f"Iniciando ingesta masiva (Sin Embeddings) desde: {LIBRARY_PATH}")
 
-    for root, dirs, files in os.walk(LIBRARY_PATH):
+def _get_writer():
+    """DocumentWriter del proceso actual (una conexión reutilizada por worker)."""
+    global _writer
+    if _writer is None:
+        _writer = DocumentWriter(_connection_string, max_connections=1)
+    return _writer
+
+
+def process_file(file_path):
+    """
+    Trabajo de un worker: extrae, trocea y escribe un PDF completo.
+    Los chunks van del generador directo al writer (una transacción por
+    documento), así la memoria no crece con el largo del libro.
+    """
+    import fitz  # PyMuPDF
+
+    started = time.perf_counter()
+    metadata = extract_metadata(file_path)
+    stats = {}
+    with fitz.open(file_path) as doc:
+        pages = doc.page_count
+        chunks = _get_writer().write_document(metadata, smart_chunking(doc, stats))
+    return {
+        "file_path": file_path,
+        "metadata": metadata,
+        "chunks": chunks,
+        "pages": pages,
+        "ocr_failed": stats.get('ocr_failed', 0),
+        "sha256": file_sha256(file_path),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _connection_pool(connection_string, max_connections):
+    """Pool de conexiones psycopg2 (factory: los tests lo reemplazan por uno falso)."""
+    from psycopg2.pool import SimpleConnectionPool
+    return SimpleConnectionPool(1, max_connections, connection_string)
+
+
+def _execute_values(cur, sql, rows, page_size):
+    """Un INSERT ... VALUES con todas las filas del lote (psycopg2.extras.execute_values)."""
+    from psycopg2.extras import execute_values
+    execute_values(cur, sql, rows, page_size=page_size)
+
+
+class DocumentWriter:
+    """
+    Escritor por lotes hacia la tabla documents.
+
+    - Reutiliza una conexión del pool (no una conexión nueva por PDF).
+    - Inserta con execute_values en lotes de 'batch_size' filas.
+    - Una transacción por documento: primero borra los chunks previos de ese
+      archivo (source + folder) y luego inserta los nuevos. Re-ingerir un PDF
+      reemplaza su contenido en lugar de duplicarlo; si algo falla, queda el anterior.
+    """
+
+    DELETE_SQL = "DELETE FROM documents WHERE metadata->>'source' = %s AND metadata->>'folder' = %s"
+    INSERT_SQL = "INSERT INTO documents (content, metadata) VALUES %s"
+
+    def __init__(self, connection_string, batch_size=INSERT_BATCH_SIZE, max_connections=2):
+        self.pool = _connection_pool(connection_string, max_connections)
+        self.batch_size = batch_size
+
+    def _rows(self, metadata, chunks):
+        for i, chunk in enumerate(chunks):
+            # Enriquecer metadatos con el chunk id (y el rango de páginas si viene del chunker)
+            chunk_meta = metadata.copy()
+            chunk_meta['chunk_index'] = i
+            if isinstance(chunk, dict):
+                chunk_meta['page_start'] = chunk['page_start']
+                chunk_meta['page_end'] = chunk['page_end']
+                chunk = chunk['content']
+            # Solo guardamos Content y Metadata. La BD hace el resto automáticamente.
+            yield (chunk, json.dumps(chunk_meta))
+
+    def write_document(self, metadata, chunks):
+        """Reemplaza los chunks del archivo; acepta listas o generadores. Devuelve filas insertadas."""
+        conn = self.pool.getconn()
+        inserted = 0
+        try:
+            with conn.cursor() as cur:
+                cur.execute(self.DELETE_SQL, (metadata['source'], metadata['folder']))
+                rows = self._rows(metadata, chunks)
+                while True:
+                    batch = list(islice(rows, self.batch_size))
+                    if not batch:
+                        break
+                    _execute_values(cur, self.INSERT_SQL, batch, self.batch_size)
+                    inserted += len(batch)
+            conn.commit()
+            return inserted
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            # Una conexión rota no vuelve al pool
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        self.pool.closeall()
+
+
+class IngestProgress:
+    """Avance y throughput (páginas/seg y chunks/seg) sobre el tiempo total de la corrida."""
+
+    def __init__(self, total_files):
+        self.total_files = total_files
+        self.done = 0
+        self.failed = 0
+        self.ocr_failed = 0
+        self.pages = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+
+    def rates(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return self.pages / elapsed, self.chunks / elapsed, elapsed
+
+    def update(self, result):
+        self.done += 1
+        self.ocr_failed += bool(result.get("ocr_failed"))
+        self.pages += result["pages"]
+        self.chunks += result["chunks"]
+        pages_s, chunks_s, _ = self.rates()
+        print(
+            f"[{self.done + self.failed}/{self.total_files}] {result['metadata']['title']}: "
+            f"{result['pages']} págs, {result['chunks']} chunks en {result['seconds']:.1f}s "
+            f"| global {pages_s:.1f} págs/s, {chunks_s:.1f} chunks/s",
+            flush=True
+        )
+
+    def fail(self, file_path, error):
+        self.failed += 1
+        print(f"[{self.done + self.failed}/{self.total_files}] Error procesando {os.path.basename(file_path)}: {error}",
+              flush=True)
+
+    def summary(self):
+        pages_s, chunks_s, elapsed = self.rates()
+        print(
+            f"Ingesta completada: {self.done} archivos ({self.failed} con error, {self.ocr_failed} con OCR "
+            f"incompleto), {self.pages} páginas, "
+            f"{self.chunks} chunks en {elapsed:.1f}s -> {pages_s:.1f} págs/s, {chunks_s:.1f} chunks/s"
+        )
+
+
+def list_pdfs(library_path):
+    pdfs = []
+    for root, dirs, files in os.walk(library_path):
         for file in files:
             if file.endswith(".pdf"):
-                file_path = os.path.join(root, file)
-                metadata = extract_metadata(file_path)
-                
-                print(f"Procesando: {metadata['title']} ({metadata['type']})")
-                
+                pdfs.append(os.path.join(root, file))
+    return sorted(pdfs)
+
+
+def ingest_library(library_path=LIBRARY_PATH, workers=INGEST_WORKERS, manifest_path=MANIFEST_PATH, force=False):
+    """
+    Pipeline paralelo y reanudable:
+      - Un pool de procesos extrae y escribe los PDFs (un archivo por worker,
+        en streaming: páginas -> chunks -> INSERT por lotes).
+      - La cola de trabajo está acotada (workers x QUEUE_PER_WORKER archivos en vuelo).
+      - El proceso principal anota cada archivo confirmado en el manifest;
+        los archivos sin cambios se saltan en la siguiente corrida.
+    """
+    if not os.path.exists(library_path):
+        print(f"⚠️ No se encontró la carpeta {library_path}")
+        return
+
+    print(f"Iniciando ingesta masiva (Sin Embeddings) desde: {library_path}")
+
+    manifest = IngestManifest(manifest_path, library_path)
+    pdfs = list_pdfs(library_path)
+    pending = [path for path in pdfs if force or manifest.needs_ingest(path)]
+    print(f"{len(pdfs)} PDFs encontrados: {len(pdfs) - len(pending)} sin cambios (se saltan), "
+          f"{len(pending)} por procesar con {workers} workers.")
+    if not pending:
+        return
+
+    progress = IngestProgress(len(pending))
+    queue_size = max(workers * QUEUE_PER_WORKER, 1)
+    ocr_workers = OCR_WORKERS or max((os.cpu_count() or 2) // workers, 1)
+    remaining = iter(pending)
+    connection_string = get_connection_string()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(ocr_workers, connection_string)) as pool:
+        in_flight = {}
+
+        def fill():
+            while len(in_flight) < queue_size:
+                file_path = next(remaining, None)
+                if file_path is None:
+                    return
+                in_flight[pool.submit(process_file, file_path)] = file_path
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = in_flight.pop(future)
                 try:
-                    chunks = smart_chunking(file_path)
-                    
-                    if not chunks:
-                        print("   [!] Archivo vacío o ilegible.")
-                        continue
-                        
-                    # Conectar a Supabase JUSTO antes de insertar
-                    conn = psycopg2.connect(DB_CONNECTION_STRING)
-                    cur = conn.cursor()
-                    
-                    for i, chunk in enumerate(chunks):
-                        # Enriquecer metadatos con el chunk id
-                        chunk_meta = metadata.copy()
-                        chunk_meta['chunk_index'] = i
-                        
-                        # 🚨 INSERT ACTUALIZADO: Solo guardamos Content y Metadata. La BD hace el resto automáticamente.
-                        cur.execute(
-                            "INSERT INTO documents (content, metadata) VALUES (%s, %s)",
-                            (chunk, json.dumps(chunk_meta))
-                        )
-                        print(f"   - Párrafo {i+1}/{len(chunks)} guardado en Base de Datos.")
-                    
-                    conn.commit()
-                    cur.close()
-                    conn.close()
-                        
+                    result = future.result()
+                    if not result["chunks"]:
+                        print(f"   [!] {os.path.basename(file_path)}: archivo vacío o ilegible.")
+                    # El worker ya confirmó la transacción: recién ahí se anota (un fallo se reintenta).
+                    # Con páginas sin OCR tampoco se anota: la próxima corrida lo vuelve a procesar.
+                    if result["ocr_failed"]:
+                        print(f"   [!] {os.path.basename(file_path)}: {result['ocr_failed']} páginas sin OCR; "
+                              f"queda pendiente para la próxima corrida.")
+                    else:
+                        manifest.record(file_path, result["sha256"], result["pages"], result["chunks"])
+                    progress.update(result)
                 except Exception as e:
-                    print(f"Error procesando {file}: {e}")
+                    progress.fail(file_path, e)
+            fill()
+
+    progress.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de la biblioteca médica (PDF -> documents)")
+    parser.add_argument("--library", default=LIBRARY_PATH, help="Carpeta raíz de los PDFs")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Procesos de extracción en paralelo")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="Ruta del manifest de archivos ingeridos")
+    parser.add_argument("--force", action="store_true", help="Reprocesar aunque el archivo no haya cambiado")
+    args = parser.parse_args()
+    ingest_library(args.library, args.workers, args.manifest, args.force)
 
-    print("Ingesta Masiva Completada.")
 
 if __name__ == "__main__":
-    ingest_library()
\ No newline at end of file
+    main()
@@ -0,0 +1,50 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+
+def page_content_hash(doc, page, dpi, lang):
+    """
+    Huella de una página escaneada: su content stream + los bytes crudos de sus
+    imágenes (sin renderizar), más los parámetros de OCR. Dos PDFs que comparten
+    la misma página escaneada producen la misma clave.
+    """
+    digest = hashlib.sha256(f"{dpi}|{lang}|".encode('utf-8'))
+    digest.update(page.read_contents() or b'')
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b'')
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Caché persistente de texto OCR por hash de contenido de página (SQLite, WAL).
+    Cada proceso abre su propia conexión; varios workers pueden escribir a la vez.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_pages (key TEXT PRIMARY KEY, text TEXT NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr_pages WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, text):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO ocr_pages (key, text) VALUES (?, ?)", (key, text))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,76 +1,123 @@
+import argparse
 import os
-import fitz  # PyMuPDF
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from split_plan import plan_splits, toc_boundaries
+
+DEFAULT_PAGES_PER_SPLIT = 500
+# Opciones de guardado: limpia objetos huérfanos/duplicados y comprime los streams
+SAVE_OPTIONS = {"garbage": 3, "deflate": True}
+
+
+def estimate_page_bytes(doc):
+    """
+    Tamaño aproximado de cada página: largo declarado de sus content streams
+    e imágenes (no descomprime ni lee los streams).
+    """
+    sizes = []
+    for page in doc:
+        xrefs = list(page.get_contents()) + [image[0] for image in page.get_images(full=True)]
+        size = 0
+        for xref in xrefs:
+            kind, value = doc.xref_get_key(xref, "Length")
+            if kind == "int":
+                size += int(value)
+        sizes.append(max(size, 1))
+    return sizes
+
+
+def write_part(input_path, start, end, output_path):
+    """
+    Trabajo de un worker: abre el original (solo lectura), copia [start, end)
+    y guarda con garbage/deflate. Devuelve bytes escritos y tiempo.
+    """
+    started = time.perf_counter()
+    with fitz.open(input_path) as source, fitz.open() as part:
+        part.insert_pdf(source, from_page=start, to_page=end - 1)
+        part.save(output_path, **SAVE_OPTIONS)
+    return {
+        "path": output_path,
+        "pages": (start + 1, end),
+        "bytes": os.path.getsize(output_path),
+        "seconds": time.perf_counter() - started,
+    }
 
-def split_pdf(input_path, output_dir, pages_per_split=500):
+
+def plan_pdf(input_path, pages_per_split=None, max_part_mb=None, align_toc=False, toc_level=1):
+    """Rangos [start, end) por cantidad de páginas o por tamaño estimado de salida."""
+    with fitz.open(input_path) as doc:
+        total_pages = len(doc)
+        print(f"📊 Total de páginas detectadas: {total_pages}")
+        boundaries = toc_boundaries(doc.get_toc(simple=True), toc_level) if align_toc else ()
+        if max_part_mb:
+            weights, budget = estimate_page_bytes(doc), max_part_mb * 1024 * 1024
+        else:
+            weights, budget = [1] * total_pages, pages_per_split or DEFAULT_PAGES_PER_SPLIT
+    return plan_splits(weights, budget, boundaries)
+
+
+def split_pdf(input_path, output_dir=None, pages_per_split=DEFAULT_PAGES_PER_SPLIT, max_part_mb=None,
+              align_toc=False, toc_level=1, workers=None):
     """
     Divide un PDF gigante en varios PDFs más pequeños.
+    Cada parte se escribe en un proceso aparte que abre el original por su
+    cuenta: la memoria del proceso principal no crece con el documento.
+    Devuelve un reporte por parte (ruta, páginas, bytes, segundos).
     """
     if not os.path.exists(input_path):
         print(f"❌ Error: No se encontró el archivo {input_path}")
-        return
-
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+        return []
 
-    print(f"📖 Abriendo documento gigante: {input_path}")
-    doc = fitz.open(input_path)
-    total_pages = len(doc)
-    print(f"📊 Total de páginas detectadas: {total_pages}")
+    output_dir = output_dir or os.path.dirname(input_path) or "."
+    os.makedirs(output_dir, exist_ok=True)
 
+    print(f"📖 Planificando división: {input_path}")
+    splits = plan_pdf(input_path, pages_per_split, max_part_mb, align_toc, toc_level)
     base_name = os.path.splitext(os.path.basename(input_path))[0]
-    
-    start_page = 0
-    part_num = 1
-
-    while start_page < total_pages:
-        end_page = min(start_page + pages_per_split, total_pages)
-        
-        # Crear un nuevo documento PDF vacío para esta partición
-        new_doc = fitz.open()
-        
-        # Insertar el rango de páginas del documento original al nuevo
-        new_doc.insert_pdf(doc, from_page=start_page, to_page=end_page - 1)
-        
-        # Guardar la partición
-        output_filename = f"{base_name}_Parte{part_num}.pdf"
-        output_filepath = os.path.join(output_dir, output_filename)
-        new_doc.save(output_filepath)
-        
-        print(f"✅ Guardado: {output_filename} (Páginas {start_page + 1} a {end_page})")
-        
-        new_doc.close()
-        
-        start_page += pages_per_split
-        part_num += 1
-
-    doc.close()
-    print("🎉 División completada con éxito.")
+    outputs = [os.path.join(output_dir, f"{base_name}_Parte{n}.pdf") for n in range(1, len(splits) + 1)]
 
-if __name__ == "__main__":
-    print("=== Herramienta para Dividir PDFs Masivos ===")
-    print("Esta herramienta es ideal para libros como el Harrison (> 3000 pags).")
-    
+    started = time.perf_counter()
+    workers = workers or min(len(splits), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = [pool.submit(write_part, input_path, start, end, output)
+                   for (start, end), output in zip(splits, outputs)]
+        reports = []
+        for future in futures:
+            report = future.result()
+            reports.append(report)
+            print(f"✅ Guardado: {os.path.basename(report['path'])} (Páginas {report['pages'][0]} a "
+                  f"{report['pages'][1]}) - {report['bytes'] / 1024 / 1024:.1f} MB en {report['seconds']:.1f}s")
+
+    total_bytes = sum(r["bytes"] for r in reports)
+    print(f"🎉 División completada: {len(reports)} partes, {total_bytes / 1024 / 1024:.1f} MB "
+          f"en {time.perf_counter() - started:.1f}s.")
+    return reports
+
+
+def main(argv=None):
     # Ruta por defecto donde el usuario podría poner el libro gigante
     default_input = os.path.join("biblioteca_medica", "05_Libros_y_Manuales", "Harrison.pdf")
-    
-    # Si se pasa un argumento por consola, usarlo, si no, preguntar
-    if len(sys.argv) > 1:
-        pdf_path = sys.argv[1]
-    else:
-        pdf_path = input(f"Introduce la ruta del PDF gigante (Enter para usar '{default_input}'): ").strip()
-        if not pdf_path:
-            pdf_path = default_input
-
-    # Preguntar cuántas páginas por tomo
-    try:
-        pages_input = input("¿Cuántas páginas por tomo quieres? (Enter para 500): ").strip()
-        chunk_size = int(pages_input) if pages_input else 500
-    except ValueError:
-        print("Valor inválido. Usando 500 por defecto.")
-        chunk_size = 500
-        
-    output_folder = os.path.dirname(pdf_path)
-    if not output_folder: output_folder = "."
-
-    split_pdf(pdf_path, output_folder, chunk_size)
+
+    parser = argparse.ArgumentParser(
+        description="Divide PDFs masivos (ej. el Harrison, > 3000 págs) en tomos más pequeños."
+    )
+    parser.add_argument("input", nargs="?", default=default_input, help="Ruta del PDF gigante")
+    parser.add_argument("--out", help="Carpeta de salida (por defecto, la del PDF)")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--pages", type=int, default=DEFAULT_PAGES_PER_SPLIT, help="Páginas por tomo")
+    size.add_argument("--max-mb", type=float, help="Tamaño objetivo por tomo (MB, estimado)")
+    parser.add_argument("--align-toc", action="store_true", help="Cortar en inicios de capítulo del índice")
+    parser.add_argument("--toc-level", type=int, default=1, help="Nivel del índice usado como capítulo")
+    parser.add_argument("--workers", type=int, help="Procesos en paralelo (por defecto, uno por núcleo)")
+    args = parser.parse_args(argv)
+
+    reports = split_pdf(args.input, args.out, args.pages, args.max_mb, args.align_toc, args.toc_level, args.workers)
+    return 0 if reports else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
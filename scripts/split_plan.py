@@ -0,0 +1,41 @@
+from bisect import bisect_right
+from itertools import accumulate
+
+# Un corte alineado al índice solo se acepta si la parte queda al menos así de llena
+MIN_FILL = 0.5
+
+
+def plan_splits(page_weights, budget, boundaries=(), min_fill=MIN_FILL):
+    """
+    Planifica rangos de páginas [start, end) cuyo peso no supere 'budget'.
+
+    - page_weights: costo de cada página (1 para cortar por cantidad de páginas,
+      bytes estimados para cortar por tamaño de salida).
+    - boundaries: páginas (0-based) donde empieza un capítulo del índice. Si hay
+      uno dentro del rango y la parte queda al menos 'min_fill' llena, se corta
+      ahí en lugar de a mitad de capítulo.
+    Una página que sola supera el presupuesto ocupa su propia parte.
+    """
+    prefix = [0] + list(accumulate(page_weights))
+    total = len(page_weights)
+    boundaries = sorted(set(boundaries))
+    splits = []
+    start = 0
+    while start < total:
+        end = bisect_right(prefix, prefix[start] + budget) - 1
+        end = min(max(end, start + 1), total)
+        if end < total and boundaries:
+            floor = prefix[start] + min_fill * budget
+            lo = bisect_right(boundaries, start)
+            hi = bisect_right(boundaries, end)
+            candidates = [b for b in boundaries[lo:hi] if prefix[b] >= floor]
+            if candidates:
+                end = candidates[-1]
+        splits.append((start, end))
+        start = end
+    return splits
+
+
+def toc_boundaries(toc, max_level=1):
+    """Entradas [nivel, título, página 1-based] de get_toc() -> inicios de capítulo 0-based."""
+    return sorted({page - 1 for level, _, page in toc if level <= max_level and page > 0})
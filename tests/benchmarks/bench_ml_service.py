@@ -0,0 +1,249 @@
+"""
+Benchmarks de los caminos calientes de ml_service (offline, modelo stub).
+
+    python tests/benchmarks/bench_ml_service.py                      # 1k y 10k, compara con baseline
+    python tests/benchmarks/bench_ml_service.py --sizes 1k,10k,100k,1m
+    python tests/benchmarks/bench_ml_service.py --save-baseline      # regraba baseline.json
+
+Sale con código 1 si algún caso empeora más que --threshold (latencia mínima
+o memoria pico) frente a la baseline. Los tiempos dependen de la máquina: la
+baseline se regraba en la misma máquina donde se compara (CI o local).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'scripts')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from ml_service.catalog import build_catalog
+from ml_service.decay import aggregate_trends
+from ml_service.embedding_store import CachedEncoder, LRUEmbeddingCache
+from ml_service.predictors import popular_course_predictor, popular_resource_predictor
+from ml_service.trend_engine import TrendEngine, COURSE_RULES, BOOK_RULES
+from chunker import chunk_pages
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DEFAULT_SIZES = '1k,10k'
+# Tolerancia antes de considerar regresión (0.5 = 50% peor que la baseline): holgada a propósito,
+# los tiempos de milisegundos en máquinas compartidas varían ~30% entre corridas
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.5"))
+SEED = 42
+NOW = pd.Timestamp('2026-01-31 12:00:00')
+
+_WORDS = (
+    "anatomía cardiología farmacología fisiología bioquímica histología pediatría enfermería "
+    "microbiología nutrición neurología cirugía obstetricia ginecología salud pública "
+    "epidemiología inmunología patología radiología urgencias medicina interna manual guía "
+    "norma técnica atlas clínica básica avanzada introducción curso libro tratado"
+).split()
+
+
+class HashingModel:
+    """
+    Modelo stub vectorizado: bolsa de palabras hasheadas con crc32 (determinista).
+    Es barato a propósito: el benchmark mide el código del servicio, no al modelo.
+    """
+
+    def __init__(self, dim=64):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in str(text).lower().split():
+                h = zlib.crc32(word.encode('utf-8'))
+                vectors[row, h % self.dim] += 1.0 if h & 1 else 0.5
+        return vectors
+
+
+def _phrases(rng, n, min_words=1, max_words=4):
+    lengths = rng.integers(min_words, max_words + 1, size=n)
+    picks = rng.integers(0, len(_WORDS), size=lengths.sum())
+    out, pos = [], 0
+    for i, length in enumerate(lengths):
+        out.append(" ".join(_WORDS[j] for j in picks[pos:pos + length]) + f" {i % 97}")
+        pos += length
+    return out
+
+
+def make_datasets(n_rows, seed=SEED):
+    """
+    search_history de n_rows filas (queries con distribución Zipf), cursos y libros
+    de n_rows / 10 filas (mínimo 50) y n_rows / 100 páginas de texto para el chunker.
+    """
+    rng = np.random.default_rng(seed)
+    n_catalog = max(n_rows // 10, 50)
+    n_unique = max(min(n_rows // 10, 5000), 20)
+
+    vocabulary = np.array(_phrases(rng, n_unique))
+    ranks = np.minimum(rng.zipf(1.3, size=n_rows) - 1, n_unique - 1)
+    ages = pd.to_timedelta(rng.uniform(0, 30, size=n_rows), unit='D')
+    history = pd.DataFrame({'query': vocabulary[ranks], 'created_at': NOW - ages})
+
+    courses = pd.DataFrame({'id': np.arange(n_catalog), 'name': _phrases(rng, n_catalog, 2, 5),
+                            'topics_soup': _phrases(rng, n_catalog, 1, 3)})
+    books = pd.DataFrame({'id': np.arange(n_catalog), 'name': _phrases(rng, n_catalog, 2, 6),
+                          'author': 'Autor', 'publisher': 'Editorial', 'topics_soup': ''})
+
+    sentences = [". ".join(_phrases(rng, 12, 4, 12)).capitalize() + "." for _ in range(50)]
+    pages = [(i, sentences[i % len(sentences)]) for i in range(max(n_rows // 100, 10))]
+    return {'history': history, 'courses': courses, 'books': books, 'pages': pages}
+
+
+def _encoder(model):
+    # Sin disco: cada corrida paga el encoding completo (como un refresh en frío)
+    return CachedEncoder(model, 'bench', None, LRUEmbeddingCache(), normalize=True)
+
+
+def build_cases(data, model):
+    """Cada caso: (nombre, filas procesadas, función sin argumentos)."""
+    trends = aggregate_trends(data['history'], now=NOW)
+    catalog = build_catalog(_encoder(model), lambda: data['courses'], pd.DataFrame,
+                            load_books=lambda: data['books'])
+    engine = (TrendEngine()
+              .register('courses', catalog.courses_df, catalog.course_embeddings, COURSE_RULES)
+              .register('books', catalog.books_df, catalog.book_embeddings, BOOK_RULES))
+    return [
+        ('trends_grouping', len(data['history']),
+         lambda: aggregate_trends(data['history'], now=NOW)),
+        ('popular_course_predict', len(trends),
+         lambda: popular_course_predictor.predict(catalog.courses_df, trends, catalog.course_embeddings,
+                                                  _encoder(model))),
+        ('popular_resource_predict', len(trends),
+         lambda: popular_resource_predictor.predict(catalog.books_df, trends, catalog.book_embeddings,
+                                                    _encoder(model))),
+        ('trend_engine_rank', len(trends),
+         lambda: engine.rank(trends, _encoder(model), top_n=10)),
+        ('refresh_data_encoding', len(data['courses']) + len(data['books']),
+         lambda: build_catalog(_encoder(model), lambda: data['courses'], pd.DataFrame,
+                               load_books=lambda: data['books'])),
+        ('smart_chunking', len(data['pages']),
+         lambda: sum(1 for _ in chunk_pages(iter(data['pages'])))),
+    ]
+
+
+def measure(fn, rows, repeats):
+    """Latencias (ms) de 'repeats' corridas + una corrida extra con tracemalloc para el pico."""
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # calentamiento
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fn()
+            latencies.append((time.perf_counter() - started) * 1000)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    p50 = float(np.percentile(latencies, 50))
+    return {
+        'rows': rows,
+        'repeats': repeats,
+        'min_ms': round(min(latencies), 3),
+        'p50_ms': round(p50, 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'rows_per_sec': round(rows / (p50 / 1000), 1) if p50 else None,
+        'peak_mb': round(peak / 1024 / 1024, 3),
+    }
+
+
+def run(sizes, repeats=None, only=None):
+    """Corre los casos de cada tamaño; 'only' limita a un conjunto de claves caso@tamaño."""
+    model = HashingModel()
+    results = {}
+    for label in sizes:
+        if only is not None and not any(key.endswith(f"@{label}") for key in only):
+            continue
+        n_rows = SIZES[label]
+        data = make_datasets(n_rows)
+        case_repeats = repeats or max(3, min(20, 100_000 // n_rows))
+        with contextlib.redirect_stdout(io.StringIO()):
+            cases = build_cases(data, model)
+        for name, rows, fn in cases:
+            key = f"{name}@{label}"
+            if only is not None and key not in only:
+                continue
+            results[key] = measure(fn, rows, case_repeats)
+            r = results[key]
+            print(f"{key:<36} p50 {r['p50_ms']:>10.2f} ms  p99 {r['p99_ms']:>10.2f} ms  "
+                  f"{r['rows_per_sec'] or 0:>12.0f} filas/s  pico {r['peak_mb']:>8.2f} MB")
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Lista de regresiones (caso, métrica, baseline, actual) que superan el umbral."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        # El mínimo es la latencia menos afectada por ruido de la máquina (criterio de timeit)
+        for metric in ('min_ms', 'peak_mb'):
+            if base[metric] and current[metric] > base[metric] * (1 + threshold):
+                regressions.append((key, metric, base[metric], current[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de ml_service")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"Subconjunto de {','.join(SIZES)}")
+    parser.add_argument('--repeats', type=int, help="Corridas por caso (por defecto, según el tamaño)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Guarda los resultados como nueva baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip().lower() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Tamaños no soportados: {', '.join(unknown)}")
+
+    results = run(sizes, args.repeats)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+        print(f"💾 Baseline guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠️ No hay baseline; ejecuta con --save-baseline para crearla.")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        # Confirmación: los casos sospechosos se vuelven a medir antes de fallar (ruido de la máquina)
+        print("🔁 Re-midiendo casos sospechosos...")
+        suspects = {key for key, *_ in regressions}
+        results.update(run(sizes, (args.repeats or 3) * 2, only=suspects))
+        regressions = compare({k: results[k] for k in suspects}, baseline, args.threshold)
+    for key, metric, base, current in regressions:
+        print(f"❌ Regresión en {key}: {metric} {base} -> {current} (umbral {args.threshold:.0%})")
+    if not regressions:
+        print("✅ Sin regresiones frente a la baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import bench_ml_service as bench
+
+
+def test_harness_runs_offline_and_reports_metrics():
+    results = bench.run(['1k'], repeats=1)
+
+    assert set(results) == {f"{name}@1k" for name in (
+        'trends_grouping', 'popular_course_predict', 'popular_resource_predict',
+        'trend_engine_rank', 'refresh_data_encoding', 'smart_chunking')}
+    for metrics in results.values():
+        assert metrics['min_ms'] > 0 and metrics['peak_mb'] >= 0
+
+
+def test_compare_flags_regressions_past_threshold():
+    baseline = {'case@1k': {'min_ms': 10.0, 'peak_mb': 5.0}}
+
+    assert bench.compare({'case@1k': {'min_ms': 12.0, 'peak_mb': 5.0}}, baseline, 0.25) == []
+    assert bench.compare({'case@1k': {'min_ms': 13.0, 'peak_mb': 7.0}}, baseline, 0.25) == [
+        ('case@1k', 'min_ms', 10.0, 13.0), ('case@1k', 'peak_mb', 5.0, 7.0)]
@@ -0,0 +1,46 @@
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Permite importar 'ml_service' al ejecutar pytest desde cualquier carpeta
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from ml_service.utils import normalize_text
+
+
+class StubModel:
+    """
+    Reemplazo offline de SentenceTransformer: bolsa de trigramas hasheados.
+    Determinista entre procesos (usa md5, no hash()) y con similitudes
+    razonables entre textos que comparten palabras.
+    """
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.calls = 0
+        self.encoded_texts = 0
+
+    def _vector(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        norm = f" {normalize_text(text)} "
+        for i in range(len(norm) - 2):
+            digest = hashlib.md5(norm[i:i + 3].encode('utf-8')).digest()
+            vec[digest[0] % self.dim] += 1.0 if digest[1] % 2 else 0.5
+        return vec
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        self.encoded_texts += len(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._vector(t) for t in texts])
+
+
+@pytest.fixture
+def stub_model():
+    return StubModel()
@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+
+from ml_service.batching import EncoderService, MicroBatcher
+
+
+def test_micro_batcher_groups_concurrent_submissions():
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    # Ventana amplia: todo lo enviado mientras el worker espera entra en un solo lote
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(6)]
+
+    assert [f.result(5) for f in futures] == [0, 2, 4, 6, 8, 10]
+    assert batches == [[0, 1, 2, 3, 4, 5]]
+
+
+def test_micro_batcher_propagates_errors():
+    def process(items):
+        raise RuntimeError("boom")
+
+    future = MicroBatcher(process, max_wait_ms=0).submit("x")
+    with pytest.raises(RuntimeError):
+        future.result(5)
+
+
+def test_micro_batcher_respects_size_cap_and_reports_metrics():
+    batches = []
+    batcher = MicroBatcher(lambda items: batches.append(items) or items, max_batch_size=4,
+                           max_wait_ms=200, item_size=len)
+    futures = [batcher.submit([i] * size) for i, size in enumerate([3, 2, 2])]
+    [f.result(5) for f in futures]
+
+    assert [sum(len(item) for item in batch) for batch in batches] == [3, 4]
+    stats = batcher.stats()
+    assert stats["batches"] == 2 and stats["items"] == 3
+    assert stats["maxBatchSize"] == 4
+    assert stats["queueDelayMsP99"] >= stats["queueDelayMsP50"] >= 0
+
+
+def test_encoder_service_merges_concurrent_callers(stub_model):
+    service = EncoderService(stub_model, max_batch_size=64, max_wait_ms=100)
+    texts = [f"curso {i}" for i in range(8)]
+    results = [None] * len(texts)
+    start = threading.Barrier(len(texts))
+
+    def call(i):
+        start.wait()
+        results[i] = service.encode([texts[i]])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(texts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    expected = stub_model.encode(texts)
+    assert np.allclose(np.vstack(results), expected)
+    assert service.stats()["batches"] < len(texts)
+
+
+def test_encoder_service_splits_large_calls(stub_model):
+    service = EncoderService(stub_model, max_batch_size=5, max_wait_ms=0)
+    texts = [f"libro {i}" for i in range(12)]
+
+    vectors = service.encode(texts)
+
+    assert np.allclose(vectors, stub_model.encode(texts))
+    assert service.stats()["maxBatchSize"] <= 5
+    assert service.encode([]).shape[0] == 0
+
+
+def test_short_request_is_not_queued_behind_a_large_call(stub_model):
+    batches = []
+    started, gate = threading.Event(), threading.Event()
+
+    class SlowModel:
+        def encode(self, texts, **kwargs):
+            batches.append(list(texts))
+            if len(batches) == 1:
+                started.set()
+                gate.wait(5)
+            return stub_model.encode(texts)
+
+    service = EncoderService(SlowModel(), max_batch_size=5, max_wait_ms=0)
+    large = service.submit([f"curso {i}" for i in range(20)])
+    assert started.wait(5)
+    short = service.submit(["anatomia"])
+    gate.set()
+
+    assert short.result(5).shape[0] == 1
+    assert large.result(5).shape[0] == 20
+    # Solo el bloque en curso va antes de la query corta
+    assert batches.index(["anatomia"]) == 1
+    assert len(batches) == 5
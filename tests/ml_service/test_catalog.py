@@ -0,0 +1,128 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml_service.catalog import CatalogRefresher, CatalogSnapshot, build_catalog
+from ml_service.search import search_catalog
+from ml_service.vector_index import IndexRegistry
+
+
+def _courses(names):
+    return pd.DataFrame({"id": range(len(names)), "name": names, "topics_soup": [None] * len(names)})
+
+
+def test_build_catalog_keeps_frames_and_vectors_aligned(stub_model):
+    snapshot = build_catalog(
+        stub_model,
+        lambda: _courses(["Anatomía", "Cardiología"]),
+        lambda: pd.DataFrame({"name": ["Corazón"]}),
+        version=3
+    )
+
+    assert snapshot.version == 3
+    assert snapshot.course_embeddings.shape[0] == len(snapshot.courses_df)
+    assert not snapshot.course_embeddings.flags.writeable
+    with pytest.raises(Exception):
+        snapshot.courses_df = pd.DataFrame()
+
+
+def test_empty_loader_reuses_previous_catalog(stub_model):
+    first = build_catalog(stub_model, lambda: _courses(["Anatomía"]), pd.DataFrame)
+    second = build_catalog(stub_model, pd.DataFrame, pd.DataFrame, previous=first, version=2)
+
+    assert second.courses_df is first.courses_df
+    assert second.course_embeddings is first.course_embeddings
+    assert second.course_lexical is first.course_lexical
+
+
+def test_refresh_reuses_lexical_index_when_names_are_unchanged(stub_model):
+    first = build_catalog(stub_model, lambda: _courses(["Anatomía", "Cardiología"]), pd.DataFrame)
+    same = build_catalog(stub_model, lambda: _courses(["Anatomía", "Cardiología"]), pd.DataFrame,
+                         previous=first, version=2)
+    renamed = build_catalog(stub_model, lambda: _courses(["Anatomía", "Cirugía"]), pd.DataFrame,
+                            previous=same, version=3)
+
+    assert same.courses_df is not first.courses_df
+    assert same.course_lexical is first.course_lexical
+    assert renamed.course_lexical is not same.course_lexical
+    assert renamed.course_lexical.names == ("Anatomía", "Cirugía")
+
+
+def test_readers_see_previous_snapshot_until_swap():
+    building = threading.Event()
+    release = threading.Event()
+    published = []
+
+    def build(previous, version):
+        building.set()
+        release.wait(5)
+        return CatalogSnapshot(courses_df=_courses(["v%d" % version]),
+                               course_embeddings=np.zeros((1, 2)), version=version)
+
+    refresher = CatalogRefresher(build, on_publish=published.append).start()
+    refresher.request_refresh()
+    assert building.wait(5)
+
+    during = refresher.current
+    assert during.version == 0 and during.courses_df.empty
+
+    release.set()
+    for _ in range(500):
+        if published:
+            break
+        threading.Event().wait(0.01)
+    refresher.stop()
+
+    assert refresher.current.version == 1
+    assert refresher.current is published[0]
+
+
+def test_failed_refresh_keeps_published_snapshot():
+    def build(previous, version):
+        raise RuntimeError("db down")
+
+    refresher = CatalogRefresher(build)
+    with pytest.raises(RuntimeError):
+        refresher.refresh()
+    assert refresher.current.version == 0
+
+
+def test_books_are_loaded_and_encoded_in_batches(stub_model, monkeypatch):
+    books = pd.DataFrame({
+        "id": [1, 2, 3],
+        "name": ["Harrison Medicina Interna", "Netter Atlas", "Guyton Fisiología"],
+        "author": ["Harrison", None, "Guyton"],
+        "publisher": ["McGraw Hill", "Elsevier", None],
+        "topics_soup": ["Cardiología", None, "Fisiología"],
+    })
+    monkeypatch.setattr("ml_service.catalog.CATALOG_BATCH_SIZE", 2)
+
+    snapshot = build_catalog(
+        stub_model, pd.DataFrame, pd.DataFrame, load_books=lambda: books
+    )
+
+    assert snapshot.book_embeddings.shape == (3, stub_model.dim)
+    assert snapshot.books_df.loc[1, 'soup'] == "Netter Atlas Elsevier"
+    assert stub_model.calls == 2
+
+
+def test_previous_snapshot_keeps_searching_after_next_build(stub_model, tmp_path):
+    registry = IndexRegistry(str(tmp_path), backend="exact", model_name="stub")
+    first = build_catalog(stub_model, lambda: pd.DataFrame({"id": [1, 2], "name": ["Anatomía", "Cardiología"],
+                                                            "topics_soup": [None, None]}),
+                          pd.DataFrame, index_registry=registry)
+    second = build_catalog(stub_model, lambda: pd.DataFrame({"id": [3, 4], "name": ["Cirugía", "Farmacología"],
+                                                             "topics_soup": [None, None]}),
+                           pd.DataFrame, previous=first, version=2, index_registry=registry)
+
+    assert first.course_index is not second.course_index
+    hits = search_catalog(first, stub_model.encode(["Anatomia"]), k=1, types=["courses"])[0]
+    assert [(h["id"], h["name"]) for h in hits] == [(1, "Anatomía")]
+    assert search_catalog(second, stub_model.encode(["Cirugia"]), k=1, types=["courses"])[0][0]["id"] == 3
+
+    # Sin cambios, el índice se comparte entre snapshots
+    third = build_catalog(stub_model, lambda: second.courses_df[["id", "name", "topics_soup"]],
+                          pd.DataFrame, previous=second, version=3, index_registry=registry)
+    assert third.course_index is second.course_index
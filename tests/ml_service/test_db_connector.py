@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from ml_service import db_connector
+from ml_service.decay import aggregate_trends
+
+NOW = datetime(2026, 3, 16, 12, 0, 0)
+
+
+def _history():
+    offsets = [0, 0.4, 1, 1.9, 2, 3, 7.5, 15, 29.5, 31, 45, -0.5]
+    queries = ["anatomia", "cardiologia", "anatomia", "farmacologia"]
+    rows = [{"query": queries[i % len(queries)], "results_count": i, "created_at": NOW - timedelta(days=d)}
+            for i, d in enumerate(offsets)]
+    rows += [{"query": None, "results_count": 0, "created_at": NOW}, {"query": "", "results_count": 0, "created_at": NOW}]
+    return pd.DataFrame(rows)
+
+
+def _sqlite_engine(tmp_path, history):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.sqlite'}")
+    history.to_sql("search_history", engine, index=False)
+    return engine
+
+
+def test_sqlite_aggregate_matches_pandas_decay(tmp_path):
+    history = _history()
+    engine = _sqlite_engine(tmp_path, history)
+
+    pushed = db_connector.get_search_trends_aggregated(days=30, engine=engine, now=NOW)
+
+    window = history[(history["created_at"] >= NOW - timedelta(days=30)) & (history["query"].fillna("") != "")]
+    expected = aggregate_trends(window, now=NOW)
+    pushed = pushed.sort_values("query").reset_index(drop=True)
+    expected = expected.sort_values("query").reset_index(drop=True)
+
+    assert pushed["query"].tolist() == expected["query"].tolist()
+    assert pushed["count"].tolist() == expected["count"].tolist()
+    np.testing.assert_allclose(pushed["weight"], expected["weight"], rtol=1e-12)
+    assert (pushed["last_seen"] == expected["last_seen"]).all()
+
+
+def test_window_parameter_is_bound_not_formatted(tmp_path):
+    engine = _sqlite_engine(tmp_path, _history())
+
+    pushed = db_connector.get_search_trends_aggregated(days=2, engine=engine, now=NOW)
+    assert pushed["count"].sum() == 6
+
+    # Un valor inyectado no llega a la SQL: int() falla antes de ejecutar nada
+    with pytest.raises(ValueError):
+        db_connector.get_search_trends_aggregated(days="30'; DROP TABLE search_history; --", engine=engine, now=NOW)
+    assert len(pd.read_sql("SELECT * FROM search_history", engine)) == len(_history())
+
+
+def test_errors_return_empty_frame_with_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.sqlite'}")
+
+    result = db_connector.get_search_trends_aggregated(days=30, engine=engine, now=NOW)
+
+    assert result.empty
+    assert list(result.columns) == ["query", "count", "weight", "last_seen"]
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ml_service import decay
+
+
+def _history(now):
+    offsets = [0, 0.4, 1, 1.9, 3, 7.5, 15, 29.99, -2]
+    rows = []
+    for i, days in enumerate(offsets):
+        rows.append({"query": f"q{i % 3}", "created_at": now - timedelta(days=days)})
+    rows.append({"query": "q0", "created_at": "fecha-rota"})
+    rows.append({"query": "q1", "created_at": (now - timedelta(days=2)).isoformat() + "Z"})
+    return pd.DataFrame(rows)
+
+
+def test_decay_weights_match_scalar_formula():
+    now = datetime(2026, 3, 16, 12, 0, 0)
+    history = _history(now)
+
+    weights = decay.decay_weights(history['created_at'], now=now)
+
+    # El cálculo escalar usa datetime.now(); lo reproducimos con edades fijas
+    expected = []
+    for value in history['created_at']:
+        parsed = pd.to_datetime(value, errors='coerce')
+        if pd.isna(parsed):
+            expected.append(decay.FALLBACK_WEIGHT)
+            continue
+        parsed = parsed.to_pydatetime().replace(tzinfo=None)
+        expected.append(np.exp(-decay.DECAY_LAMBDA * max((now - parsed).days, 0)))
+
+    np.testing.assert_allclose(weights, expected)
+
+
+def test_aggregate_trends_groups_weights_and_counts():
+    now = datetime(2026, 3, 16, 12, 0, 0)
+    history = _history(now)
+
+    trends = decay.aggregate_trends(history, now=now)
+
+    assert list(trends.columns) == ['query', 'count', 'weight', 'last_seen']
+    assert trends['count'].sum() == len(history)
+    per_row = decay.decay_weights(history['created_at'], now=now)
+    expected = pd.Series(per_row).groupby(history['query']).sum()
+    np.testing.assert_allclose(trends.set_index('query')['weight'], expected.loc[trends['query']])
+
+
+def test_trend_query_weights_supports_legacy_date_lists():
+    now = datetime.now()
+    legacy = pd.DataFrame({
+        "query": ["anatomia", "", "cardio", "cirugia"],
+        "dates": [[now, now - timedelta(days=10)], [now], [], None],
+        "count": [2, 1, 0, 4],
+    })
+
+    queries, weights, counts = decay.trend_query_weights(legacy)
+
+    assert queries == ["anatomia", "cardio", "cirugia"]
+    np.testing.assert_allclose(weights, [1 + np.exp(-0.5), 0.0, 0.4])
+    np.testing.assert_array_equal(counts, [2, 0, 4])
+
+
+def test_canonical_query_folds_case_accents_spaces_and_stopwords():
+    from ml_service.utils import QUERY_STOPWORDS, canonical_query
+
+    assert canonical_query("matemática") == canonical_query("  Matematica ") == canonical_query("MATEMÁTICA")
+    assert canonical_query("la  Anatomía") == "la anatomia"
+    assert canonical_query("la  Anatomía", QUERY_STOPWORDS) == "anatomia"
+    # Solo stopwords: se conserva la query
+    assert canonical_query("de la", QUERY_STOPWORDS) == "de la"
+    assert canonical_query("¿?") == ""
+
+
+def test_canonicalize_trends_merges_weights_and_counts():
+    trends = pd.DataFrame({
+        "query": ["matemática", "Matematica ", "MATEMATICA", "anatomía", "la anatomia", "???", ""],
+        "count": [5, 2, 1, 3, 1, 4, 9],
+        "weight": [1.0, 0.5, 0.25, 2.0, 0.1, 3.0, 9.0],
+        "last_seen": pd.to_datetime(["2026-01-01", "2026-01-05", "2026-01-02", "2026-01-03",
+                                     "2026-01-09", "2026-01-01", "2026-01-01"]),
+    })
+
+    merged, stats = decay.canonicalize_trends(trends)
+    row = merged["canonical"].index("matematica")
+
+    assert stats == {"rawQueries": 6, "uniqueQueries": 3, "reduction": 0.5}
+    assert merged["query"][row] == "matemática"
+    assert merged["count"][row] == 8
+    assert np.isclose(merged["weight"][row], 1.75)
+    assert merged["last_seen"][row] == np.datetime64("2026-01-05")
+    assert "" not in merged["canonical"]
+
+    folded, stats = decay.canonicalize_trends(trends, stopwords={"la"})
+    row = folded["canonical"].index("anatomia")
+    assert stats["uniqueQueries"] == 2
+    assert folded["count"][row] == 4
+    # Representante "anatomía" (el más buscado), normalizado sin plegar stopwords
+    assert folded["normalized"][row] == "anatomia"
+
+
+def test_canonicalize_trends_accepts_legacy_dates_format():
+    trends = pd.DataFrame({"query": ["Cardiología", "cardiologia"], "count": [2, 1], "dates": [None, None]})
+
+    merged, stats = decay.canonicalize_trends(trends)
+
+    assert merged["canonical"] == ["cardiologia"] and merged["count"][0] == 3
+    assert np.isclose(merged["weight"][0], 3 * decay.FALLBACK_WEIGHT)
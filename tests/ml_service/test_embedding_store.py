@@ -0,0 +1,54 @@
+import numpy as np
+
+from ml_service.embedding_store import CachedEncoder, EmbeddingStore, LRUEmbeddingCache
+
+
+def test_cached_encoder_only_encodes_misses(tmp_path, stub_model):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"))
+    encoder = CachedEncoder(stub_model, "stub-model", store)
+
+    first = encoder.encode(["Anatomía", "Cardiología", "Anatomía "])
+    assert stub_model.encoded_texts == 2
+
+    second = encoder.encode(["Cardiología", "Cirugía General"])
+    assert stub_model.encoded_texts == 3
+    np.testing.assert_array_equal(first[1], second[0])
+    np.testing.assert_array_equal(first[0], first[2])
+
+    # Un proceso nuevo reutiliza los vectores persistidos en disco
+    reopened = CachedEncoder(stub_model, "stub-model", EmbeddingStore(store.path))
+    reopened.encode(["Anatomía", "Cirugía General"])
+    assert stub_model.encoded_texts == 3
+    assert reopened.hits == 2 and reopened.misses == 0
+
+
+def test_cache_is_keyed_by_model_name(tmp_path, stub_model):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"))
+    CachedEncoder(stub_model, "model-a", store).encode(["Anatomía"])
+    CachedEncoder(stub_model, "model-b", store).encode(["Anatomía"])
+
+    assert stub_model.encoded_texts == 2
+    assert store.count("model-a") == 1 and store.count("model-b") == 1
+
+
+def test_lru_cache_evicts_least_recently_used_and_counts():
+    cache = LRUEmbeddingCache(capacity=2)
+    cache.put_many([("a", np.zeros(2)), ("b", np.ones(2))])
+    cache.get_many(["a"])
+    cache.put_many([("c", np.ones(2))])
+
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+
+def test_shared_memory_cache_encodes_each_query_once(stub_model):
+    memory = LRUEmbeddingCache(capacity=100)
+    course_side = CachedEncoder(stub_model, "stub-model", memory_cache=memory)
+    book_side = CachedEncoder(stub_model, "stub-model", memory_cache=memory)
+
+    queries = ["anatomia", "cardiologia", "anatomia"]
+    np.testing.assert_array_equal(course_side.encode(queries), book_side.encode(queries))
+
+    assert stub_model.calls == 1 and stub_model.encoded_texts == 2
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+from ml_service import lexical_index, trend_engine
+from ml_service.lexical_index import LexicalIndex, tokenize
+from ml_service.utils import normalize_text, normalize_texts
+
+COURSES = ["Anatomía", "Anatomía Patológica", "Cardiología", "Cirugía General", "Farmacología Clínica",
+           "Economía I", "Matemática Financiera", "Tasa de Interés", ""]
+RULES = trend_engine.COURSE_RULES
+
+
+def _query_tokens(index, queries):
+    vocab, unknown = index.lexicon["vocab"], index.lexicon["stride"] - 1
+    token_sets = [tokenize(q, RULES) for q in queries]
+    sizes = np.array([len(t) for t in token_sets], dtype=np.int64)
+    ids = np.array([vocab.get(t, unknown) for tokens in token_sets for t in tokens], dtype=np.int64)
+    return ids, np.repeat(np.arange(len(queries)), sizes), sizes, token_sets
+
+
+@pytest.mark.parametrize("block", [1, 3, lexical_index._PAIR_BLOCK])
+@pytest.mark.parametrize("threshold", [0.2, 0.25, 0.3, 0.5, 1.0])
+def test_token_matches_equal_brute_force_jaccard(threshold, block, monkeypatch):
+    # Bloques chicos: los pares se procesan en varios bloques de queries
+    monkeypatch.setattr(lexical_index, "_PAIR_BLOCK", block)
+    index = LexicalIndex(COURSES, RULES)
+    queries = ["anatomia patologica", "clinica de farmacologia", "tasa", "becas", "", "economia",
+               "general cirugia cardiologia", "tasa interes financiera matematica"]
+    ids, owner, sizes, token_sets = _query_tokens(index, queries)
+
+    found = {(int(q), int(i)): j for q, i, j in zip(*index.token_matches(ids, owner, sizes, threshold))}
+
+    expected = {}
+    for q, query_tokens in enumerate(token_sets):
+        for i, name in enumerate(COURSES):
+            name_tokens = tokenize(name, RULES)
+            shared = query_tokens & name_tokens
+            if shared and len(shared) / len(query_tokens | name_tokens) >= threshold:
+                expected[(q, i)] = len(shared) / len(query_tokens | name_tokens)
+    assert found.keys() == expected.keys()
+    for key, value in expected.items():
+        assert np.isclose(found[key], value)
+
+
+def test_shortest_containing_equals_brute_force():
+    index = LexicalIndex(COURSES, RULES)
+    queries = [normalize_text(q) for q in ["anatom", "logia", "cirugia general", "interes", "zzz", "ia", "a",
+                                           "", "tasa de interes", "atologica"]]
+
+    expected = []
+    for norm in queries:
+        matches = [i for i, name in enumerate(COURSES) if len(norm) > 3 and norm in normalize_text(name)]
+        expected.append(min(matches, key=lambda i: (len(normalize_text(COURSES[i])), i)) if matches else -1)
+    assert index.shortest_containing(queries).tolist() == expected
+
+
+def test_trigram_postings_are_built_only_when_substring_is_used():
+    books = LexicalIndex(COURSES, trend_engine.BOOK_RULES)
+    assert books.ngram_keys is None
+
+    # Llamado igual (p. ej. desde un test o un script): las postings se arman en el primer uso
+    assert books.shortest_containing(["anatomia pat", "zzzz"]).tolist() == [1, -1]
+    assert books.ngram_keys is not None
+
+
+def test_lexical_match_does_not_depend_on_semantic_winner():
+    index = LexicalIndex(COURSES, RULES)
+    queries = ["cardiologia", "cirugia gen", "horario"]
+    # Ganador semántico equivocado para todas las queries (p. ej. un embedding pobre)
+    best_idx = np.array([5, 5, 5])
+    best_similarity = np.array([0.2, 0.2, 0.2])
+
+    scores, counts = trend_engine.score_queries(
+        queries, np.ones(3), np.array([4.0, 2.0, 9.0]), best_idx, best_similarity,
+        index.lexicon, len(COURSES), RULES, lexical=index
+    )
+    legacy_scores, _ = trend_engine.score_queries(
+        queries, np.ones(3), np.ones(3), best_idx, best_similarity, index.lexicon, len(COURSES), RULES
+    )
+
+    assert scores[COURSES.index("Cardiología")] == RULES.direct_boost
+    assert counts[COURSES.index("Cardiología")] == 4
+    # Substring: "cirugia gen" está contenido en "Cirugía General"
+    assert counts[COURSES.index("Cirugía General")] == 2
+    assert counts.sum() == 6
+    assert legacy_scores.sum() == 0
+
+
+def test_semantic_winner_keeps_credit_when_it_matches_directly():
+    index = LexicalIndex(COURSES, RULES)
+    queries = ["anatomia"]
+    for winner in (0, 1):
+        scores, _ = trend_engine.score_queries(
+            queries, np.ones(1), np.ones(1), np.array([winner]), np.array([0.9]),
+            index.lexicon, len(COURSES), RULES, lexical=index
+        )
+        assert np.flatnonzero(scores).tolist() == [winner]
+
+
+def test_normalize_texts_equals_normalize_text_per_item():
+    texts = COURSES + ["¿Qué es la Anatomía?", None, "a\x00b", "Ñandú  Çedilla\n", ""]
+    assert normalize_texts(texts) == [normalize_text(t) for t in texts]
+    assert normalize_texts(COURSES) == [normalize_text(t) for t in COURSES]
+    assert normalize_texts([]) == []
+
+
+def test_large_catalog_switches_to_wider_postings():
+    # > 65536 ítems: los ids de ítem ya no caben en uint16 y la clave (trigrama, ítem) pasa a int64
+    names = [f"curso {i}" for i in range(70_000)] + ["Anatomía Patológica"]
+    index = LexicalIndex(names, RULES)
+
+    assert index.ngram_items.dtype == np.int32
+    assert index.shortest_containing(["patologica", "curso 69999"]).tolist() == [70_000, 69_999]
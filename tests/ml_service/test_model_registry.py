@@ -0,0 +1,39 @@
+import pytest
+
+from ml_service import onnx_backend
+from ml_service.model_registry import ModelSpec, get_model_spec, verify_model
+
+
+def test_tag_stamps_name_version_and_backend(monkeypatch):
+    spec = ModelSpec("demo", "org/demo-model", 64, version="v2")
+    monkeypatch.setattr(onnx_backend, "ENCODER_BACKEND", "torch")
+    assert spec.tag == "org/demo-model@v2"
+
+    monkeypatch.setattr(onnx_backend, "ENCODER_BACKEND", "onnx")
+    monkeypatch.setattr(onnx_backend, "onnx_available", lambda: True)
+    assert spec.tag == "org/demo-model@v2@onnx-int8"
+
+
+def test_unknown_model_is_rejected():
+    assert get_model_spec("minilm-l3").dim == 384
+    with pytest.raises(ValueError):
+        get_model_spec("gpt-embeddings")
+
+
+def test_verify_model_checks_dimension(stub_model):
+    assert verify_model(ModelSpec("stub", "stub", 64), stub_model)
+    with pytest.raises(ValueError):
+        verify_model(ModelSpec("stub", "stub", 384), stub_model)
+
+
+def test_verify_model_reads_dimension_without_inference():
+    class ConfiguredModel:
+        def get_sentence_embedding_dimension(self):
+            return 384
+
+        def encode(self, texts, **kwargs):
+            raise AssertionError("verify_model no debe ejecutar el modelo")
+
+    assert verify_model(ModelSpec("minilm", "minilm", 384), ConfiguredModel())
+    with pytest.raises(ValueError):
+        verify_model(ModelSpec("minilm", "minilm", 768), ConfiguredModel())
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from ml_service import onnx_backend
+from ml_service.onnx_backend import cache_model_name, compare_backends, mean_pooling, resolve_encoder_backend
+
+
+def test_mean_pooling_ignores_padding():
+    tokens = np.array([[[1.0, 1.0], [3.0, 3.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+
+    assert np.allclose(mean_pooling(tokens, mask), [[2.0, 2.0]])
+
+
+def test_onnx_backend_falls_back_to_torch_when_runtime_missing(monkeypatch):
+    monkeypatch.setattr(onnx_backend, "onnx_available", lambda: False)
+    assert resolve_encoder_backend("onnx") == "torch"
+    assert cache_model_name("m", "onnx") == "m"
+
+    monkeypatch.setattr(onnx_backend, "onnx_available", lambda: True)
+    assert cache_model_name("m", "onnx") == "m@onnx-int8"
+
+
+class Perturbed:
+    """Simula el error de cuantización: el mismo modelo con ruido en los vectores."""
+
+    def __init__(self, model, noise):
+        self.model = model
+        self.noise = noise
+
+    def encode(self, texts):
+        vectors = self.model.encode(texts)
+        rng = np.random.default_rng(0)
+        return vectors + rng.normal(0, self.noise, vectors.shape).astype(np.float32)
+
+
+def test_compare_backends_flags_large_drift(stub_model):
+    assert compare_backends(stub_model, Perturbed(stub_model, 0.01))["ok"]
+
+    report = compare_backends(stub_model, Perturbed(stub_model, 2.0))
+    assert not report["ok"]
+    assert report["maxScoreDelta"] > onnx_backend.MAX_SCORE_DELTA
+
+
+def _config_files(files):
+    return lambda name: files.get(name)
+
+
+def test_sentence_config_reads_seq_length_and_normalize_from_model_files():
+    modules = [{"idx": 0, "name": "0", "path": "", "type": "sentence_transformers.models.Transformer"},
+               {"idx": 1, "name": "1", "path": "1_Pooling", "type": "sentence_transformers.models.Pooling"},
+               {"idx": 2, "name": "2", "path": "2_Normalize", "type": "sentence_transformers.models.Normalize"}]
+    files = {"modules.json": modules, "sentence_bert_config.json": {"max_seq_length": 256},
+             "1_Pooling/config.json": {"pooling_mode_mean_tokens": True, "pooling_mode_cls_token": False}}
+
+    config = onnx_backend.sentence_config(_config_files(files))
+    assert config["max_seq_length"] == 256
+    assert config["normalize"] is True
+
+    # Sin Normalize ni sentence_bert_config.json: sin normalizar y con el largo por defecto
+    plain = onnx_backend.sentence_config(_config_files({"modules.json": modules[:2]}))
+    assert plain["normalize"] is False
+    assert plain["max_seq_length"] == onnx_backend.MAX_SEQ_LENGTH
+
+    files["1_Pooling/config.json"] = {"pooling_mode_cls_token": True}
+    with pytest.raises(ValueError):
+        onnx_backend.sentence_config(_config_files(files))
@@ -0,0 +1,136 @@
+import random
+
+import numpy as np
+import pandas as pd
+from ml_service.predictors import popular_course_predictor as pcp
+from ml_service.similarity import top1
+from ml_service.utils import normalize_text
+
+COURSES = [
+    "Anatomía", "Cardiología", "Cirugía General", "Electrocardiograma",
+    "Matemática Financiera", "Tasa de Interés", "Introducción a la Programación",
+    "Cálculo Diferencial", "Derivadas e Integrales", "Economía I", "Fisiología Humana",
+    "Farmacología Clínica",
+]
+
+NOISE = ["horario", "becas", "matricula 2025", "pediatria", "x", "", "ii", "de la"]
+
+
+def cosine_similarity(a, b):
+    """Referencia float64 (equivalente a sklearn) para comparar con el GEMM float32."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+
+def _legacy_scores(courses_df, queries, weights, raw_counts, similarity_matrix):
+    """Copia literal del loop V3 previo a la vectorización (referencia)."""
+    course_scores = np.zeros(len(courses_df))
+    course_counts = np.zeros(len(courses_df))
+    for i, query_text in enumerate(queries):
+        scores = similarity_matrix[i]
+        best_course_idx = np.argmax(scores)
+        best_similarity = scores[best_course_idx]
+        candidate_course_name = courses_df.iloc[best_course_idx]['name']
+        impact = 0
+        query_tokens = pcp.tokenize_to_set(query_text)
+        course_tokens = pcp.tokenize_to_set(candidate_course_name)
+        jaccard_score = pcp.calculate_jaccard_similarity(query_tokens, course_tokens)
+        norm_query = normalize_text(query_text)
+        norm_course = normalize_text(candidate_course_name)
+        is_substring_match = (len(norm_query) > 3 and norm_query in norm_course)
+        if jaccard_score >= 0.5 or is_substring_match:
+            impact = weights[i] * 5.0
+        elif best_similarity > 0.50:
+            if jaccard_score < 0.01:
+                if best_similarity > 0.85:
+                    impact = weights[i] * best_similarity * 0.5
+                else:
+                    impact = 0.0
+            else:
+                impact = weights[i] * best_similarity
+        if impact > 0:
+            course_scores[best_course_idx] += impact
+            course_counts[best_course_idx] += raw_counts[i]
+    return course_scores, course_counts
+
+
+def _synthetic_queries(seed, n):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        course = rng.choice(COURSES)
+        words = course.split()
+        kind = rng.random()
+        if kind < 0.25:
+            queries.append(course.upper())
+        elif kind < 0.5:
+            queries.append(rng.choice(words))
+        elif kind < 0.65:
+            queries.append(course[: rng.randint(2, len(course))])
+        elif kind < 0.8:
+            queries.append(f"{rng.choice(words)} {rng.choice(NOISE)}".strip())
+        else:
+            queries.append(rng.choice(NOISE))
+    return list(dict.fromkeys(queries))
+
+
+def test_score_queries_matches_legacy_loop(stub_model):
+    courses_df = pd.DataFrame({"name": COURSES})
+    course_embeddings = stub_model.encode(COURSES)
+    lexicon = pcp.build_course_lexicon(COURSES)
+
+    for seed in range(5):
+        queries = _synthetic_queries(seed, 400)
+        rng = np.random.default_rng(seed)
+        weights = rng.uniform(0.05, 30.0, size=len(queries))
+        raw_counts = rng.integers(1, 100, size=len(queries)).astype(np.float64)
+        query_embeddings = stub_model.encode(queries)
+        similarity_matrix = cosine_similarity(query_embeddings, course_embeddings)
+
+        expected_scores, expected_counts = _legacy_scores(
+            courses_df, queries, weights, raw_counts, similarity_matrix
+        )
+        best_idx, best_similarity = top1(query_embeddings, course_embeddings, chunk_rows=64)
+        scores, counts = pcp.score_queries(
+            queries, weights, raw_counts, best_idx, best_similarity, lexicon, len(COURSES)
+        )
+
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+        np.testing.assert_array_equal(counts, expected_counts)
+        assert np.argmax(scores) == np.argmax(expected_scores)
+
+
+def test_predict_keeps_winner_and_search_count(stub_model):
+    courses_df = pd.DataFrame({"name": COURSES})
+    course_embeddings = stub_model.encode(COURSES)
+    queries = _synthetic_queries(42, 300)
+    counts = [(i % 7) + 1 for i in range(len(queries))]
+    trends_df = pd.DataFrame({"query": queries, "count": counts, "dates": [None] * len(queries)})
+
+    weights = np.array(counts) * 0.1
+    similarity_matrix = cosine_similarity(stub_model.encode(queries), course_embeddings)
+    expected_scores, expected_counts = _legacy_scores(
+        courses_df, queries, weights, np.array(counts, dtype=np.float64), similarity_matrix
+    )
+    best = int(np.argmax(expected_scores))
+
+    result = pcp.predict(courses_df, trends_df, course_embeddings, stub_model)
+
+    assert result["predictedCourse"] == (COURSES[best] if expected_scores[best] > 1.0 else None)
+    assert result["searchCount"] == int(expected_counts[best])
+
+
+def test_score_queries_handles_queries_without_tokens(stub_model):
+    lexicon = pcp.build_course_lexicon(COURSES)
+    queries = ["", "de la", "ii"]
+    best_idx, best_similarity = top1(stub_model.encode(queries), stub_model.encode(COURSES))
+
+    scores, counts = pcp.score_queries(
+        queries, np.ones(3), np.ones(3), best_idx, best_similarity, lexicon, len(COURSES)
+    )
+
+    assert scores.shape == (len(COURSES),)
+    assert counts.sum() <= 3
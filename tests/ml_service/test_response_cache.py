@@ -0,0 +1,82 @@
+import threading
+import time
+
+from ml_service.response_cache import TTLResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_fresh_entries_are_served_from_cache():
+    calls = []
+    clock = Clock()
+    cache = TTLResponseCache(lambda k: calls.append(k) or {"days": k}, ttl_seconds=60, clock=clock)
+
+    assert cache.get(30) == {"days": 30}
+    clock.now = 59
+    assert cache.get(30) == {"days": 30}
+    assert calls == [30]
+
+
+def test_stale_entry_is_served_while_revalidating_in_background():
+    clock = Clock()
+    release = threading.Event()
+    recomputed = threading.Event()
+    calls = []
+
+    def compute(key):
+        calls.append(key)
+        if len(calls) > 1:
+            release.wait(5)
+            recomputed.set()
+        return len(calls)
+
+    cache = TTLResponseCache(compute, ttl_seconds=10, clock=clock)
+    assert cache.get(7) == 1
+
+    clock.now = 11
+    assert cache.get(7) == 1      # respuesta vieja, sin esperar el recálculo
+    assert cache.get(7) == 1      # un solo recálculo en curso por clave
+    release.set()
+    assert recomputed.wait(5)
+    for _ in range(100):
+        if cache.get(7) == 2:
+            break
+        time.sleep(0.01)
+    assert cache.get(7) == 2
+    assert len(calls) == 2
+
+
+def test_invalidate_without_swr_forces_recomputation():
+    calls = []
+    cache = TTLResponseCache(lambda k: calls.append(k) or len(calls), ttl_seconds=60,
+                             stale_while_revalidate=False, clock=Clock())
+    assert cache.get(30) == 1
+    cache.invalidate()
+    assert cache.get(30) == 2
+    cache.invalidate(30, drop=True)
+    assert cache.get(30) == 3
+
+
+def test_computation_started_before_invalidate_is_not_stored():
+    calls = []
+    cache = TTLResponseCache(None, ttl_seconds=60, stale_while_revalidate=False, clock=Clock())
+
+    def compute(key):
+        calls.append(key)
+        if len(calls) == 1:
+            # Se publica un catálogo nuevo mientras se calcula con el anterior
+            cache.invalidate()
+            return "catalogo viejo"
+        return "catalogo nuevo"
+
+    cache.compute = compute
+    assert cache.get(30) == "catalogo viejo"
+    assert cache.get(30) == "catalogo nuevo"
+    assert cache.get(30) == "catalogo nuevo"
+    assert len(calls) == 2
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from ml_service.catalog import build_catalog
+from ml_service.search import parse_search_types, search_catalog
+from ml_service.vector_index import IndexRegistry
+
+
+def _catalog(stub_model, index_registry=None):
+    return build_catalog(
+        stub_model,
+        lambda: pd.DataFrame({"id": [10, 20, 30], "name": ["Anatomía humana", "Cardiología", "Farmacología"],
+                              "topics_soup": ["", "", ""]}),
+        lambda: pd.DataFrame({"name": ["Corazón", "Huesos"]}),
+        load_books=lambda: pd.DataFrame({"id": [7], "name": ["Atlas de cardiología"]}),
+        index_registry=index_registry
+    )
+
+
+@pytest.mark.parametrize("with_index", [False, True])
+def test_search_returns_ranked_hits_across_types(stub_model, tmp_path, with_index):
+    registry = IndexRegistry(base_dir=str(tmp_path), backend="exact", model_name="stub") if with_index else None
+    snapshot = _catalog(stub_model, registry)
+    query = stub_model.encode(["cardiología"])
+
+    hits = search_catalog(snapshot, query, k=3)[0]
+
+    assert len(hits) == 3
+    assert (hits[0]["type"], hits[0]["id"], hits[0]["name"]) == ("course", 20, "Cardiología")
+    assert hits[0]["score"] > 0.9
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+    assert search_catalog(snapshot, query, k=5, types=["topics"])[0][0]["id"] is None
+
+
+def test_parse_search_types_rejects_unknown():
+    assert parse_search_types(None) == ["courses", "topics", "books"]
+    assert parse_search_types("books, courses") == ["books", "courses"]
+    with pytest.raises(ValueError):
+        parse_search_types("courses,videos")
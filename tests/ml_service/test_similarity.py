@@ -0,0 +1,24 @@
+import numpy as np
+
+from ml_service.similarity import l2_normalize, top1
+
+
+def test_top1_matches_dense_cosine_in_chunks():
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(1000, 32))
+    catalog = rng.normal(size=(50, 32)) * rng.uniform(0.1, 10, size=(50, 1))
+
+    dense = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ \
+        (catalog / np.linalg.norm(catalog, axis=1, keepdims=True)).T
+
+    best_idx, best_similarity = top1(queries, catalog, chunk_rows=128)
+
+    np.testing.assert_array_equal(best_idx, dense.argmax(axis=1))
+    np.testing.assert_allclose(best_similarity, dense.max(axis=1), atol=1e-5)
+    assert best_similarity.dtype == np.float32
+
+
+def test_l2_normalize_is_a_no_copy_for_unit_float32_rows():
+    unit = l2_normalize(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    np.testing.assert_allclose(unit, [[0.6, 0.8], [0.0, 0.0]])
+    assert l2_normalize(unit) is unit
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ml_service.decay import DECAY_LAMBDA
+from ml_service.trend_aggregator import IncrementalTrendAggregator
+
+
+class FakeHistory:
+    """Simula search_history: devuelve solo filas dentro de la ventana y > since."""
+
+    def __init__(self):
+        self.rows = pd.DataFrame(columns=['id', 'query', 'created_at'])
+        self.now = None
+        self.fetched = 0
+
+    def add(self, query, created_at):
+        self.rows = pd.concat(
+            [self.rows, pd.DataFrame({'id': [len(self.rows) + 1], 'query': [query],
+                                      'created_at': [pd.Timestamp(created_at)]})],
+            ignore_index=True
+        )
+
+    def __call__(self, since=None, days=30):
+        rows = self.rows[self.rows['created_at'] >= self.now - timedelta(days=days)]
+        if since is not None:
+            rows = rows[rows['created_at'] > since]
+        self.fetched += len(rows)
+        return rows.reset_index(drop=True)
+
+
+def _expected(history, now, days):
+    cutoff_day = pd.Timestamp(now - timedelta(days=days)).floor('D')
+    rows = history.rows[history.rows['created_at'] >= cutoff_day]
+    ages = (pd.Timestamp(now) - rows['created_at']) / pd.Timedelta(days=1)
+    weights = np.exp(-DECAY_LAMBDA * np.clip(ages.to_numpy(dtype=float), 0, None))
+    return pd.Series(weights, index=rows.index).groupby(rows['query']).sum()
+
+
+def test_incremental_refresh_matches_full_recomputation():
+    history = FakeHistory()
+    start = datetime(2026, 3, 1, 9, 0, 0)
+    for i in range(40):
+        history.add(["anatomia", "cardio", "cirugia"][i % 3], start - timedelta(hours=7 * i))
+
+    aggregator = IncrementalTrendAggregator(7, history)
+    history.now = start
+    aggregator.refresh(now=start)
+    first_fetch = history.fetched
+
+    # Nuevas búsquedas y avance del reloj: solo debe bajar el delta
+    later = start + timedelta(days=2, hours=5)
+    history.add("anatomia", start + timedelta(days=1))
+    history.add("farmaco", start + timedelta(days=2))
+    history.now = later
+    trends = aggregator.refresh(now=later)
+
+    # Las 2 nuevas + la del watermark, que vuelve por el solape y se descarta por id
+    assert history.fetched - first_fetch == 3
+    expected = _expected(history, later, 7)
+    got = trends.set_index('query')['weight']
+    assert set(got.index) == set(expected.index)
+    np.testing.assert_allclose(got.loc[expected.index], expected)
+    assert trends.set_index('query').loc['farmaco', 'count'] == 1
+
+
+def test_old_days_leave_the_window():
+    history = FakeHistory()
+    now = datetime(2026, 3, 10, 12, 0, 0)
+    history.add("viejo", now - timedelta(days=6))
+    history.add("nuevo", now)
+    history.now = now
+
+    aggregator = IncrementalTrendAggregator(7, history)
+    aggregator.refresh(now=now)
+    trends = aggregator.refresh(now=now + timedelta(days=3))
+
+    assert trends['query'].tolist() == ["nuevo"]
+
+
+def test_late_commit_inside_overlap_is_counted_once():
+    history = FakeHistory()
+    now = datetime(2026, 3, 10, 12, 0, 0)
+    history.add("anatomia", now - timedelta(minutes=1))
+    history.now = now
+
+    aggregator = IncrementalTrendAggregator(7, history, overlap_seconds=300)
+    aggregator.refresh(now=now)
+
+    # Se confirma después, con un created_at anterior al watermark (now() = inicio de la transacción)
+    history.add("cardio", now - timedelta(minutes=2))
+    later = now + timedelta(minutes=1)
+    history.now = later
+    trends = aggregator.refresh(now=later).set_index('query')
+    again = aggregator.refresh(now=later).set_index('query')
+
+    assert trends.loc['cardio', 'count'] == 1
+    assert trends.loc['anatomia', 'count'] == 1
+    assert again['count'].to_dict() == {'anatomia': 1, 'cardio': 1}
@@ -0,0 +1,161 @@
+import math
+
+import numpy as np
+import pandas as pd
+from ml_service import trend_engine
+from ml_service.predictors import popular_course_predictor as pcp
+from ml_service.predictors import popular_resource_predictor as prp
+from ml_service.similarity import top1
+from ml_service.utils import QUERY_STOPWORDS
+
+COURSES = ["Anatomía", "Cardiología", "Cirugía General", "Farmacología Clínica", "Economía I"]
+BOOKS = ["Tratado de Anatomía Humana", "Manual de Cardiología Clínica", "Guía de Farmacología"]
+TOPICS = ["Sistema nervioso", "Electrocardiograma", "Antibióticos"]
+
+QUERIES = ["anatomia", "anatomia humana", "cardiologia", "electrocardiograma", "farmacologia",
+           "antibioticos", "becas", "cirugia general", "anatomia clinica"]
+
+
+def _trends():
+    counts = [(i % 4) + 1 for i in range(len(QUERIES))]
+    return pd.DataFrame({"query": QUERIES, "count": counts, "dates": [None] * len(QUERIES)})
+
+
+def _engine(model):
+    engine = trend_engine.TrendEngine()
+    for name, items, rules in (("courses", COURSES, trend_engine.COURSE_RULES),
+                               ("books", BOOKS, trend_engine.BOOK_RULES),
+                               ("topics", TOPICS, trend_engine.TOPIC_RULES)):
+        df = pd.DataFrame({"id": np.arange(len(items)) + 100, "name": items})
+        engine.register(name, df, model.encode(items), rules)
+    return engine
+
+
+def _legacy_book_scores(queries, weights, raw_counts, best_idx, best_similarity):
+    """Copia del loop previo de popular_resource_predictor (referencia)."""
+    scores, counts = np.zeros(len(BOOKS)), np.zeros(len(BOOKS))
+    for i, query in enumerate(queries):
+        b = best_idx[i]
+        jaccard = prp.calculate_jaccard_similarity(prp.tokenize_to_set(query), prp.tokenize_to_set(BOOKS[b]))
+        impact = 0
+        if jaccard >= 0.3:
+            impact = weights[i] * 5.0
+        elif best_similarity[i] > 0.50:
+            impact = weights[i] * best_similarity[i]
+        if impact > 0:
+            scores[b] += impact
+            counts[b] += raw_counts[i]
+    return scores, counts
+
+
+def test_rank_encodes_queries_once_for_all_catalogs(stub_model):
+    engine = _engine(stub_model)
+    calls_before = stub_model.calls
+
+    ranking = engine.rank(_trends(), stub_model, top_n=3)
+
+    assert stub_model.calls == calls_before + 1
+    assert ranking["queries"] == len(QUERIES)
+    assert set(ranking["catalogs"]) == {"courses", "books", "topics"}
+    for entries in ranking["catalogs"].values():
+        assert len(entries) <= 3
+        scores = [e["score"] for e in entries]
+        assert scores == sorted(scores, reverse=True)
+        assert all(s > 0 for s in scores)
+        assert all(set(e) == {"id", "name", "score", "confidence", "searchCount"} for e in entries)
+    assert ranking["catalogs"]["courses"][0]["name"] == "Anatomía"
+    assert ranking["catalogs"]["courses"][0]["id"] == 100
+
+
+def test_book_rules_match_legacy_loop(stub_model):
+    trends_df = _trends()
+    queries = trends_df["query"].tolist()
+    weights = np.array(trends_df["count"], dtype=np.float64) * 0.1
+    raw_counts = np.array(trends_df["count"], dtype=np.float64)
+    best_idx, best_similarity = top1(stub_model.encode(queries), stub_model.encode(BOOKS))
+
+    scores, counts = trend_engine.score_queries(
+        queries, weights, raw_counts, best_idx, best_similarity,
+        trend_engine.build_lexicon(BOOKS, trend_engine.BOOK_RULES), len(BOOKS), trend_engine.BOOK_RULES
+    )
+    expected_scores, expected_counts = _legacy_book_scores(queries, weights, raw_counts, best_idx, best_similarity)
+
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+    np.testing.assert_array_equal(counts, expected_counts)
+
+
+def test_predictors_match_engine_top_entry(stub_model):
+    trends_df = _trends()
+    ranking = _engine(stub_model).rank(trends_df, stub_model, top_n=1)
+
+    courses_df = pd.DataFrame({"id": np.arange(len(COURSES)) + 100, "name": COURSES})
+    books_df = pd.DataFrame({"id": np.arange(len(BOOKS)) + 100, "name": BOOKS})
+    course = pcp.predict(courses_df, trends_df, stub_model.encode(COURSES), stub_model)
+    book = prp.predict(books_df, trends_df, stub_model.encode(BOOKS), stub_model)
+
+    assert course == pcp.summarize(ranking["catalogs"]["courses"])
+    assert book == prp.summarize(ranking["catalogs"]["books"])
+    assert book["predictedBook"] == ranking["catalogs"]["books"][0]["name"]
+
+
+def test_confidence_formulas():
+    course = trend_engine.COURSE_RULES
+    assert trend_engine.confidence_score(course, 0.05, 0.0) == 0.0
+    volume = min(1.0, math.log1p(80.0) / 4.0)
+    assert math.isclose(trend_engine.confidence_score(course, 80.0, 20.0), volume * 0.7 + 0.75 * 0.3)
+    # Libros: solo volumen, penalizado con poco score
+    assert math.isclose(trend_engine.confidence_score(trend_engine.BOOK_RULES, 2.0, 0.0),
+                        math.log1p(2.0) / 4.0 * 0.5)
+
+
+def test_summarize_without_ranking():
+    rules = trend_engine.COURSE_RULES
+    assert trend_engine.summarize(None, rules, "predictedCourse", "{count}")["reason"] == "Sin datos"
+    empty = pcp.summarize([])
+    assert empty["predictedCourse"] is None
+    assert empty["searchCount"] == 0
+    assert empty["reason"] == "Tendencia basada en 0 búsquedas directas."
+
+
+def test_unregistered_or_empty_catalogs_are_skipped(stub_model):
+    engine = trend_engine.TrendEngine()
+    engine.register("courses", pd.DataFrame(), None, trend_engine.COURSE_RULES)
+    assert "courses" not in engine
+    ranking = engine.rank(_trends(), stub_model)
+    assert ranking["catalogs"] == {}
+    assert stub_model.calls == 0
+
+
+def test_rank_encodes_each_canonical_query_once(stub_model):
+    engine = _engine(stub_model)
+    texts_before = stub_model.encoded_texts
+    trends_df = pd.DataFrame({"query": ["Anatomía", "anatomia ", "ANATOMIA", "la anatomía", "Cardiología"],
+                              "count": [3, 1, 1, 2, 1], "dates": [None] * 5})
+
+    ranking = engine.rank(trends_df, stub_model)
+
+    assert stub_model.encoded_texts - texts_before == 3
+    assert ranking["canonicalization"] == {"rawQueries": 5, "uniqueQueries": 3, "reduction": 0.4}
+    # "la anatomía" es otra query canónica, pero sus tokens de curso coinciden con "Anatomía"
+    assert ranking["catalogs"]["courses"][0]["searchCount"] == 7
+
+    folded = trend_engine.TrendEngine(query_stopwords={"la"})
+    folded.register("courses", pd.DataFrame({"id": [1], "name": ["Anatomía"]}),
+                    stub_model.encode(["Anatomía"]), trend_engine.COURSE_RULES)
+    assert folded.rank(trends_df, stub_model)["queries"] == 2
+
+
+def test_query_stopwords_do_not_break_substring_matches(stub_model):
+    courses = pd.DataFrame({"id": [1, 2], "name": ["Matemática Financiera: Tasa de Interés Compuesta y Simple",
+                                                    "Economía I"]})
+    trends_df = pd.DataFrame({"query": ["tasa de interes"], "count": [1], "dates": [None]})
+
+    scores = []
+    for stopwords in (None, QUERY_STOPWORDS):
+        engine = trend_engine.TrendEngine(query_stopwords=stopwords)
+        engine.register("courses", courses, stub_model.encode(courses["name"].tolist()), trend_engine.COURSE_RULES)
+        top = engine.rank(trends_df, stub_model)["catalogs"]["courses"][0]
+        assert top["id"] == 1
+        scores.append(top["score"])
+    # Plegar "de" no cambia el match por substring: "tasa de interes" sigue dentro del nombre
+    assert scores[0] == scores[1]
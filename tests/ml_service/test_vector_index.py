@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml_service.vector_index import ExactIndex, HNSWIndex, IndexRegistry, VectorIndex, nearest
+
+
+def _vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_exact_index_topk_matches_brute_force():
+    catalog = _vectors(200)
+    queries = _vectors(30, seed=1)
+    index = ExactIndex(16)
+    index.add(list(range(100, 300)), catalog)
+
+    ids, scores = index.search(queries, k=5)
+
+    unit = catalog / np.linalg.norm(catalog, axis=1, keepdims=True)
+    dense = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ unit.T
+    expected = np.argsort(-dense, axis=1)[:, :5] + 100
+    np.testing.assert_array_equal(ids.astype(int), expected)
+    np.testing.assert_allclose(scores, np.sort(dense, axis=1)[:, ::-1][:, :5], atol=1e-5)
+
+
+def test_sync_only_touches_new_changed_and_removed_rows():
+    vectors = _vectors(4)
+    index = ExactIndex(16)
+    assert index.sync([1, 2, 3, 4], vectors)
+    assert not index.sync([1, 2, 3, 4], vectors)
+
+    updated = vectors.copy()
+    updated[1] = _vectors(1, seed=9)[0]
+    assert index.sync([1, 2, 3, 5], np.vstack([updated[:3], _vectors(1, seed=7)]))
+    assert sorted(index.fingerprints) == [1, 2, 3, 5]
+
+    ids, _ = index.search(updated[1:2], k=1)
+    assert ids[0, 0] == 2
+
+
+def test_registry_persists_and_reloads(tmp_path):
+    vectors = _vectors(10)
+    ids = list(range(10))
+    IndexRegistry(str(tmp_path), backend="exact", model_name="m").sync("courses", ids, vectors)
+
+    reloaded = IndexRegistry(str(tmp_path), backend="exact", model_name="m")
+    index = reloaded.sync("courses", ids, vectors)
+    assert len(index) == 10
+
+    other_model = IndexRegistry(str(tmp_path), backend="exact", model_name="otro")
+    assert other_model._load("courses", 16, 10).fingerprints == {}
+
+
+def test_nearest_maps_index_ids_to_catalog_rows():
+    vectors = _vectors(5)
+    index = ExactIndex(16)
+    index.sync([10, 11, 12, 13, 99], vectors)
+    df = pd.DataFrame({"id": [13, 12, 11, 10]})
+
+    rows, sims = nearest(vectors, index, df['id'].tolist())
+
+    assert rows.tolist() == [3, 2, 1, 0, -1]
+    assert np.isneginf(sims[-1])
+
+
+def test_hnsw_backend_agrees_with_exact_on_small_catalog(tmp_path):
+    pytest.importorskip("hnswlib")
+    catalog = _vectors(300)
+    queries = _vectors(50, seed=3)
+    exact, approx = ExactIndex(16), HNSWIndex(16, max_elements=16)
+    exact.sync(list(range(300)), catalog)
+    approx.sync(list(range(300)), catalog)
+
+    exact_ids, _ = exact.search(queries, k=1)
+    approx_ids, approx_scores = approx.search(queries, k=1)
+    assert (exact_ids[:, 0] == approx_ids[:, 0]).mean() > 0.95
+
+    approx.save(str(tmp_path / "hnsw"))
+    meta = json.loads((tmp_path / "hnsw" / "meta.json").read_text())
+    reloaded = HNSWIndex.load(str(tmp_path / "hnsw"), meta)
+    reloaded_ids, _ = reloaded.search(queries, k=1)
+    np.testing.assert_array_equal(reloaded_ids, approx_ids)
+
+
+def test_registry_copies_instead_of_mutating_a_returned_index(tmp_path):
+    registry = IndexRegistry(str(tmp_path), backend="exact", model_name="m")
+    vectors = _vectors(4)
+    first = registry.sync("courses", [1, 2, 3, 4], vectors)
+    assert registry.sync("courses", [1, 2, 3, 4], vectors) is first
+
+    second = registry.sync("courses", [3, 4, 5], np.vstack([vectors[2:], _vectors(1, seed=5)]))
+
+    assert second is not first
+    assert sorted(first.fingerprints) == [1, 2, 3, 4]
+    assert first.search(vectors[:1], k=1)[0][0, 0] == 1
+    assert sorted(second.fingerprints) == [3, 4, 5]
+
+
+def test_vector_index_is_abstract():
+    with pytest.raises(TypeError):
+        VectorIndex(16)
+
+
+def test_concurrent_saves_never_mix_matrix_and_meta(tmp_path):
+    # Dos workers (gunicorn) guardando el mismo catálogo con contenidos distintos
+    path = str(tmp_path / "courses")
+    small, large = ExactIndex(16), ExactIndex(16)
+    small.sync([1, 2], _vectors(2))
+    large.sync(list(range(10, 30)), _vectors(20, seed=4))
+
+    def save_many(index):
+        for _ in range(25):
+            index.save(path)
+
+    workers = [threading.Thread(target=save_many, args=(index,)) for index in (small, large)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    meta = json.loads((tmp_path / "courses" / "meta.json").read_text())
+    loaded = ExactIndex.load(path, meta)
+    expected = small if meta["ids"] == [1, 2] else large
+    assert loaded.fingerprints == expected.fingerprints
+    ids, matrix = loaded._state
+    assert matrix.shape == (len(ids), 16)
+    assert not [p.name for p in (tmp_path / "courses").iterdir() if p.name.endswith(".tmp")]
+
+
+def test_save_prunes_only_stale_data_files(tmp_path):
+    path = tmp_path / "courses"
+    index = ExactIndex(16)
+    index.sync([1], _vectors(1))
+    index.save(str(path))
+    first = json.loads((path / "meta.json").read_text())["version"]
+    index.save(str(path))
+    # Un archivo reciente puede ser de otro worker que aún no publicó: se conserva
+    assert (path / f"vectors-{first}.npy").exists()
+
+    os.utime(path / f"vectors-{first}.npy", (0, 0))
+    index.save(str(path))
+    latest = json.loads((path / "meta.json").read_text())["version"]
+    assert not (path / f"vectors-{first}.npy").exists()
+    assert (path / f"vectors-{latest}.npy").exists()
+
+
+@pytest.mark.parametrize("corrupt", ["row_count", "version"])
+def test_registry_rebuilds_when_meta_does_not_match_the_matrix(tmp_path, corrupt):
+    vectors = _vectors(4)
+    IndexRegistry(str(tmp_path), backend="exact", model_name="m").sync("courses", [1, 2, 3, 4], vectors)
+    meta_path = tmp_path / "courses" / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    if corrupt == "row_count":
+        meta["ids"], meta["fingerprints"] = meta["ids"][:3], meta["fingerprints"][:3]
+    else:
+        meta["version"] = "otra"
+    meta_path.write_text(json.dumps(meta))
+
+    with pytest.raises((ValueError, OSError)):
+        ExactIndex.load(str(tmp_path / "courses"), meta)
+    rebuilt = IndexRegistry(str(tmp_path), backend="exact", model_name="m")._load("courses", 16, 4)
+    assert rebuilt.fingerprints == {}
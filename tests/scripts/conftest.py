@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los scripts se ejecutan como archivos sueltos (python scripts/x.py): se importan igual
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
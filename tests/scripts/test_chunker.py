@@ -0,0 +1,62 @@
+from chunker import chunk_pages, split_sentences
+
+
+def _pages(*texts):
+    return list(enumerate(texts))
+
+
+def test_long_sentences_are_split_on_word_boundaries():
+    text = " ".join(["palabra"] * 100)
+    parts = list(split_sentences(text, max_chars=50))
+
+    assert all(len(p) <= 50 for p in parts)
+    assert " ".join(parts) == text
+
+
+def test_chunks_keep_whole_sentences_and_page_ranges():
+    pages = _pages(
+        "La anatomía estudia el cuerpo. El corazón bombea sangre.",
+        "Los pulmones oxigenan. El hígado filtra toxinas.",
+        "Fin del capítulo."
+    )
+    chunks = list(chunk_pages(pages, target_chars=60, overlap_chars=0, max_chars=200))
+
+    assert chunks[0] == {"content": "La anatomía estudia el cuerpo. El corazón bombea sangre. Los pulmones oxigenan.",
+                         "page_start": 1, "page_end": 2}
+    assert all(c["content"][-1] == "." for c in chunks)
+    assert chunks[-1]["page_end"] == 3
+    joined = " ".join(c["content"] for c in chunks)
+    assert joined == " ".join(text for _, text in pages)
+
+
+def test_overlap_repeats_trailing_sentences():
+    pages = _pages("Uno. Dos. Tres. Cuatro. Cinco. Seis.")
+    chunks = list(chunk_pages(pages, target_chars=15, overlap_chars=6, max_chars=100))
+
+    assert chunks[0]["content"] == "Uno. Dos. Tres."
+    assert chunks[1]["content"].startswith("Tres.")
+    assert not chunks[-1]["content"].endswith("Cinco.")
+
+
+def test_chunker_is_lazy():
+    consumed = []
+
+    def pages():
+        for i in range(1000):
+            consumed.append(i)
+            yield i, f"Página número {i} del libro."
+
+    first = next(chunk_pages(pages(), target_chars=80, overlap_chars=0))
+
+    assert first["page_start"] == 1
+    assert len(consumed) < 10
+
+
+def test_abbreviations_and_initials_do_not_end_sentences():
+    text = "El Dr. García indicó 1.5 mg. La Sra. J. Pérez mejoró (ver Fig. 3). Alta en 2 días."
+
+    assert list(split_sentences(text)) == [
+        "El Dr. García indicó 1.5 mg.",
+        "La Sra. J. Pérez mejoró (ver Fig. 3).",
+        "Alta en 2 días.",
+    ]
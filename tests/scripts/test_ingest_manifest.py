@@ -0,0 +1,47 @@
+import os
+
+from ingest_manifest import IngestManifest, file_sha256
+
+
+def _pdf(tmp_path, name, content=b"%PDF-1.4 contenido"):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_recorded_files_are_skipped_until_they_change(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    path = _pdf(tmp_path, "libro.pdf")
+
+    manifest = IngestManifest(manifest_path, str(tmp_path))
+    assert manifest.needs_ingest(path)
+    manifest.record(path, file_sha256(path), pages=10, chunks=4)
+
+    # Una corrida nueva (tras un crash) lee el manifest persistido
+    reloaded = IngestManifest(manifest_path, str(tmp_path))
+    assert not reloaded.needs_ingest(path)
+    assert reloaded.entries["libro.pdf"]["chunks"] == 4
+
+    with open(path, "ab") as f:
+        f.write(b" editado")
+    assert reloaded.needs_ingest(path)
+
+
+def test_touch_without_content_change_is_skipped(tmp_path):
+    path = _pdf(tmp_path, "norma.pdf")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), str(tmp_path))
+    manifest.record(path, file_sha256(path), pages=1, chunks=1)
+
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 60))
+
+    assert not manifest.needs_ingest(path)
+    assert manifest.entries["norma.pdf"]["mtime"] == os.stat(path).st_mtime
+
+
+def test_corrupt_manifest_starts_from_scratch(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text("{no es json")
+    path = _pdf(tmp_path, "guia.pdf")
+
+    assert IngestManifest(str(manifest_path), str(tmp_path)).needs_ingest(path)
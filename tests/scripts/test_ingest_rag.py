@@ -0,0 +1,314 @@
+import json
+import os
+import sys
+import time
+import types
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+import ingest_rag
+from ingest_manifest import IngestManifest
+from ingest_rag import DocumentWriter, iter_page_texts
+from ocr_cache import page_content_hash
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        assert sql == DocumentWriter.DELETE_SQL
+        self.conn.log.append(("delete", params))
+        self.conn.staged.append(("delete", params))
+
+
+class FakeConnection:
+    """Transacción mínima: los cambios quedan en 'staged' hasta commit()."""
+
+    def __init__(self, table):
+        self.table = table
+        self.staged = []
+        self.log = []
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        for op, payload in self.staged:
+            if op == "delete":
+                source, folder = payload
+                self.table[:] = [row for row in self.table
+                                 if (json.loads(row[1])["source"], json.loads(row[1])["folder"]) != (source, folder)]
+            else:
+                self.table.extend(payload)
+        self.staged = []
+        self.log.append(("commit",))
+
+    def rollback(self):
+        self.staged = []
+        self.log.append(("rollback",))
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.out = 0
+        self.returned = []
+
+    def getconn(self):
+        self.out += 1
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        self.out -= 1
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    table = [("texto viejo", json.dumps({"source": "nts.pdf", "folder": "01_Normas_Tecnicas"})),
+             ("otro libro", json.dumps({"source": "atlas.pdf", "folder": "03_Libros"}))]
+    conn = FakeConnection(table)
+    pool = FakePool(conn)
+    batches = []
+    fail_on = []
+
+    def execute_values(cur, sql, rows, page_size):
+        assert sql == DocumentWriter.INSERT_SQL
+        batches.append(len(rows))
+        if len(batches) in fail_on:
+            raise RuntimeError("insert falló")
+        cur.conn.log.append(("insert", len(rows)))
+        cur.conn.staged.append(("insert", rows))
+
+    monkeypatch.setattr(ingest_rag, "_connection_pool", lambda connection_string, max_connections: pool)
+    monkeypatch.setattr(ingest_rag, "_execute_values", execute_values)
+    return {"table": table, "conn": conn, "pool": pool, "batches": batches, "fail_on": fail_on}
+
+
+METADATA = {"source": "nts.pdf", "folder": "01_Normas_Tecnicas", "title": "NTS", "type": "Norma Técnica",
+            "year": "2023"}
+
+
+def test_inserts_one_execute_values_per_batch(db):
+    writer = DocumentWriter("postgresql://fake", batch_size=3)
+
+    inserted = writer.write_document(METADATA, (f"chunk {i}" for i in range(7)))
+
+    assert inserted == 7
+    assert db["batches"] == [3, 3, 1]
+    new_rows = [row for row in db["table"] if json.loads(row[1])["source"] == "nts.pdf"]
+    assert [json.loads(meta)["chunk_index"] for _, meta in new_rows] == list(range(7))
+
+
+def test_delete_runs_before_inserts_in_the_same_transaction(db):
+    writer = DocumentWriter("postgresql://fake", batch_size=2)
+
+    writer.write_document(METADATA, ["a", "b", "c"])
+
+    assert db["conn"].log == [("delete", ("nts.pdf", "01_Normas_Tecnicas")), ("insert", 2), ("insert", 1),
+                              ("commit",)]
+    # Re-ingerir reemplaza el contenido del archivo y no toca a los demás
+    assert sorted(content for content, _ in db["table"]) == ["a", "b", "c", "otro libro"]
+
+
+def test_failed_insert_rolls_back_and_keeps_previous_rows(db):
+    before = list(db["table"])
+    db["fail_on"].append(2)
+    writer = DocumentWriter("postgresql://fake", batch_size=2)
+
+    with pytest.raises(RuntimeError):
+        writer.write_document(METADATA, ["a", "b", "c"])
+
+    assert db["conn"].log[-1] == ("rollback",)
+    assert ("commit",) not in db["conn"].log
+    assert db["table"] == before
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_connection_goes_back_to_the_pool(db, fails):
+    if fails:
+        db["fail_on"].append(1)
+    writer = DocumentWriter("postgresql://fake")
+
+    try:
+        writer.write_document(METADATA, ["a"])
+    except RuntimeError:
+        assert fails
+
+    assert db["pool"].out == 0
+    assert db["pool"].returned == [(db["conn"], False)]
+
+
+class FakePixmap:
+    def __init__(self, png):
+        self.png = png
+
+    def tobytes(self, fmt):
+        assert fmt == "png"
+        return self.png
+
+
+class FakePage:
+    def __init__(self, name, number, text=""):
+        self.name, self.number, self.text = name, number, text
+
+    def get_text(self):
+        return self.text
+
+    def get_pixmap(self, dpi):
+        return FakePixmap(f"{self.name}|{self.number}".encode())
+
+    def read_contents(self):
+        return f"{self.name}|{self.number}".encode()
+
+    def get_images(self, full=True):
+        return []
+
+
+class FakeDoc:
+    """Documento con la interfaz de PyMuPDF que usa la ingesta (páginas sin texto = escaneadas)."""
+
+    def __init__(self, name, texts):
+        self.pages = [FakePage(name, i, text) for i, text in enumerate(texts)]
+        self.page_count = len(self.pages)
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def xref_stream_raw(self, xref):
+        return b""
+
+
+class FakeCache(dict):
+    def put(self, key, text):
+        self[key] = text
+
+
+NATIVE = "Texto nativo suficientemente largo para no necesitar OCR en esta página de prueba."
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    """OCR falso en hilos: la página i tarda más que la i+1, así que terminan en orden inverso."""
+    executor = ThreadPoolExecutor(max_workers=8)
+    state = {"submitted": [], "yielded": 0, "max_in_flight": 0, "cache": FakeCache()}
+
+    def work(png):
+        name, number = png.decode().split("|")
+        time.sleep(0.002 * (10 - int(number) % 10))
+        if name == "roto":
+            raise RuntimeError("tesseract falló")
+        return f"ocr {number}"
+
+    def submit(png):
+        state["submitted"].append(png)
+        state["max_in_flight"] = max(state["max_in_flight"], len(state["submitted"]) - state["yielded"])
+        return executor.submit(work, png)
+
+    monkeypatch.setattr(ingest_rag, "OCR_WORKERS", 2)
+    monkeypatch.setattr(ingest_rag, "_submit_ocr", submit)
+    monkeypatch.setattr(ingest_rag, "_get_ocr_cache", lambda: state["cache"])
+    yield state
+    executor.shutdown()
+
+
+def test_pages_come_out_in_order_while_ocr_completes_out_of_order(ocr):
+    doc = FakeDoc("libro", ["", NATIVE, "", "", NATIVE, "", ""])
+
+    pages = list(iter_page_texts(doc))
+
+    assert [n for n, _ in pages] == list(range(7))
+    assert [text for _, text in pages] == ["ocr 0", NATIVE, "ocr 2", "ocr 3", NATIVE, "ocr 5", "ocr 6"]
+
+
+def test_pages_in_flight_stay_within_the_window(ocr):
+    doc = FakeDoc("libro", [""] * 12)
+
+    for _ in iter_page_texts(doc):
+        ocr["yielded"] += 1
+
+    assert len(ocr["submitted"]) == 12
+    # Ventana de 2 x OCR_WORKERS páginas esperando OCR
+    assert ocr["max_in_flight"] == 4
+
+
+def test_cached_page_is_not_submitted(ocr):
+    doc = FakeDoc("libro", ["", "", ""])
+    ocr["cache"][page_content_hash(doc, doc.pages[1], ingest_rag.OCR_DPI, ingest_rag.OCR_LANG)] = "desde caché"
+
+    pages = list(iter_page_texts(doc))
+
+    assert [text for _, text in pages] == ["ocr 0", "desde caché", "ocr 2"]
+    assert ocr["submitted"] == [b"libro|0", b"libro|2"]
+    # Lo nuevo queda en la caché para la próxima corrida
+    assert len(ocr["cache"]) == 3
+
+
+class InlineExecutor:
+    """ProcessPoolExecutor en el mismo proceso (futures ya resueltos)."""
+
+    def __init__(self, max_workers, initializer=None, initargs=()):
+        if initializer:
+            initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def test_file_with_failed_ocr_is_left_out_of_the_manifest(ocr, monkeypatch, tmp_path):
+    library = tmp_path / "biblioteca"
+    (library / "01_Normas_Tecnicas").mkdir(parents=True)
+    for name in ("bueno", "roto"):
+        (library / "01_Normas_Tecnicas" / f"{name}.pdf").write_bytes(b"%PDF " + name.encode())
+
+    written = {}
+
+    class FakeWriter:
+        def write_document(self, metadata, chunks):
+            written[metadata["source"]] = list(chunks)
+            return len(written[metadata["source"]])
+
+    fitz = types.SimpleNamespace(open=lambda path: FakeDoc(os.path.basename(path)[:-4], ["", NATIVE]))
+    monkeypatch.setitem(sys.modules, "fitz", fitz)
+    monkeypatch.setattr(ingest_rag, "_get_writer", lambda: FakeWriter())
+    monkeypatch.setattr(ingest_rag, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(ingest_rag, "get_connection_string", lambda: "postgresql://fake")
+    monkeypatch.setattr(ingest_rag, "_connection_string", None)
+
+    result = ingest_rag.process_file(str(library / "01_Normas_Tecnicas" / "roto.pdf"))
+    assert result["ocr_failed"] == 1 and result["pages"] == 2
+
+    manifest_path = str(tmp_path / "manifest.json")
+    ingest_rag.ingest_library(str(library), workers=1, manifest_path=manifest_path)
+
+    assert set(written) == {"bueno.pdf", "roto.pdf"}
+    manifest = IngestManifest(manifest_path, str(library))
+    assert not manifest.needs_ingest(str(library / "01_Normas_Tecnicas" / "bueno.pdf"))
+    # El OCR incompleto no se anota: la próxima corrida lo reintenta
+    assert manifest.needs_ingest(str(library / "01_Normas_Tecnicas" / "roto.pdf"))
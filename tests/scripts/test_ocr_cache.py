@@ -0,0 +1,20 @@
+from ocr_cache import OCRCache
+
+
+def test_ocr_text_persists_across_processes(tmp_path):
+    path = str(tmp_path / "ocr.sqlite")
+    cache = OCRCache(path)
+    assert cache.get("pagina-1") is None
+
+    cache.put("pagina-1", "Norma técnica de salud")
+    cache.close()
+
+    assert OCRCache(path).get("pagina-1") == "Norma técnica de salud"
+
+
+def test_put_replaces_previous_text(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite"))
+    cache.put("k", "borrador")
+    cache.put("k", "final")
+
+    assert cache.get("k") == "final"
@@ -0,0 +1,19 @@
+from split_plan import plan_splits, toc_boundaries
+
+
+def test_fixed_page_count_splits():
+    assert plan_splits([1] * 1200, 500) == [(0, 500), (500, 1000), (1000, 1200)]
+
+
+def test_size_budget_and_oversized_pages():
+    weights = [10, 10, 10, 50, 10]
+    assert plan_splits(weights, 25) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+
+
+def test_splits_align_to_chapter_starts():
+    chapters = toc_boundaries([[1, "Cap 1", 1], [2, "Sección", 150], [1, "Cap 2", 380], [1, "Cap 3", 820]])
+    assert chapters == [0, 379, 819]
+
+    # Corta en el capítulo más cercano sin pasarse, salvo que la parte quede casi vacía
+    assert plan_splits([1] * 1000, 500, chapters) == [(0, 379), (379, 819), (819, 1000)]
+    assert plan_splits([1] * 1000, 500, [10]) == [(0, 500), (500, 1000)]